@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+"""
+Compare benchmark results for two revisions.
+
+usage: python -m benchmarks.compare [ -t threshold ] [ -n rows ]
+                                    [ -r repeat ] [ -T tools ] base new
+
+base and new are each a JSON file written by benchmarks.run or a git
+revision, which is benchmarked on the spot ("." means the working tree).
+For every tool the ratio of rows/sec (new / base), peak RSS and startup
+time are printed. A tool whose throughput drops, or whose peak RSS or
+startup time grows, by more than threshold (default 0.1, i.e. 10%) is
+flagged as a regression, as is one which ran in base but fails in new.
+The exit status is 1 if there are any regressions.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from benchmarks import run
+
+
+def load(spec, nrows, repeat, tools):
+    "results from a JSON file, or from benchmarking a revision"
+    if os.path.isfile(spec):
+        with open(spec, encoding="utf-8") as inf:
+            return json.load(inf)
+    print(f"benchmarking {spec}", file=sys.stderr)
+    return run.run(nrows, repeat, tools, rev=None if spec == "." else spec,
+                   progress=lambda name, result: print(run.summary(name, result),
+                                                       file=sys.stderr))
+
+def regressions(base, new, threshold=0.1):
+    "yield (tool, description) for every regression from base to new"
+    for (name, old) in sorted(base["results"].items()):
+        cur = new["results"].get(name)
+        if "rows_per_sec" not in old or cur is None:
+            continue
+        if "rows_per_sec" not in cur:
+            yield (name, cur.get("failed") or cur.get("skipped") or "missing")
+            continue
+        if cur["rows_per_sec"] < old["rows_per_sec"] * (1 - threshold):
+            yield (name, f"rows/s {cur['rows_per_sec'] / old['rows_per_sec']:.2f}x")
+        if cur["peak_rss"] > old["peak_rss"] * (1 + threshold):
+            yield (name, f"peak RSS {cur['peak_rss'] / old['peak_rss']:.2f}x")
+        if cur["startup"] > old["startup"] * (1 + threshold):
+            yield (name, f"startup {cur['startup'] / old['startup']:.2f}x")
+
+def report(base, new, threshold=0.1, outf=sys.stdout):
+    "print a comparison table, returning the list of regressions"
+    print(f"base {base['revision']} ({base['rows']} rows), "
+          f"new {new['revision']} ({new['rows']} rows)", file=outf)
+    print(f"{'tool':<12} {'base rows/s':>12} {'new rows/s':>12} {'ratio':>6}"
+          f" {'RSS MiB':>15} {'startup s':>13}", file=outf)
+    for name in sorted(set(base["results"]) | set(new["results"])):
+        old = base["results"].get(name, {})
+        cur = new["results"].get(name, {})
+        if "rows_per_sec" not in old or "rows_per_sec" not in cur:
+            why = (cur.get("failed") or cur.get("skipped") or
+                   old.get("failed") or old.get("skipped") or "missing")
+            print(f"{name:<12} {why}", file=outf)
+            continue
+        print(f"{name:<12} {old['rows_per_sec']:12.0f} {cur['rows_per_sec']:12.0f}"
+              f" {cur['rows_per_sec'] / old['rows_per_sec']:6.2f}"
+              f" {old['peak_rss'] / 2**20:7.1f} {cur['peak_rss'] / 2**20:7.1f}"
+              f" {old['startup']:6.3f} {cur['startup']:6.3f}", file=outf)
+    found = list(regressions(base, new, threshold))
+    for (name, what) in found:
+        print(f"REGRESSION {name}: {what}", file=outf)
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-t", "--threshold", type=float, default=0.1)
+    parser.add_argument("-n", "--rows", type=float, default=1e5,
+                        help="rows when benchmarking a revision")
+    parser.add_argument("-r", "--repeat", type=int, default=3,
+                        help="runs per tool when benchmarking a revision")
+    parser.add_argument("-T", "--tools", default="",
+                        help="comma-separated tools to run (default all)")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    options = parser.parse_args()
+
+    tools = [tool for tool in options.tools.split(",") if tool]
+    (base, new) = (load(spec, int(options.rows), options.repeat, tools)
+                   for spec in (options.base, options.new))
+    return 1 if report(base, new, options.threshold) else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
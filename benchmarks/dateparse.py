@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+"""
+Compare timestamp parsing throughput of dateutil.parser.parse and
+csvprogs.common.DateParser.
+
+usage: python -m benchmarks.dateparse [ -n rows ]
+
+Each input style is parsed first with dateutil.parser.parse (the old per-cell
+approach), then with a fresh DateParser. Rows/sec for both are written to
+stdout.
+"""
+
+import argparse
+import datetime
+import random
+import time
+
+import dateutil.parser
+
+from csvprogs.common import DateParser
+
+
+START = datetime.datetime(2025, 1, 17, 8, 30)
+
+def timestamps(nrows, fmt, step):
+    "generate nrows timestamps, roughly step seconds apart, formatted by fmt"
+    rng = random.Random(42)
+    now = START
+    result = []
+    for _ in range(nrows):
+        now += datetime.timedelta(microseconds=rng.randrange(int(step * 2e6)))
+        result.append(now.strftime(fmt))
+    return result
+
+STYLES = {
+    # tick data: many distinct values
+    "iso-ticks": ("%Y-%m-%d %H:%M:%S.%f", 0.05),
+    # one-second resolution, lots of repeats
+    "iso-seconds": ("%Y-%m-%dT%H:%M:%S", 0.2),
+    # not ISO, needs strptime
+    "us-minutes": ("%m/%d/%Y %H:%M", 30),
+}
+
+def rate(func, values):
+    "rows/sec of func applied to all values"
+    start = time.perf_counter()
+    for val in values:
+        func(val)
+    return len(values) / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--rows", type=int, default=100_000)
+    options = parser.parse_args()
+
+    print(f"{'style':<12} {'dateutil':>12} {'DateParser':>12} {'speedup':>8}")
+    for (name, (fmt, step)) in STYLES.items():
+        values = timestamps(options.rows, fmt, step)
+        before = rate(dateutil.parser.parse, values)
+        after = rate(DateParser(), values)
+        print(f"{name:<12} {before:12.0f} {after:12.0f} {after / before:7.1f}x")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+"""
+Compare the memory used by a set of key strings and a KeySet.
+
+usage: python -m benchmarks.dedup [ -n keys ]
+
+Each structure is filled with n (default 1e7) distinct millisecond
+timestamps, like the time column of tick data, in a fresh interpreter.
+The keys are generated on the fly rather than held in a list, so the
+peak RSS growth of the child over an empty run is what the structure
+itself costs. One line is printed per structure with its peak RSS
+growth, bytes per key and the time taken.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.run import TOP
+
+FILL = """
+import datetime, resource, sys
+from csvprogs.common import KeySet
+n = int(sys.argv[2])
+start = datetime.datetime(2025, 1, 17, 8, 30)
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+keys = {"set": set, "keyset": KeySet, "none": None}[sys.argv[1]]
+if keys is not None:
+    keys = keys()
+    for i in range(n):
+        keys.add((start + datetime.timedelta(milliseconds=i))
+                 .isoformat(timespec="milliseconds"))
+after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print((after - before) * (1 if sys.platform == "darwin" else 1024))
+"""
+
+def fill(kind, nkeys):
+    "(peak RSS growth in bytes, seconds) for adding nkeys keys to kind"
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", FILL, kind, str(nkeys)],
+                          stdout=subprocess.PIPE, text=True, check=True,
+                          cwd=TOP, env=dict(os.environ, PYTHONPATH=TOP))
+    return (int(proc.stdout), time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--keys", type=float, default=1e7)
+    options = parser.parse_args()
+
+    nkeys = int(options.keys)
+    (base, base_time) = fill("none", nkeys)
+    for kind in ("set", "keyset"):
+        (rss, seconds) = fill(kind, nkeys)
+        print(f"{kind:<8} {(rss - base) / 2**20:10.1f} MiB"
+              f" {(rss - base) / nkeys:6.1f} bytes/key"
+              f" {seconds - base_time:8.2f}s")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
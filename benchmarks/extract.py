@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+"""
+Compare extractcsv with and without its raw line prefilter.
+
+usage: python -m benchmarks.extract [ -n rows ] [ -r repeat ]
+                                    [ -d datadir ]
+
+Each query in QUERIES is run over the daily dataset from
+benchmarks.generate (default 1e6 rows), first with --no-prefilter, then
+with the prefilter. The outputs must be identical. One line is printed
+per run with the best wall time of repeat runs, the rows selected and
+the speedup of the prefilter.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.run import TOP, dataset, run_once
+from benchmarks.sort import digest
+
+# from very selective to not selective at all
+QUERIES = [
+    ["Symbol", "==", "S0042"],
+    ["Symbol", "==", "S0042", "and", "Close", ">", "100"],
+    ["Date", "match", "2003-01-0", "or", "Symbol", "==", "S0007"],
+    ["Close", ">", "100"],
+]
+
+def count(cmd, stdin):
+    "number of rows cmd writes"
+    with open(stdin, "rb") as inf:
+        out = subprocess.run(cmd, stdin=inf, stdout=subprocess.PIPE,
+                             check=True, cwd=TOP,
+                             env=dict(os.environ, PYTHONPATH=TOP)).stdout
+    return out.count(b"\n") - 1
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--rows", type=float, default=1e6)
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    parser.add_argument("-d", "--datadir", default=None,
+                        help="where to cache generated inputs")
+    options = parser.parse_args()
+
+    datadir = options.datadir or os.path.join(tempfile.gettempdir(),
+                                              "csvprogs-bench")
+    os.makedirs(datadir, exist_ok=True)
+    data = dataset("daily", int(options.rows), datadir)
+
+    for query in QUERIES:
+        times = []
+        outputs = []
+        for flags in (["--no-prefilter"], []):
+            cmd = [sys.executable, "-m", "csvprogs.extractcsv"] + flags + query
+            runs = [run_once(cmd, data, TOP) for _ in range(options.repeat)]
+            if any(run[2] for run in runs):
+                print(f"{' '.join(query)}: failed: {runs[0][3]}",
+                      file=sys.stderr)
+                return 1
+            times.append(min(run[0] for run in runs))
+            outputs.append(digest(cmd, data))
+        same = outputs[0] == outputs[1]
+        print(f"{' '.join(query):<40} {count(cmd, data):8d} rows"
+              f" {times[0]:8.2f}s {times[1]:8.2f}s {times[0] / times[1]:5.2f}x"
+              f"{'' if same else ' OUTPUT DIFFERS'}")
+        if not same:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+"""
+Generate reproducible synthetic CSV files for benchmarking.
+
+usage: python -m benchmarks.generate { ticks | daily } [ -n rows ]
+                                     [ -s seed ] [ outfile ]
+
+ticks  time,symbol,price,size - millisecond timestamps, a random walk
+       per symbol, runs of the same symbol and about 1% missing prices
+daily  Date,Symbol,Open,High,Low,Close,Volume - daily bars, up to
+       BLOCK_DAYS consecutive days per symbol
+
+The same kind, row count and seed always produce the same file. Rows are
+written as they are generated, so 1e8 rows take no more memory than 1e3.
+Output goes to stdout if no outfile is given.
+"""
+
+import argparse
+import csv
+import datetime
+import math
+import random
+import sys
+
+TICK_START = datetime.datetime(2025, 1, 17, 8, 30)
+DAILY_START = datetime.date(2000, 1, 3)
+# daily bars switch to a new symbol after this many days, keeping dates
+# within range however many rows are asked for
+BLOCK_DAYS = 10_000
+
+def ticks(nrows, seed=42):
+    "generate tick rows"
+    rng = random.Random(seed)
+    symbols = ["ESH5", "NQH5", "YMH5", "RTYH5"]
+    prices = {"ESH5": 6000.0, "NQH5": 21500.0, "YMH5": 43500.0,
+              "RTYH5": 2300.0}
+    symbol = symbols[0]
+    now = TICK_START
+    yield ["time", "symbol", "price", "size"]
+    for _ in range(nrows):
+        now += datetime.timedelta(milliseconds=rng.randrange(1, 250))
+        if rng.random() < 0.1:
+            symbol = rng.choice(symbols)
+        prices[symbol] += rng.choice((-0.25, 0.0, 0.0, 0.25))
+        price = "" if rng.random() < 0.01 else f"{prices[symbol]:.2f}"
+        yield [now.isoformat(timespec="milliseconds"), symbol, price,
+               rng.randrange(1, 50)]
+
+def daily(nrows, seed=42):
+    "generate daily bar rows"
+    rng = random.Random(seed)
+    yield ["Date", "Symbol", "Open", "High", "Low", "Close", "Volume"]
+    close = 100.0
+    for i in range(nrows):
+        (block, day) = divmod(i, BLOCK_DAYS)
+        if day == 0:
+            symbol = f"S{block:04d}"
+            close = rng.uniform(10, 500)
+        date = DAILY_START + datetime.timedelta(days=day)
+        open_ = close * math.exp(rng.gauss(0, 0.005))
+        close = open_ * math.exp(rng.gauss(0, 0.01))
+        high = max(open_, close) * (1 + abs(rng.gauss(0, 0.005)))
+        low = min(open_, close) * (1 - abs(rng.gauss(0, 0.005)))
+        yield [date.isoformat(), symbol, f"{open_:.2f}", f"{high:.2f}",
+               f"{low:.2f}", f"{close:.2f}", rng.randrange(100_000, 5_000_000)]
+
+KINDS = {
+    "ticks": ticks,
+    "daily": daily,
+}
+
+def write(kind, nrows, outf, seed=42):
+    "write nrows rows of kind to the open file outf"
+    csv.writer(outf).writerows(KINDS[kind](nrows, seed))
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("kind", choices=sorted(KINDS))
+    parser.add_argument("-n", "--rows", type=float, default=1e5,
+                        help="number of rows (1e6 and the like are fine)")
+    parser.add_argument("-s", "--seed", type=int, default=42)
+    parser.add_argument("outfile", nargs="?")
+    options = parser.parse_intermixed_args()
+
+    if options.outfile:
+        with open(options.outfile, "w", encoding="utf-8", newline="") as outf:
+            write(options.kind, int(options.rows), outf, options.seed)
+    else:
+        write(options.kind, int(options.rows), sys.stdout, options.seed)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+
+"""
+Run every csvprogs entry point over large synthetic inputs.
+
+usage: python -m benchmarks.run [ -n rows ] [ -r repeat ] [ -t tools ]
+                                [ --rev revision ] [ -d datadir ]
+                                [ -o results.json ]
+
+Each script listed in pyproject.toml's [project.scripts] is run as
+"python -m module" on input from benchmarks.generate, with the
+arguments given in CASES. For every tool the JSON results record wall
+time and rows/sec (best of repeat runs), peak RSS of the child process
+and startup time (best of three "--help" runs). Tools without a case,
+or listed in SKIP, are recorded as skipped, and tools which exit with
+an error are recorded as failed, so nothing drops out of a comparison
+silently.
+
+With --rev, the given git revision is checked out into a temporary
+worktree and benchmarked instead of the working tree. Inputs are always
+generated (and keltner's and sharpe's derived inputs computed) with the
+working tree, so two revisions see identical data. Use
+benchmarks.compare to compare two sets of results.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import generate
+
+TOP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# entry point -> (input dataset or None, command line arguments). Datasets
+# named in braces within the arguments are replaced by their paths.
+CASES = {
+    "atr": ("daily", ["-d", "Date", "-c", "High,Low,Close"]),
+    "bars": ("ticks", ["-t", "time", "-p", "price", "-b", "60s"]),
+    "csv2csv": ("daily", []),
+    "csv2json": ("daily", []),
+    "csv2xls": (None, ["{daily}"]),
+    "csvcat": (None, ["-k", "Date", "{daily}", "{daily2}"]),
+    "csvcollapse": ("ticks", ["-k", "symbol"]),
+    "csvfill": ("ticks", ["-k", "price"]),
+    "csvmerge": (None, ["-k", "Date", "-d", "Date", "{daily}", "{daily2}"]),
+    "csvsort": ("daily", ["-k", "Close"]),
+    "dsplit": ("daily", ["-f", "Date", "-c", "Close"]),
+    "ewma": ("daily", ["-f", "Close"]),
+    "extractcsv": ("daily", ["Close", ">", "100", "and", "Volume", "<",
+                             "2000000"]),
+    "filter": ("daily", ["-f", "lambda row: row['Close'] > row['Open']"]),
+    "hull": ("daily", ["-f", "Close", "-n", "30"]),
+    "indicators": ("daily", ["-I", "ewma:Close,mvavg:Close:n=7:out=mv7,"
+                                   "hull:Close:n=30"]),
+    "interp": ("daily", ["-f", "Close", "-x", "Date"]),
+    "keltner": ("daily-kc", []),
+    "mean": ("daily", ["-f", "Close"]),
+    "mvavg": ("daily", ["-f", "Close", "-n", "20"]),
+    "regress": ("daily", ["-f", "Open,Close"]),
+    "sharpe": ("daily-mean", []),
+    "shuffle": ("daily", []),
+    "sigavg": ("daily", ["-x", "Date", "-y", "Close", "--format", "%m-%d"]),
+    "spline": ("daily", ["-x", "Date", "-f", "Close"]),
+    "square": ("daily", ["-x", "Date"]),
+    "take": ("daily", ["-n", "10"]),
+    "xform": ("daily", ["-f", "def xform(row):\n"
+                              "    row['Mid'] = (row['High'] + row['Low']) / 2\n",
+                        "-c", "Mid"]),
+}
+
+SKIP = {
+    "common": "no main() in csvprogs.common",
+    "csvplot": "interactive plotting",
+    "mpl": "interactive plotting",
+    "html2csv": "needs HTML input",
+    "xls2csv": "needs .xls input",
+}
+
+# Tools which are too slow (or limited) for the full row count.
+MAX_ROWS = {
+    "csv2xls": 100_000,
+    "spline": 20_000,
+}
+
+def entry_points(top):
+    "map script names to modules from the [project.scripts] table"
+    with open(os.path.join(top, "pyproject.toml"), encoding="utf-8") as fp:
+        text = fp.read()
+    table = re.search(r"^\[project\.scripts\]\n(.*?)(?:^\[|\Z)", text,
+                      re.M | re.S)
+    return dict(re.findall(r'^\s*([\w-]+)\s*=\s*"([\w.]+):\w+"',
+                           table.group(1) if table else "", re.M))
+
+def dataset(name, nrows, datadir):
+    "path of the named input, creating it if need be"
+    path = os.path.join(datadir, f"{name}-{nrows}.csv")
+    if os.path.exists(path):
+        return path
+    tmp = f"{path}.tmp"
+    if name in ("daily", "daily2", "ticks"):
+        with open(tmp, "w", encoding="utf-8", newline="") as outf:
+            generate.write(name.rstrip("2"), nrows, outf,
+                           seed=43 if name.endswith("2") else 42)
+    else:
+        # derived inputs, computed with the working tree
+        commands = {
+            "daily-kc": [["atr", "-d", "Date", "-c", "High,Low,Close"],
+                         ["ewma", "-f", "Close"]],
+            "daily-mean": [["mean", "-f", "Close"]],
+        }[name]
+        data = dataset("daily", nrows, datadir)
+        for (tool, *args) in commands:
+            with open(data, "rb") as inf, open(tmp, "wb") as outf:
+                subprocess.run([sys.executable, "-m", f"csvprogs.{tool}"] + args,
+                               stdin=inf, stdout=outf, check=True, cwd=TOP)
+            os.replace(tmp, f"{tmp}.in")
+            data = f"{tmp}.in"
+        os.replace(data, tmp)
+    os.replace(tmp, path)
+    return path
+
+def run_once(cmd, stdin, top):
+    "run cmd, returning (wall seconds, peak RSS bytes, exit status, stderr)"
+    env = dict(os.environ, PYTHONPATH=top)
+    with (open(stdin or os.devnull, "rb") as inf,
+          tempfile.TemporaryFile() as errf):
+        start = time.perf_counter()
+        proc = subprocess.Popen(cmd, stdin=inf, stdout=subprocess.DEVNULL,
+                                stderr=errf, cwd=top, env=env)
+        (_, status, rusage) = os.wait4(proc.pid, 0)
+        wall = time.perf_counter() - start
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        errf.seek(0)
+        err = errf.read().decode("utf-8", "replace").strip()
+    # Linux reports KiB, macOS bytes
+    rss = rusage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    return (wall, rss, proc.returncode, err)
+
+def bench(name, module, nrows, repeat, datadir, top):
+    "benchmark one entry point, returning its results dict"
+    if name in SKIP:
+        return {"skipped": SKIP[name]}
+    if name not in CASES:
+        return {"skipped": "no benchmark case"}
+    (data, args) = CASES[name]
+    nrows = min(nrows, MAX_ROWS.get(name, nrows))
+    args = [re.sub(r"\{([\w-]+)\}",
+                   lambda mat: dataset(mat.group(1), nrows, datadir), arg)
+            for arg in args]
+    stdin = dataset(data, nrows, datadir) if data else None
+    cmd = [sys.executable, "-m", module] + args
+
+    runs = [run_once(cmd, stdin, top) for _ in range(repeat)]
+    failed = [run for run in runs if run[2] != 0]
+    if failed:
+        (_, _, status, err) = failed[0]
+        return {"failed": f"exit status {status}",
+                "stderr": err.splitlines()[-1] if err else ""}
+    wall = min(run[0] for run in runs)
+    startup = min(run_once([sys.executable, "-m", module, "--help"],
+                           None, top)[0] for _ in range(3))
+    return {
+        "rows": nrows,
+        "seconds": wall,
+        "rows_per_sec": nrows / wall,
+        "peak_rss": max(run[1] for run in runs),
+        "startup": startup,
+    }
+
+def git(*args, cwd=TOP):
+    "output of a git command"
+    return subprocess.run(["git"] + list(args), cwd=cwd, check=True,
+                          stdout=subprocess.PIPE,
+                          text=True).stdout.strip()
+
+def run(nrows=100_000, repeat=1, tools=None, rev=None, datadir=None,
+        progress=None):
+    "benchmark the working tree or rev, returning the results dict"
+    datadir = datadir or os.path.join(tempfile.gettempdir(),
+                                      "csvprogs-bench")
+    os.makedirs(datadir, exist_ok=True)
+    worktree = None
+    if rev is None:
+        top = TOP
+        revision = git("rev-parse", "--short", "HEAD")
+        if git("status", "--porcelain", "--untracked-files=no"):
+            revision += "+dirty"
+    else:
+        revision = git("rev-parse", "--short", rev)
+        worktree = tempfile.mkdtemp(prefix="csvprogs-bench-")
+        git("worktree", "add", "--detach", worktree, revision)
+        top = worktree
+    try:
+        results = {}
+        for (name, module) in sorted(entry_points(top).items()):
+            if tools and name not in tools:
+                continue
+            results[name] = bench(name, module, nrows, repeat, datadir, top)
+            if progress:
+                progress(name, results[name])
+    finally:
+        if worktree:
+            git("worktree", "remove", "--force", worktree)
+            shutil.rmtree(worktree, ignore_errors=True)
+    return {
+        "revision": revision,
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "rows": nrows,
+        "results": results,
+    }
+
+def summary(name, result):
+    "one line describing result"
+    if "rows_per_sec" not in result:
+        return f"{name:<12} {result.get('skipped') or result.get('failed')}"
+    return (f"{name:<12} {result['rows_per_sec']:12.0f} rows/s"
+            f" {result['peak_rss'] / 2**20:8.1f} MiB"
+            f" {result['startup']:6.3f}s startup")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--rows", type=float, default=1e5)
+    parser.add_argument("-r", "--repeat", type=int, default=1)
+    parser.add_argument("-t", "--tools", default="",
+                        help="comma-separated tools to run (default all)")
+    parser.add_argument("--rev", default=None,
+                        help="git revision to benchmark")
+    parser.add_argument("-d", "--datadir", default=None,
+                        help="where to cache generated inputs")
+    parser.add_argument("-o", "--output", default=None,
+                        help="JSON results file (default stdout)")
+    options = parser.parse_args()
+
+    results = run(int(options.rows), options.repeat,
+                  [tool for tool in options.tools.split(",") if tool],
+                  options.rev, options.datadir,
+                  progress=lambda name, result: print(summary(name, result),
+                                                      file=sys.stderr))
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as outf:
+            json.dump(results, outf, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+"""
+Compare serial and parallel csvsort.
+
+usage: python -m benchmarks.sort [ -n rows ] [ -r repeat ] [ -j jobs ]
+                                 [ -k keys ] [ -d datadir ]
+
+Sorts the daily dataset from benchmarks.generate (default 1e6 rows) with
+"csvsort -k keys", first serially, then with --jobs for each count
+given (default 2, 4 and the number of CPUs). The outputs must be
+identical. One line is printed per run with the best wall time of repeat
+runs, peak RSS and the speedup over the serial sort.
+"""
+
+import argparse
+import hashlib
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.run import TOP, dataset, run_once
+
+
+def digest(cmd, stdin):
+    "sha1 of the output of cmd"
+    with open(stdin, "rb") as inf:
+        out = subprocess.run(cmd, stdin=inf, stdout=subprocess.PIPE,
+                             check=True, cwd=TOP,
+                             env=dict(os.environ, PYTHONPATH=TOP)).stdout
+    return hashlib.sha1(out).hexdigest()
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--rows", type=float, default=1e6)
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    parser.add_argument("-j", "--jobs", default="",
+                        help="comma-separated job counts")
+    parser.add_argument("-k", "--keys", default="Close:float:desc,Date")
+    parser.add_argument("-d", "--datadir", default=None,
+                        help="where to cache generated inputs")
+    options = parser.parse_args()
+
+    datadir = options.datadir or os.path.join(tempfile.gettempdir(),
+                                              "csvprogs-bench")
+    os.makedirs(datadir, exist_ok=True)
+    data = dataset("daily", int(options.rows), datadir)
+    jobs = ([int(n) for n in options.jobs.split(",") if n] or
+            sorted({2, 4, os.cpu_count() or 1}))
+
+    serial = None
+    expected = None
+    for njobs in [1] + jobs:
+        # csvsort only maps (and so parallelizes) named files
+        cmd = [sys.executable, "-m", "csvprogs.csvsort", "-k", options.keys,
+               "-j", str(njobs), data]
+        runs = [run_once(cmd, None, TOP) for _ in range(options.repeat)]
+        if any(run[2] for run in runs):
+            print(f"-j {njobs}: failed: {runs[0][3]}", file=sys.stderr)
+            return 1
+        wall = min(run[0] for run in runs)
+        serial = serial or wall
+        output = digest(cmd, os.devnull)
+        expected = expected or output
+        rss = max(run[1] for run in runs)
+        print(f"-j {njobs:<3} {wall:8.2f}s {rss / 2**20:8.1f} MiB"
+              f" {serial / wall:5.2f}x"
+              f"{'' if output == expected else ' OUTPUT DIFFERS'}")
+        if output != expected:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
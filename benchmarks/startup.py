@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+"""
+Check the import time of every csvprogs entry point against a budget.
+
+usage: python -m benchmarks.startup [ -r runs ] [ tool ... ]
+
+Each entry point's module is imported in a fresh interpreter with
+"python -X importtime". Its cumulative import time (best of up to runs
+attempts, stopping at the first within budget) is compared with its
+entry in BUDGETS, and the heavy third-party packages it pulls in are
+compared with ALLOWED. Tools like take or keltner are run thousands of
+times from shell loops, so anything they don't need should be imported
+where it's used, not at module level.
+
+One line is printed per tool. The exit status is 1 if any tool is over
+budget or imports a heavy package it isn't allowed.
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+from benchmarks.run import TOP, entry_points
+
+# third-party packages which are slow to import
+HEAVY = ("dateutil", "matplotlib", "numpy", "openpyxl", "pandas", "scipy",
+         "unum", "xlrd")
+
+# heavy packages a tool may import at load time, because every real run
+# needs them
+ALLOWED = {name: {"numpy"}
+               for name in ("atr", "ewma", "hull", "indicators", "mvavg")}
+
+# import time budgets in milliseconds, generous enough to absorb noise on
+# a busy machine
+DEFAULT_BUDGET = 100
+BUDGETS = {name: 300 for name in ALLOWED}
+
+def import_time(module, top=TOP):
+    "return (seconds, set of heavy packages) for importing module"
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c",
+                           f"import {module}"],
+                          stderr=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                          text=True, check=True, cwd=top,
+                          env=dict(os.environ, PYTHONPATH=top))
+    cumulative = None
+    loaded = set()
+    for mat in re.finditer(r"^import time:\s+\d+ \|\s+(\d+) \|\s*(\S+)$",
+                           proc.stderr, re.M):
+        name = mat.group(2)
+        loaded.add(name.split(".")[0])
+        if name == module:
+            cumulative = int(mat.group(1)) / 1e6
+    return (cumulative, loaded & set(HEAVY))
+
+def check(name, module, runs=3, top=TOP):
+    "return (seconds, heavy packages, list of problems) for one tool"
+    budget = BUDGETS.get(name, DEFAULT_BUDGET) / 1000
+    for _ in range(runs):
+        (seconds, heavy) = import_time(module, top)
+        if seconds <= budget:
+            break
+    problems = []
+    if seconds > budget:
+        problems.append(f"{seconds * 1000:.0f}ms over {budget * 1000:.0f}ms"
+                        " budget")
+    extra = heavy - ALLOWED.get(name, set())
+    if extra:
+        problems.append(f"imports {', '.join(sorted(extra))}")
+    return (seconds, heavy, problems)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-r", "--runs", type=int, default=3)
+    parser.add_argument("tools", nargs="*")
+    options = parser.parse_args()
+
+    failed = False
+    for (name, module) in sorted(entry_points(TOP).items()):
+        if options.tools and name not in options.tools:
+            continue
+        (seconds, heavy, problems) = check(name, module, options.runs)
+        failed = failed or bool(problems)
+        print(f"{name:<12} {seconds * 1000:6.1f}ms"
+              f" {' '.join(sorted(heavy)) or '-':<12}"
+              f" {'; '.join(problems) or 'ok'}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -33,7 +33,9 @@ DESCRIPTION
 ===========
 
 Data are read from stdin, the ATR is computed and appended
-to the end of the values, then printed to stdout.
+to the end of the values, then printed to stdout. Every row after the
+first needs a high, low and close, and the first needs a close. A row
+missing one is an error. The date column isn't used.
 
 The ATR definition is from:
 
@@ -47,19 +49,21 @@ SEE ALSO
 """
 
 from contextlib import suppress
-import csv
+import math
 import os
 import sys
 
-import dateutil.parser
+import numpy
 
-from csvprogs.common import CSVArgParser, openpair, usage
+from csvprogs.common import (CSVArgParser, CSVWriter, ColumnReader, openpair,
+                             usage)
+from csvprogs.kernels import TrueRange, Wilder
 
 PROG = os.path.basename(sys.argv[0])
 
 def main():
     parser = CSVArgParser(prog=f"{PROG}", usage=usage(__doc__, globals()))
-    parser.add_argument("--days", "-n", default=14,
+    parser.add_argument("--days", "-n", default=14, type=int,
                         help="length of the atr calculation")
     parser.add_argument("--outcol", default="atr",
                         help="Output column")
@@ -70,51 +74,42 @@ def main():
     (options, args) = parser.parse_known_args()
 
     outcol = options.outcol
-    datecol = options.date
     length = options.days
     insep = options.insep
     outsep = options.outsep
     cols = options.columns.split(",")
     assert len(cols) == 3
 
-    date = None
-    atrs = [None] * length
-    high = low = close = None
-    tr = None
+    true_range = TrueRange()
+    smooth = Wilder(length)
+    first = True
     with openpair(options, args) as (inf, outf):
-        rdr = csv.DictReader(inf, delimiter=insep)
-        fnames = rdr.fieldnames[:]
-        fnames.append(outcol)
-        wtr = csv.DictWriter(outf, delimiter=outsep, fieldnames=fnames)
+        rdr = ColumnReader(inf, delimiter=insep, numeric=cols)
+        wtr = CSVWriter(outf, delimiter=outsep,
+                        float_format=options.float_format)
         if not options.append:
-            wtr.writeheader()
-        for row in rdr:
-            if date is None:
-                # first record, just save the close price
-                close = float(row[cols[2]])
-            else:
-                high = float(row[cols[0]])
-                low = float(row[cols[1]])
-            date = dateutil.parser.parse(row[datecol]).date()
-            if high is None:
-                continue
-            hl = high - low
-            lc = abs(low - close)
-            hc = abs(high - close)
-
-            # today's close is tomorrow's prev close
-            close = float(row[cols[2]])
-
-            tr_today = max(hl, lc, hc)
-            atrs.append(tr_today)
-            atrs.pop(0)
-            if None not in atrs:
-                if tr is None:
-                    tr = sum(atrs) / len(atrs)
-                else:
-                    tr = (tr * (len(atrs) - 1) + tr_today) / len(atrs)
-                row[outcol] = tr
-            wtr.writerow(row)
+            wtr.writerow(rdr.fieldnames + [outcol])
+        for batch in rdr:
+            rows = batch.rows
+            (high, low, close) = (batch[col] for col in cols)
+            # A NaN would poison the smoothing for good, so, as before,
+            # empty prices are an error.
+            missing = numpy.isnan(high) | numpy.isnan(low) | numpy.isnan(close)
+            if first:
+                missing[0] = numpy.isnan(close[0])
+            if missing.any():
+                row = rows[int(missing.argmax())]
+                print(f"{PROG}: missing {options.columns} value in row"
+                      f" {options.insep.join(row)!r}", file=sys.stderr)
+                return 1
+            tr = true_range.batch(high, low, close)
+            if first:
+                # the first record only provides the previous close
+                (rows, tr) = (rows[1:], tr[1:])
+                first = False
+            atrs = smooth.batch(tr).tolist()
+            wtr.writerows(row + ["" if math.isnan(atr) else atr]
+                              for (row, atr) in zip(rows, atrs))
     return 0
 
 if __name__ == "__main__":
@@ -51,13 +51,13 @@ import datetime
 import os
 import re
 
-import dateutil.parser
-import unum.units
-
-from csvprogs.common import CSVArgParser, openpair
+from csvprogs.common import CSVArgParser, CSVWriter, DateParser, openpair
 
 PROG = os.path.basename(sys.argv[0])
 
+# the common units, in seconds
+SECONDS = {"s": 1, "min": 60, "h": 3600, "d": 86400}
+
 def main():
     parser = CSVArgParser()
     parser.add_argument("-b", "--barlen", dest="barlen", default="60s",
@@ -70,34 +70,44 @@ def main():
                         help="column used to construct bars")
     (options, args) = parser.parse_known_args()
 
-    # Use time units to allow smaller magnitudes for longer bars. For example,
-    # you can give "1h" instead of "3600s" for one-hour bars.
+    barlen = bar_seconds(options.barlen)
 
     with openpair(options, args) as (inf, outf):
         rdr = csv.DictReader(inf, delimiter=options.insep)
-        wtr = csv.DictWriter(outf, delimiter=options.outsep,
-            fieldnames=rdr.fieldnames + [options.name])
+        wtr = CSVWriter(outf, delimiter=options.outsep,
+            fieldnames=rdr.fieldnames + [options.name],
+            float_format=options.float_format)
         if not options.append:
             wtr.writeheader()
 
-        mat = re.match(r"([0-9]+)\s*([a-z]*)", options.barlen.strip())
-        val = int(mat.group(1))
-        units = getattr(unum.units, mat.group(2) or "s")
-        barlen = int((val * units).asNumber(unum.units.s))
-
         generate_bars(rdr, wtr, options.time, options.price, options.name, barlen)
 
     return 0
 
+def bar_seconds(barlen):
+    "convert a bar length like '60s' or '1h' to seconds"
+    # Use time units to allow smaller magnitudes for longer bars. For example,
+    # you can give "1h" instead of "3600s" for one-hour bars.
+    mat = re.match(r"([0-9]+)\s*([a-z]*)", barlen.strip())
+    val = int(mat.group(1))
+    unit = mat.group(2) or "s"
+    if unit in SECONDS:
+        return val * SECONDS[unit]
+    # unum is slow to import, so only fall back to it for unusual units.
+    # pylint: disable=import-outside-toplevel
+    import unum.units
+    return int((val * getattr(unum.units, unit)).asNumber(unum.units.s))
+
 def generate_bars(rdr, wtr, time, price, barname, barlen):
     interval = datetime.timedelta(seconds=barlen)
+    parse = DateParser()
 
     barstart = ""
     prev_last = last = ""
     close = ""
 
     for row in rdr:
-        dt = dateutil.parser.parse(row[time])
+        dt = parse(row[time])
         prev_last = last
         if row[price]:
             last = float(row[price])
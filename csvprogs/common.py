@@ -5,27 +5,64 @@ Common arg processing for this group of CSV programs
 """
 
 import argparse
-from contextlib import contextmanager
-from functools import partial
+import array
+import atexit
+from collections.abc import Mapping
+from contextlib import ExitStack, contextmanager, nullcontext
+import csv
+import datetime
+from functools import partial, lru_cache
+import glob
+import heapq
+import importlib
 import io
-from locale import getlocale, atoi, atof
+import itertools
+from locale import getlocale, setlocale, atoi, atof, localeconv, LC_ALL
+import mmap
 import os
+import operator
+import re
+import stat
 import sys
+import time
 
-import dateutil.parser
 from public import public
 
 LOCALE = ".".join(getlocale())
 
 SECONDS_PER_DAY = 60 * 60 * 24
 
+# rows per ColumnReader batch
+BATCH_SIZE = 8192
+
+# bytes per block decoded by MappedFile
+MAP_BLOCK_SIZE = 1 << 20
+
+# modules which read files with these extensions, imported when needed
+COMPRESSED = {".gz": "gzip", ".bz2": "bz2", ".xz": "lzma"}
+
+# default memory budget for ExternalSort
+SORT_MEMORY = "1G"
+
+# bytes of input per piece handed to a worker process by parallel_map
+CHUNK_SIZE = 1 << 22
+
+# set up by enable_stats() for --stats and --profile
+_STATS = None
+_PROFILER = None
+
 
 @public
 class CSVArgParser(argparse.ArgumentParser):
-    "ArgumentParser with some behavior common to all CSV progs/data filters"
+    """ArgumentParser with some behavior common to all CSV progs/data filters.
+
+    Tools which never write numbers they computed pass float_format=False
+    to leave out --float-format.
+    """
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, float_format=True, **kwargs):
         argparse.ArgumentParser.__init__(self, *args, **kwargs)
+        self.float_format = float_format
         self.add_common_args()
 
     def add_common_args(self):
@@ -42,6 +79,360 @@ class CSVArgParser(argparse.ArgumentParser):
                           help="encoding of both input and output files")
         self.add_argument("-a", "--append", default=False, action='store_true',
                           help="append rows to output (no header is written)")
+        if self.float_format:
+            self.add_argument("--float-format", dest="float_format",
+                              default=None, type=float_format,
+                              help="printf-style float output format,"
+                              " e.g. %%.6g")
+        self.add_argument("--stats", default=False, action="store_true",
+                          help="report lines, bytes, timing and memory use"
+                          " to stderr at exit")
+        self.add_argument("--profile", default=None, metavar="FILE",
+                          help="write cProfile statistics to FILE at exit")
+
+    def parse_known_args(self, args=None, namespace=None):
+        "parse as usual, then start collecting --stats/--profile data"
+        (options, rest) = super().parse_known_args(args, namespace)
+        if getattr(options, "stats", False) or getattr(options, "profile", None):
+            enable_stats(os.path.splitext(self.prog)[0], options.stats,
+                         options.profile)
+        return (options, rest)
+
+def float_format(fmt):
+    "validate a --float-format argument"
+    try:
+        fmt % 1.0
+    except (TypeError, ValueError):
+        raise argparse.ArgumentTypeError(f"invalid float format: {fmt!r}")
+    return fmt
+
+class Stats:
+    """Lines, bytes and per-phase times gathered for --stats.
+
+    Lines are newlines read and written, not CSV records: they include the
+    header and count a quoted field spanning lines more than once.
+
+    Elapsed time is charged to one phase at a time: enter() switches to a
+    new phase and returns the old one, so nested phases are exclusive.
+    Anything not otherwise accounted for is "compute".
+    """
+
+    PHASES = ("parse", "convert", "compute", "write")
+
+    def __init__(self, prog):
+        self.prog = prog
+        self.start = self.mark = time.perf_counter()
+        self.cpu = time.process_time()
+        self.phase = "compute"
+        self.times = dict.fromkeys(self.PHASES, 0.0)
+        self.lines_in = self.lines_out = self.bytes_in = self.bytes_out = 0
+
+    def enter(self, phase):
+        "charge elapsed time to the current phase and switch to phase"
+        now = time.perf_counter()
+        self.times[self.phase] += now - self.mark
+        self.mark = now
+        (prev, self.phase) = (self.phase, phase)
+        return prev
+
+    @contextmanager
+    def timing(self, phase):
+        "charge the time spent in the with block to phase"
+        prev = self.enter(phase)
+        try:
+            yield
+        finally:
+            self.enter(prev)
+
+    def timed(self, iterable, phase):
+        "charge the time spent producing each element of iterable to phase"
+        iterator = iter(iterable)
+        while True:
+            prev = self.enter(phase)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.enter(prev)
+            yield item
+
+    def report(self, file=None):
+        "print a one-line summary"
+        self.enter("compute")
+        wall = time.perf_counter() - self.start
+        cpu = time.process_time() - self.cpu
+        lines = self.lines_in or self.lines_out
+        rss = peak_rss()
+        phases = ", ".join(f"{name} {self.times[name]:.3f}s"
+                             for name in self.PHASES)
+        print(f"{self.prog}: lines in {self.lines_in} ({self.bytes_in} bytes),"
+              f" out {self.lines_out} ({self.bytes_out} bytes);"
+              f" wall {wall:.3f}s, cpu {cpu:.3f}s,"
+              f" {lines / wall if wall else 0:.0f} lines/s,"
+              f" peak RSS {'?' if rss is None else f'{rss / 2**20:.1f}'} MiB;"
+              f" {phases}", file=file or sys.stderr)
+
+class StatsFile:
+    """File wrapper counting the lines and bytes passing through it.
+
+    Bytes are those of the encoded text, after newline translation, so
+    they may differ slightly from the size of the file.
+
+    Time spent reading is charged to the parse phase, time spent writing
+    to the write phase. Everything else is delegated to the file.
+    """
+
+    def __init__(self, file, stats):
+        self.file = file
+        self.stats = stats
+        self.codec = getattr(file, "encoding", None) or "utf-8"
+
+    def __getattr__(self, attr):
+        return getattr(self.file, attr)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return self.file.__exit__(*args)
+
+    def __iter__(self):
+        return self
+
+    def _read(self, func, *args):
+        "call func, counting what it returns as input"
+        prev = self.stats.enter("parse")
+        try:
+            data = func(*args)
+        finally:
+            self.stats.enter(prev)
+        if isinstance(data, list):
+            data = "".join(data)
+        self.stats.lines_in += data.count("\n")
+        self.stats.bytes_in += len(data.encode(self.codec, "replace"))
+        return data
+
+    def __next__(self):
+        line = self._read(self.file.readline)
+        if not line:
+            raise StopIteration
+        return line
+
+    def read(self, *args):
+        "read from the file"
+        return self._read(self.file.read, *args)
+
+    def readline(self, *args):
+        "read a line from the file"
+        return self._read(self.file.readline, *args)
+
+    def readlines(self, *args):
+        "read lines from the file"
+        return self._read(self.file.readlines, *args).splitlines(True)
+
+    def write(self, data):
+        "write to the file"
+        prev = self.stats.enter("write")
+        try:
+            result = self.file.write(data)
+        finally:
+            self.stats.enter(prev)
+        self.stats.lines_out += data.count("\n")
+        self.stats.bytes_out += len(data.encode(self.codec, "replace"))
+        return result
+
+    def writelines(self, lines):
+        "write lines to the file"
+        for line in lines:
+            self.write(line)
+
+@public
+def enable_stats(prog, stats=True, profile=None):
+    """Start gathering --stats data and/or a --profile for this process.
+
+    Reports and profile data are written at exit. sys.stdin and sys.stdout
+    are wrapped to count rows and bytes, as are files opened with openi,
+    openio and openpair.
+    """
+    # pylint: disable=global-statement
+    global _STATS, _PROFILER
+    if stats and _STATS is None:
+        _STATS = Stats(prog)
+        sys.stdin = StatsFile(sys.stdin, _STATS)
+        sys.stdout = StatsFile(sys.stdout, _STATS)
+        atexit.register(_STATS.report)
+    if profile and _PROFILER is None:
+        # pylint: disable=import-outside-toplevel
+        import cProfile
+        _PROFILER = cProfile.Profile()
+        # atexit runs these last in, first out
+        atexit.register(_PROFILER.dump_stats, profile)
+        atexit.register(_PROFILER.disable)
+        _PROFILER.enable()
+
+@public
+def peak_rss():
+    "peak resident set size of this process in bytes, None if unknown"
+    try:
+        # pylint: disable=import-outside-toplevel
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return rss if sys.platform == "darwin" else rss * 1024
+
+@public
+def timed(iterable, phase):
+    "iterable, with --stats charging time spent producing elements to phase"
+    if _STATS is None:
+        return iterable
+    return _STATS.timed(iterable, phase)
+
+@public
+def stats_phase(phase):
+    "context manager charging --stats time to phase"
+    if _STATS is None:
+        return nullcontext()
+    return _STATS.timing(phase)
+
+@public
+class MappedFile:
+    """Read-only text view of a regular file through mmap.
+
+    Iterating yields the lines of the file, decoded a large block at a
+    time. Every iteration starts again from the beginning, so a tool which
+    needs more than one pass over its input can simply iterate again
+    instead of holding all its rows in memory. line_offsets() and line()
+    give random access to lines by byte offset.
+
+    Lines end at "\\n", with "\\r\\n" translated to "\\n" as in text
+    mode. The encoding must be ASCII-compatible (see mappable()).
+    """
+
+    def __init__(self, file, encoding="utf-8"):
+        self.name = getattr(file, "name", None)
+        self.encoding = encoding
+        self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.size = len(self._map)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        "unmap the file"
+        self._map.close()
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(
+            io.StringIO(self._decode(start, end), newline="\n")
+                for (start, end) in self._blocks())
+
+    def _blocks(self):
+        "yield (start, end) byte offsets of blocks ending at a newline"
+        (pos, size) = (0, len(self._map))
+        while pos < size:
+            end = self._map.find(b"\n", pos + MAP_BLOCK_SIZE - 1)
+            end = size if end < 0 else end + 1
+            yield (pos, end)
+            pos = end
+
+    def _decode(self, start, end):
+        "text of bytes start:end"
+        return self._text(self._map[start:end])
+
+    def raw(self, start, end):
+        "undecoded bytes between byte offsets start and end"
+        return self._map[start:end]
+
+    def _text(self, data):
+        "decode bytes data"
+        text = data.decode(self.encoding)
+        if _STATS is not None:
+            _STATS.lines_in += text.count("\n")
+            _STATS.bytes_in += len(data)
+        return text.replace("\r\n", "\n") if "\r" in text else text
+
+    def line_offsets(self):
+        "array of the byte offsets at which lines start, plus the file size"
+        offsets = array.array("q", [0])
+        for (start, end) in self._blocks():
+            pieces = self._map[start:end].split(b"\n")
+            starts = list(itertools.accumulate(
+                (len(piece) + 1 for piece in pieces), initial=start))
+            # starts[0] is already there and starts[-1] is one past the end
+            offsets.extend(starts[1:-1])
+            if pieces[-1]:
+                # last line has no newline
+                offsets.append(end)
+        return offsets
+
+    def record_starts(self, offsets, quotechar='"'):
+        """Move each byte offset forward to the start of the next CSV record.
+
+        A newline ends a record if an even number of quotechars precede
+        it, which holds for csv's default doubled-quote escaping. offsets
+        must be in increasing order.
+        """
+        mapped = self._map
+        quote = quotechar.encode(self.encoding)
+        (pos, quotes) = (0, 0)
+        result = []
+        for offset in offsets:
+            if offset < pos:
+                result.append(pos)
+                continue
+            quotes += self._count(quote, pos, offset)
+            pos = offset
+            while pos < len(mapped):
+                end = mapped.find(b"\n", pos)
+                end = len(mapped) if end < 0 else end + 1
+                quotes += self._count(quote, pos, end)
+                pos = end
+                if quotes % 2 == 0:
+                    break
+            result.append(pos)
+        return result
+
+    def _count(self, data, start, end):
+        "occurrences of data between byte offsets start and end"
+        total = 0
+        for block in range(start, end, MAP_BLOCK_SIZE):
+            stop = min(block + MAP_BLOCK_SIZE, end)
+            total += self._map[block:stop].count(data)
+        return total
+
+    def lines(self, offsets, indexes):
+        """decoded text of lines indexes, in that order, concatenated.
+
+        offsets is the result of line_offsets(), so line i runs from
+        offsets[i] to offsets[i + 1].
+        """
+        mapped = self._map
+        return self._text(b"".join([mapped[offsets[i]:offsets[i + 1]]
+                                        for i in indexes]))
+
+@public
+def mappable(file, encoding="utf-8"):
+    "True if file is a non-empty regular file MappedFile can read"
+    if "\n".encode(encoding) != b"\n":
+        # UTF-16, a BOM or the like
+        return False
+    try:
+        info = os.fstat(file.fileno())
+    except (AttributeError, OSError, ValueError):
+        return False
+    return stat.S_ISREG(info.st_mode) and info.st_size > 0
+
+def _counted(file):
+    "wrap file for --stats if enabled"
+    if _STATS is None:
+        return file
+    return StatsFile(file, _STATS)
 
 @public
 @contextmanager
@@ -53,12 +444,16 @@ def openi(infile, imode, encoding="utf-8"):
     else:
         iopen = partial(open, infile, imode, encoding=encoding)
     with iopen() as inf:
-        yield inf
+        yield _counted(inf)
 
 @public
 @contextmanager
-def openio(infile, imode, outfile, omode, encoding="utf-8"):
-    "open infile and outfile, guaranteeing automatic closure."
+def openio(infile, imode, outfile, omode, encoding="utf-8", mapped=False):
+    """open infile and outfile, guaranteeing automatic closure.
+
+    If mapped is true and infile turns out to be a regular file, it is
+    read through a MappedFile. Pipes and terminals are read as usual.
+    """
     if hasattr(infile, "fileno"):
         # need to reopen this file object
         iopen = partial(os.fdopen, infile.fileno(), imode, encoding=encoding)
@@ -70,17 +465,143 @@ def openio(infile, imode, outfile, omode, encoding="utf-8"):
     else:
         oopen = partial(open, outfile, omode, encoding=encoding)
     with (iopen() as inf, oopen() as outf):
-        yield (inf, outf)
+        if mapped and "b" not in imode and mappable(inf, encoding):
+            with MappedFile(inf, encoding) as minf:
+                yield (minf, _counted(outf))
+        else:
+            yield (_counted(inf), _counted(outf))
 
 @public
 @contextmanager
-def openpair(options, args):
+def openpair(options, args, mapped=False):
     mode = "a" if options.append else "w"
     with openio(args[0] if len(args) >= 1 else sys.stdin, "r",
                 args[1] if len(args) == 2 else sys.stdout, mode,
-                encoding=options.encoding) as (inf, outf):
+                encoding=options.encoding, mapped=mapped) as (inf, outf):
         yield (inf, outf)
 
+@public
+def expand_inputs(names):
+    """expand glob patterns in a list of input file names.
+
+    The matches of each pattern are sorted. "-" and patterns which match
+    nothing are kept as given, so opening them reads stdin or fails with
+    the usual error.
+    """
+    result = []
+    for name in names:
+        matches = sorted(glob.glob(name)) if glob.has_magic(name) else []
+        result.extend(matches or [name])
+    return result
+
+@public
+def open_input(name, encoding="utf-8"):
+    """open the input file name as text.
+
+    "-" is stdin (which is left open on close), and files ending in .gz,
+    .bz2 or .xz are decompressed as they are read.
+    """
+    if name == "-":
+        return os.fdopen(sys.stdin.fileno(), "r", encoding=encoding,
+                         closefd=False)
+    module = COMPRESSED.get(os.path.splitext(name)[1])
+    if module is not None:
+        return importlib.import_module(module).open(name, "rt",
+                                                    encoding=encoding)
+    return open(name, encoding=encoding)
+
+@public
+@contextmanager
+def openinputs(names, encoding="utf-8"):
+    "open every input in expand_inputs(names), closing them all on exit"
+    with ExitStack() as stack:
+        yield [_counted(stack.enter_context(open_input(name, encoding)))
+                 for name in expand_inputs(names)]
+
+@public
+def rescannable(inf):
+    """inf if it can be read more than once, else a list of its lines.
+
+    Open inf with mapped=True so regular files come back as MappedFiles,
+    which are scanned again rather than held in memory.
+    """
+    return inf if isinstance(inf, MappedFile) else list(inf)
+
+@public
+def record_chunks(inf, size=CHUNK_SIZE, quotechar='"'):
+    """Yield the records after the header of inf in pieces of about size bytes.
+
+    inf is either a MappedFile, which is split into undecoded byte ranges,
+    or a text file whose header has already been read, whose lines are
+    gathered into strings. Pieces end at the end of a record, judged as
+    MappedFile.record_starts does. chunk_text decodes a piece.
+    """
+    if isinstance(inf, MappedFile):
+        start = inf.record_starts([0])[0]
+        bounds = inf.record_starts(range(start + size, inf.size, size))
+        bounds = sorted(set([start] + bounds + [inf.size]))
+        for (start, end) in zip(bounds, bounds[1:]):
+            yield inf.raw(start, end)
+        return
+    (lines, length, quotes) = ([], 0, 0)
+    for line in inf:
+        lines.append(line)
+        length += len(line)
+        quotes += line.count(quotechar)
+        if length >= size and quotes % 2 == 0:
+            yield "".join(lines)
+            (lines, length, quotes) = ([], 0, 0)
+    if lines:
+        yield "".join(lines)
+
+@public
+def chunk_text(chunk, encoding="utf-8"):
+    "a piece from record_chunks as text"
+    if isinstance(chunk, str):
+        return chunk
+    text = chunk.decode(encoding)
+    return text.replace("\r\n", "\n") if "\r" in text else text
+
+@public
+def chunk_sample(chunks, reader, size, encoding="utf-8"):
+    """Return the first size rows of chunks, and chunks again.
+
+    reader makes an iterator of rows from a text file, such as a
+    csv.DictReader with the header's fieldnames. Only the pieces needed
+    for the sample are read (and parsed twice).
+    """
+    chunks = iter(chunks)
+    (head, rows) = ([], [])
+    for chunk in chunks:
+        head.append(chunk)
+        rows.extend(itertools.islice(
+            reader(io.StringIO(chunk_text(chunk, encoding), newline="\n")),
+            size - len(rows)))
+        if len(rows) >= size:
+            break
+    return (rows, itertools.chain(head, chunks))
+
+@public
+def parallel_map(func, chunks, jobs, args=(), locale=LOCALE):
+    """Yield func(chunk, *args) for each of chunks, in order.
+
+    The calls are made in a pool of jobs worker processes, with locale
+    set. No more than two chunks per worker are queued at once, so the
+    input is read only as fast as it is processed.
+    """
+    # multiprocessing takes longer to import than most tools
+    # pylint: disable=import-outside-toplevel
+    from concurrent.futures import ProcessPoolExecutor
+    pending = []
+    with ProcessPoolExecutor(jobs, initializer=setlocale,
+                             initargs=(LC_ALL, locale)) as pool:
+        for chunk in chunks:
+            if len(pending) >= 2 * jobs:
+                yield pending.pop(0).result()
+            pending.append(pool.submit(func, chunk, *args))
+        while pending:
+            yield pending.pop(0).result()
+
 @public
 def usage(docstring, global_dict, msg=None):
     "common extraction of __doc__"
@@ -104,6 +625,14 @@ def usage(docstring, global_dict, msg=None):
 
     return output.getvalue()
 
+def _parse_date(string):
+    "dateutil.parser.parse, imported on first use"
+    # dateutil.parser takes longer to import than everything else common
+    # needs, and many tools never parse a date.
+    # pylint: disable=import-outside-toplevel
+    import dateutil.parser
+    return dateutil.parser.parse(string)
+
 @public
 def type_convert(string, keep_tz=True):
     """Try to coerce a string value into various Python types.
@@ -115,7 +644,7 @@ def type_convert(string, keep_tz=True):
     field will be cleared.
     """
 
-    for cvt in (atoi, atof, dateutil.parser.parse):
+    for cvt in (atoi, atof, _parse_date):
         try:
             result = cvt(string)
         except ValueError:
@@ -127,6 +656,514 @@ def type_convert(string, keep_tz=True):
     # nothing matched, punt...
     return string
 
+@public
+class DateParser:
+    """Callable timestamp parser which learns the format of its inputs.
+
+    The first `sample` values are parsed with dateutil.parser.parse. They are
+    then used to validate a faster strategy, either datetime.fromisoformat or
+    datetime.strptime using a format guessed by pandas. If a fast strategy
+    gives identical results for every sampled value it is used from then on,
+    with dateutil as the fallback for any value it rejects. Results are kept
+    in an LRU cache, as timestamps are frequently repeated in tick data.
+
+    Use one parser per column. Values which don't match the learned format
+    are still parsed correctly, just slowly.
+    """
+
+    def __init__(self, sample=5, cache_size=4096):
+        self.sample = sample
+        # strptime format in use, if any
+        self.format = None
+        self._samples = []
+        self._fast = None
+        self._cached = lru_cache(maxsize=cache_size)(self._parse)
+
+    def __call__(self, string):
+        return self._cached(string)
+
+    def _parse(self, string):
+        if self._fast is not None:
+            try:
+                return self._fast(string)
+            except ValueError:
+                pass
+            return _parse_date(string)
+
+        result = _parse_date(string)
+        if self._samples is not None:
+            self._samples.append((string, result))
+            if len(self._samples) >= self.sample:
+                self._learn()
+        return result
+
+    def _learn(self):
+        "pick a fast parsing strategy which agrees with the samples"
+        samples, self._samples = self._samples, None
+        if self._agrees(datetime.datetime.fromisoformat, samples):
+            self._fast = datetime.datetime.fromisoformat
+            return
+
+        # Only pay for the pandas import if ISO parsing isn't enough.
+        # pylint: disable=import-outside-toplevel
+        from pandas.tseries.api import guess_datetime_format
+        fmt = guess_datetime_format(samples[0][0])
+        if fmt is None:
+            return
+
+        def strptime(string):
+            return datetime.datetime.strptime(string, fmt)
+        if self._agrees(strptime, samples):
+            self._fast = strptime
+            self.format = fmt
+
+    @staticmethod
+    def _agrees(func, samples):
+        "True if func(string) reproduces all the sampled results"
+        for (string, expected) in samples:
+            try:
+                result = func(string)
+            except (ValueError, TypeError):
+                return False
+            if (result != expected or
+                result.utcoffset() != expected.utcoffset()):
+                return False
+        return True
+
+def _make_converter(values, keep_tz=True):
+    """Pick a converter for a column given a sample of its non-empty values.
+
+    The converter decides the type once, so the common case costs a single
+    conversion instead of a cascade of failed ones.  Values which don't fit
+    the chosen type are handed to type_convert.
+    """
+    conv = localeconv()
+    sep = re.escape(conv["thousands_sep"])
+    point = re.escape(conv["decimal_point"])
+    is_int = re.compile(rf"\s*[+-]?[0-9_{sep}]+\s*").fullmatch
+    # a superset of what atoi and atof accept
+    is_number = re.compile(rf"\s*[+-]?(?:[0-9_{sep}{point}]+(?:e[+-]?[0-9_]+)?"
+                           r"|nan|inf|infinity)\s*", re.IGNORECASE).fullmatch
+    # atoi and atof consult the locale on every call, which dominates
+    # when the locale leaves numbers alone
+    if conv["thousands_sep"] or conv["decimal_point"] != ".":
+        (to_int, to_float) = (atoi, atof)
+    else:
+        (to_int, to_float) = (int, float)
+
+    def convert_int(string):
+        if not string:
+            return string
+        try:
+            return to_int(string)
+        except ValueError:
+            return type_convert(string, keep_tz)
+
+    def convert_float(string):
+        if not string:
+            return string
+        try:
+            # type_convert prefers int to float
+            return to_int(string) if is_int(string) else to_float(string)
+        except ValueError:
+            return type_convert(string, keep_tz)
+
+    parse = DateParser()
+    def convert_datetime(string):
+        if not string:
+            return string
+        if is_number(string):
+            return type_convert(string, keep_tz)
+        try:
+            result = parse(string)
+        except ValueError:
+            return string
+        return result if keep_tz else result.replace(tzinfo=None)
+
+    def convert_str(string):
+        if string and is_number(string):
+            return type_convert(string, keep_tz)
+        return string
+
+    def convert_any(string):
+        return type_convert(string, keep_tz) if string else string
+
+    if not values:
+        # nothing to go on
+        return convert_any
+    for (convert, test) in ((convert_int, atoi), (convert_float, atof)):
+        try:
+            for string in values:
+                test(string)
+        except ValueError:
+            continue
+        return convert
+    # A few bad timestamps shouldn't demote a column of dates to strings.
+    dates = 0
+    for string in values:
+        try:
+            _parse_date(string)
+        except (ValueError, OverflowError):
+            pass
+        else:
+            dates += 1
+    return convert_datetime if 2 * dates > len(values) else convert_str
+
+@public
+def column_converters(rows, keep_tz=True):
+    """Infer a converter for each column from a sample of rows.
+
+    Rows may be dicts (keyed by column name) or lists (keyed by offset).
+    The result maps each key to a function which converts one cell of that
+    column much as type_convert would, but without trying every type in
+    turn. Numeric and datetime columns are decided once; cells which look
+    numeric are always converted, but string columns are not searched for
+    stray dates.
+    """
+    samples = {}
+    for row in rows:
+        items = row.items() if isinstance(row, dict) else enumerate(row)
+        for (key, value) in items:
+            column = samples.setdefault(key, [])
+            if isinstance(value, str) and value:
+                column.append(value)
+    return {key: _make_converter(values, keep_tz)
+                for (key, values) in samples.items()}
+
+@public
+def typed_rows(rows, sample=100, keep_tz=True, converters=None):
+    """Generate rows with their cells converted to int, float or datetime.
+
+    The first `sample` rows are used to pick a converter per column (see
+    column_converters), then every row is converted in place and yielded.
+    Only the sample is buffered, so this works on arbitrarily long streams.
+    converters, if given, are used instead, so that pieces of one input
+    can be converted alike.
+    """
+    return timed(_typed_rows(timed(rows, "parse"), sample, keep_tz,
+                             converters), "convert")
+
+def _typed_rows(rows, sample, keep_tz, converters=None):
+    "guts of typed_rows"
+    rows = iter(rows)
+    head = []
+    if converters is None:
+        head = list(itertools.islice(rows, sample))
+        converters = column_converters(head, keep_tz)
+    default = partial(type_convert, keep_tz=keep_tz)
+    for row in itertools.chain(head, rows):
+        if isinstance(row, dict):
+            for key in row:
+                row[key] = converters.get(key, default)(row[key])
+        else:
+            for (key, value) in enumerate(row):
+                row[key] = converters.get(key, default)(value)
+        yield row
+
+@public
+class ColumnReader:
+    """Read CSV input as a stream of column batches rather than row dicts.
+
+    Iterating over the reader yields ColumnBatch objects holding up to
+    batch_size consecutive rows. Columns named in numeric are presented as
+    numpy float arrays, all others as lists of strings. Only one batch is
+    held in memory at a time, so stdin pipelines still stream.
+    """
+
+    def __init__(self, inf, delimiter=",", numeric=(), batch_size=BATCH_SIZE):
+        self.reader = timed(csv.reader(inf, delimiter=delimiter), "parse")
+        self.fieldnames = next(self.reader, [])
+        self.numeric = frozenset(numeric)
+        self.batch_size = batch_size
+        self.index = {name: i for (i, name) in enumerate(self.fieldnames)}
+
+    def __iter__(self):
+        width = len(self.fieldnames)
+        while True:
+            rows = list(itertools.islice(self.reader, self.batch_size))
+            if not rows:
+                return
+            for row in rows:
+                # DictReader would have filled these in
+                if len(row) < width:
+                    row.extend([""] * (width - len(row)))
+            yield ColumnBatch(self, rows)
+
+@public
+class ColumnBatch(Mapping):
+    """Consecutive rows from a ColumnReader, viewed as columns.
+
+    batch[name] is a numpy array for the reader's numeric columns (empty
+    cells become NaN) and a list of strings otherwise. Columns are only
+    extracted when first asked for. The raw rows (lists of strings, padded to
+    the width of the header) are available as batch.rows for output.
+    """
+
+    def __init__(self, reader, rows):
+        self.reader = reader
+        self.rows = rows
+        self._columns = {}
+
+    def __getitem__(self, name):
+        try:
+            return self._columns[name]
+        except KeyError:
+            pass
+        offset = self.reader.index[name]
+        column = [row[offset] for row in self.rows]
+        if name in self.reader.numeric:
+            # pylint: disable=import-outside-toplevel
+            import numpy
+            with stats_phase("convert"):
+                column = numpy.array([val or "nan" for val in column],
+                                     dtype=float)
+        self._columns[name] = column
+        return column
+
+    def __contains__(self, name):
+        return name in self.reader.index
+
+    def __iter__(self):
+        return iter(self.reader.fieldnames)
+
+    def __len__(self):
+        return len(self.reader.fieldnames)
+
+@public
+class CSVWriter:
+    """Fast replacement for csv.writer and csv.DictWriter.
+
+    Rows may be sequences or dicts. Dict rows are laid out in fieldnames
+    order with a precompiled itemgetter. Missing keys are written empty.
+    As with csv.DictWriter, keys not in fieldnames raise ValueError unless
+    extrasaction is "ignore", but they are only looked for when the row
+    doesn't have exactly the keys in fieldnames. If float_format is given,
+    float values are written as float_format % value. Other keyword
+    arguments are passed to csv.writer.
+    """
+
+    def __init__(self, outf, fieldnames=None, float_format=None,
+                 extrasaction="raise", **fmtparams):
+        if extrasaction not in ("raise", "ignore"):
+            raise ValueError(f"extrasaction ({extrasaction}) must be"
+                             " 'raise' or 'ignore'")
+        self.fieldnames = list(fieldnames) if fieldnames is not None else None
+        self.float_format = float_format
+        self.extrasaction = extrasaction
+        self.writer = csv.writer(outf, **fmtparams)
+        if self.fieldnames:
+            self._getter = operator.itemgetter(*self.fieldnames)
+            if len(self.fieldnames) == 1:
+                self._getter = lambda row, get=self._getter: (get(row),)
+        if _STATS is not None:
+            self._values = self._timed_values
+
+    def _timed_values(self, row):
+        "_values for --stats, charging the time to the write phase"
+        with _STATS.timing("write"):
+            return CSVWriter._values(self, row)
+
+    def _values(self, row):
+        "row as a sequence ready for csv.writer"
+        if isinstance(row, dict):
+            if not self.fieldnames:
+                raise ValueError("CSVWriter needs fieldnames to write dict rows")
+            if (len(row) != len(self.fieldnames) and
+                self.extrasaction == "raise"):
+                self._check_extras(row)
+            try:
+                row = self._getter(row)
+            except KeyError:
+                if self.extrasaction == "raise":
+                    self._check_extras(row)
+                row = list(map(row.get, self.fieldnames))
+        fmt = self.float_format
+        if fmt is not None:
+            row = [fmt % val if isinstance(val, float) else val for val in row]
+        return row
+
+    def _check_extras(self, row):
+        "raise ValueError if row has keys not in fieldnames"
+        extras = row.keys() - self.fieldnames
+        if extras:
+            raise ValueError("dict contains fields not in fieldnames: "
+                             + ", ".join(sorted(map(repr, extras))))
+
+    def writeheader(self):
+        "write fieldnames"
+        self.writer.writerow(self.fieldnames)
+
+    def writerow(self, row):
+        "write a single row"
+        self.writer.writerow(self._values(row))
+
+    def writerows(self, rows):
+        "write an iterable of rows"
+        self.writer.writerows(map(self._values, rows))
+
+@public
+def parse_size(size):
+    "convert a size like 512M or 2G (powers of 1024) to bytes"
+    mat = re.fullmatch(r"\s*([0-9.]+)\s*([kmgt]?)i?b?\s*", size, re.IGNORECASE)
+    if mat is None:
+        raise ValueError(f"invalid size: {size!r}")
+    scale = 1024 ** " kmgt".index(mat.group(2).lower() or " ")
+    return int(float(mat.group(1)) * scale)
+
+@public
+class ExternalSort:
+    """Sort rows which may not fit in memory.
+
+    Rows (lists of strings) are collected until their estimated size
+    reaches memory bytes, then sorted by key and spilled to a temporary
+    file as CSV. The sorted runs are then merged with heapq.merge. Both
+    steps are stable, so the result is the same as sorted(rows, key=key).
+    If everything fits, nothing touches the disk.
+
+    After sorting, runs holds the number of sorted runs (1 if nothing was
+    spilled) and spilled the number of bytes written to temporary files.
+    """
+
+    # rows between size estimates
+    SAMPLE = 64
+    # most runs merged at once
+    MAX_MERGE = 128
+
+    def __init__(self, key, memory=SORT_MEMORY, tmpdir=None):
+        self.key = key
+        self.memory = parse_size(memory) if isinstance(memory, str) else memory
+        self.tmpdir = tmpdir
+        self.runs = 0
+        self.spilled = 0
+
+    @staticmethod
+    def row_size(row):
+        "rough memory footprint of a row and its key"
+        # the sort key costs about as much again as the list
+        return 2 * sys.getsizeof(row) + sum(map(sys.getsizeof, row))
+
+    def sort(self, rows):
+        "yield rows in sorted order"
+        with ExitStack() as stack:
+
+            def spill(run, presorted=False):
+                # only tools which spill pay for importing tempfile
+                # pylint: disable=import-outside-toplevel
+                import tempfile
+                file = stack.enter_context(
+                    tempfile.TemporaryFile("w+", encoding="utf-8",
+                                           newline="", dir=self.tmpdir))
+                return self._spill(file, run, presorted)
+
+            files = []
+            run = []
+            used = 0
+            for row in rows:
+                run.append(row)
+                if len(run) % self.SAMPLE == 0:
+                    used += self.SAMPLE * self.row_size(row)
+                    if used >= self.memory:
+                        files.append(spill(run))
+                        run = []
+                        used = 0
+            run.sort(key=self.key)
+            self.runs += 1
+            if not files:
+                yield from run
+                return
+            while len(files) >= self.MAX_MERGE:
+                # merge the oldest runs into one to bound open files
+                merged = spill(self._merge(files[:self.MAX_MERGE]),
+                               presorted=True)
+                for file in files[:self.MAX_MERGE]:
+                    file.close()
+                files[:self.MAX_MERGE] = [merged]
+            # the final run is the newest input, so merges last
+            yield from heapq.merge(self._merge(files), run, key=self.key)
+
+    def _spill(self, file, run, presorted=False):
+        "write run to a temporary file, returning it rewound"
+        if not presorted:
+            run.sort(key=self.key)
+            self.runs += 1
+        csv.writer(file).writerows(run)
+        file.flush()
+        self.spilled += file.tell()
+        file.seek(0)
+        return file
+
+    def _merge(self, files):
+        "merge the sorted runs in files"
+        return heapq.merge(*[csv.reader(file) for file in files],
+                           key=self.key)
+
+@public
+class KeySet:
+    """Compact set of key hashes, for deduplicating huge key spaces.
+
+    Only each key's 64-bit hash() is kept, in an open addressing table in
+    an array of 8-byte slots. The table doubles when it is three quarters
+    full, so it costs 11 to 21 bytes per key, and up to 32 while it is
+    being copied, rather than the 110 or more of a string in a set.
+    Distinct keys can share a hash, so a key found in the set has only
+    almost certainly been added before.
+    """
+
+    # initial number of slots, a power of two
+    SIZE = 1 << 10
+
+    def __init__(self):
+        self._table = array.array("q", bytes(8 * self.SIZE))
+        self._used = 0
+
+    def __len__(self):
+        return self._used
+
+    def __contains__(self, key):
+        table = self._table
+        mask = len(table) - 1
+        # 0 marks an empty slot
+        value = hash(key) or 1
+        i = value & mask
+        while table[i]:
+            if table[i] == value:
+                return True
+            i = (i + 1) & mask
+        return False
+
+    @property
+    def nbytes(self):
+        "size of the table"
+        return self._table.itemsize * len(self._table)
+
+    def add(self, key):
+        "add key, returning True if its hash was already present"
+        table = self._table
+        mask = len(table) - 1
+        value = hash(key) or 1
+        i = value & mask
+        while table[i]:
+            if table[i] == value:
+                return True
+            i = (i + 1) & mask
+        table[i] = value
+        self._used += 1
+        if 4 * self._used > 3 * len(table):
+            self._grow()
+        return False
+
+    def _grow(self):
+        "double the table, leaving it at most three eighths full"
+        old = self._table
+        self._table = table = array.array("q", bytes(16 * len(old)))
+        mask = len(table) - 1
+        for value in old:
+            if value:
+                i = value & mask
+                while table[i]:
+                    i = (i + 1) & mask
+                table[i] = value
+
 @public
 def as_days(delta):
     "timedelta as float # of days"
@@ -143,15 +1180,49 @@ def weighted_ma(elts, coeffs):
 
 @public
 class ListyDict:
-    """Dictish objects which also support some list-style numeric indexing."""
-    def __init__(self, d, indexes):
+    """Dictish objects which also support some list-style numeric indexing.
+
+    indexes maps offsets to keys, and negative offsets count back from
+    the last of them, as with lists. If converters (a mapping of keys
+    to functions) or default (a function for the other keys) is given,
+    the strings in d are converted when first looked up and the results
+    cached, so rows cost only as much as the fields which are used.
+    Assignments and deletions go straight to d, which is left holding
+    the original strings of the fields which were only read.
+    """
+    def __init__(self, d, indexes, converters=None, default=None):
         self.data = d
-        self.indexes = dict(indexes)
+        self.indexes = indexes if isinstance(indexes, dict) else dict(indexes)
+        self.converters = converters
+        self.default = default
+        self._lazy = converters is not None or default is not None
+        self._values = {}
+
+    def _key(self, k):
+        "the key of d which k refers to"
+        if isinstance(k, int) and k < 0:
+            k += len(self.indexes)
+        return self.indexes.get(k, k)
 
     def keys(self):
         "delegate to self.data"
         return list(self.data.keys())
 
+    def values(self):
+        "values, converted"
+        return [self[k] for k in self]
+
+    def items(self):
+        "(key, value) pairs, converted"
+        return [(k, self[k]) for k in self]
+
+    def get(self, k, default=None):
+        "self[k] if k is present, else default"
+        try:
+            return self[k]
+        except KeyError:
+            return default
+
     def __contains__(self, k):
         "delegate to self.data"
         return k in self.data
@@ -162,18 +1233,33 @@ class ListyDict:
 
     def __getitem__(self, k):
         "k can be list index or dict key"
-        k = self.indexes.get(k, k)
-        return self.data[k]
+        k = self._key(k)
+        if not self._lazy:
+            return self.data[k]
+        try:
+            return self._values[k]
+        except KeyError:
+            pass
+        value = self.data[k]
+        if isinstance(value, str):
+            convert = (self.converters or {}).get(k, self.default)
+            if convert is not None:
+                value = convert(value)
+        self._values[k] = value
+        return value
 
     def __delitem__(self, k):
         "k can be list index or dict key"
-        k = self.indexes.get(k, k)
+        k = self._key(k)
         del self.data[k]
+        self._values.pop(k, None)
 
     def __setitem__(self, k, v):
         "k can be list index or dict key"
-        k = self.indexes.get(k, k)
+        k = self._key(k)
         self.data[k] = v
+        if self._lazy:
+            self._values[k] = v
 
     def __len__(self):
         "delegate to self.data"
@@ -181,3 +1267,52 @@ class ListyDict:
 
     def __str__(self):
         return f"<{self.__class__.__name__} {self.data}>"
+
+@public
+class ListyRow(ListyDict):
+    """A ListyDict read in place from a list row, as csv.reader yields.
+
+    indexes maps keys to offsets in the row, and converters maps offsets
+    to functions. The first assignment copies the row, which is never
+    changed itself, and fields can't be deleted.
+    """
+    _shared = True
+
+    def _key(self, k):
+        "the offset which k refers to"
+        if not isinstance(k, int):
+            return self.indexes[k]
+        if k < 0:
+            k += len(self.data)
+        if not 0 <= k < len(self.data):
+            raise KeyError(k)
+        return k
+
+    def keys(self):
+        "keys of self.indexes"
+        return list(self.indexes)
+
+    def __contains__(self, k):
+        "delegate to self.indexes"
+        return k in self.indexes
+
+    def __iter__(self):
+        "delegate to self.indexes"
+        return iter(self.indexes)
+
+    def __delitem__(self, k):
+        raise TypeError(f"can't delete {k!r} from a {self.__class__.__name__}")
+
+    def __setitem__(self, k, v):
+        "k can be list index or key"
+        if self._shared:
+            self.data = self.data[:]
+            self._shared = False
+        super().__setitem__(k, v)
+
+    def __len__(self):
+        "delegate to self.indexes"
+        return len(self.indexes)
+
+    def __str__(self):
+        return f"<{self.__class__.__name__} {dict(zip(self, self.data))}>"
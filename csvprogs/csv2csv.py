@@ -67,7 +67,7 @@ import csv
 import os
 import sys
 
-from csvprogs.common import CSVArgParser, openpair, usage
+from csvprogs.common import CSVArgParser, CSVWriter, openpair, usage
 
 PROG = os.path.split(sys.argv[0])[1]
 
@@ -144,8 +144,8 @@ def main():
         if not options.fields:
             # All by default
             options.fields = reader.fieldnames
-        writer = csv.DictWriter(outf, options.fields, dialect=outdialect,
-            extrasaction='ignore')
+        writer = CSVWriter(outf, options.fields, dialect=outdialect,
+            float_format=options.float_format, extrasaction="ignore")
         if not options.append:
             writer.writeheader()
         csv2csv(reader, writer, options.fields)
@@ -68,20 +68,23 @@ SEE ALSO
 """
 
 import csv
+from functools import partial
 import json
 from locale import setlocale, LC_ALL, atoi, atof
 import os
 import sys
 
-import dateutil.parser
-
-from csvprogs.common import CSVArgParser, openpair, usage
+from csvprogs.common import CSVArgParser, DateParser, openpair, usage
 
 PROG = os.path.split(sys.argv[0])[1]
 
 
-def datetime(s):
-    return dateutil.parser.parse(s).isoformat()
+def datetime(s, parse=None):
+    if parse is None:
+        # pylint: disable=import-outside-toplevel
+        import dateutil.parser
+        parse = dateutil.parser.parse
+    return parse(s).isoformat()
 date = time = datetime
 
 TYPES = {
@@ -97,7 +100,7 @@ TYPES = {
 NO_DEFAULT = object()
 
 def main():
-    parser = CSVArgParser(usage=usage(__doc__, globals()))
+    parser = CSVArgParser(usage=usage(__doc__, globals()), float_format=False)
     parser.add_argument("-f", "--fields", dest="inputfields", default=None,
                         help="fields to emit (default all fields)")
     parser.add_argument("-t", "--types", dest="typenames", default=None,
@@ -149,6 +152,9 @@ def generate_type_converters(options):
             else:
                 typ = TYPES[typename]
                 dflt = NO_DEFAULT
+            if typ is datetime:
+                # each column gets its own parser, so it can learn its format
+                typ = partial(datetime, parse=DateParser())
             types[field] = typ
             defaults[field] = dflt
         result = {}
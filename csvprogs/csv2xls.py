@@ -32,7 +32,9 @@ processed, the generated Excel workbook is written to stdout.
 
 An attempt is made to coerce each cell encountered to one of the
 following types, in order: int, float, datetime. If all coercion
-attempts fail, the cell is saved as a string.
+attempts fail, the cell is saved as a string. The type of each column
+is decided from the first rows of the file, so cells in string columns
+are only coerced if they look like numbers.
 
 SEE ALSO
 ========
@@ -46,14 +48,12 @@ from locale import setlocale, LC_ALL
 import os
 import sys
 
-import openpyxl
-
-from csvprogs.common import CSVArgParser, usage, type_convert
+from csvprogs.common import CSVArgParser, usage, type_convert, typed_rows
 
 PROG = os.path.splitext(os.path.basename(sys.argv[0]))[0]
 
 def main():
-    parser = CSVArgParser(usage=usage(__doc__, globals()))
+    parser = CSVArgParser(usage=usage(__doc__, globals()), float_format=False)
     options, csvfiles = parser.parse_known_args()
 
     if not csvfiles:
@@ -63,6 +63,9 @@ def main():
 
     setlocale(LC_ALL, options.locale)
 
+    # openpyxl is slow to import, so wait until there's work to do.
+    # pylint: disable=import-outside-toplevel
+    import openpyxl
     book = openpyxl.Workbook()
     # creating a workbook creates an empty initial worksheet named "Sheet". Get rid of it.
     del book["Sheet"]
@@ -79,11 +82,14 @@ def append_sheet_from_csv(book, csvf, encoding):
 def populate_sheet_from_csv(sheet, csvf, encoding):
     with open(csvf, "r", encoding=encoding) as inf:
         rdr = csv.reader(inf)
-        for row in rdr:
-            sheet_row = []
-            for cell in row:
-                sheet_row.append(type_convert(cell, keep_tz=False))
-            sheet.append(sheet_row)
+        # Convert the header (if any) separately so it doesn't spoil type
+        # inference for the columns.
+        header = next(rdr, None)
+        if header is None:
+            return
+        sheet.append([type_convert(cell, keep_tz=False) for cell in header])
+        for row in typed_rows(rdr, keep_tz=False):
+            sheet.append(row)
 
 
 
@@ -1,13 +1,34 @@
 #!/usr/bin/env python3
 
 """
+SYNOPSIS
+========
+
+csvcat -k key [ --presorted ] [ -m size ] [ options ] infile ...
+
+OPTIONS
+=======
+
+-k key        key field for the merge
+--presorted   inputs are already sorted on key, so merge them as they
+              are read
+-m size       memory budget before spilling to disk (default %(SORT_MEMORY)s)
+--no-verify   drop rows whose key hash has been seen without checking
+              the key itself
+-v            report the number of sorted runs and bytes spilled to disk
+
+Each infile may be a glob pattern or - for stdin, and files ending in
+.gz, .bz2 or .xz are decompressed as they are read.
+
 DESCRIPTION
 ===========
 
 Data are read from the input files, sorted on the key field (with duplicates
-removed), then written to stdout. All input files must have the same column
-names. If the non-key data in two rows which have the same key field value are
-encountered, which one is written to stdout is undefined.
+removed), then written to stdout. The output has the union of the input
+files' columns, in the order they are first seen, and rows are padded with
+empty values for columns their file lacks. If the non-key data in two rows
+which have the same key field value are encountered, the first one read
+(in the order the files are given) is written to stdout.
 
 Suppose you want to download ten years of daily historical market data for a
 stock from a website, but the site only allows you to download daily data for
@@ -15,54 +36,220 @@ no more than a five year range. You can download smaller (possibly overlapping)
 chunks of data, then feed them into csvcat to generate a single file without
 duplicate records.
 
+Distinct rows are collected in memory up to the memory budget. Beyond
+that, keys already seen are recognized by their 64-bit hashes, which take
+11 to 21 bytes each, so ten million keys need only about 200 MB. Rows
+whose key hash has been seen are written to a temporary file, sorted
+separately and compared with the rest, so two keys which happen to share a
+hash can't cause a row to be dropped. With --no-verify they are simply
+dropped, which saves the disk traffic at the risk (about n**2 / 2**65 for
+n keys) of losing a row. Rows are sorted in runs which are spilled to
+temporary files once they outgrow the memory budget, so the inputs needn't
+fit in memory either.
+
+With --presorted, each input must already be sorted on the key. The inputs
+are then merged as they are read, holding one row per file, and it is an
+error if any turns out not to be sorted: csvcat stops with a message
+naming the input and line, and the output written so far is incomplete.
+
 EXAMPLE
 =======
 
 To concatenate and sort three files on their Date field:
 
-csvcat -l Date A.csv B.csv C.csv
+csvcat -k Date A.csv B.csv C.csv
 
 SEE ALSO
 ========
 
 * csvmerge
+* csvsort
 
 """
 
 from contextlib import suppress
 import csv
+import heapq
+import itertools
+import operator
 import sys
 
-from csvprogs.common import CSVArgParser, usage
-
-
-def cat(files, key):
-    rows = []
-    keys = set()
-    for fn in files:
-        with open(fn, encoding="utf-8") as inp:
-            rdr = csv.DictReader(inp)
-            fieldnames = rdr.fieldnames
-            for row in rdr:
-                if row[key] in keys:
-                    continue
-                keys.add(row[key])
-                rows.append(row)
-    rows.sort(key=lambda row: row[key])
-    wtr = csv.DictWriter(sys.stdout, fieldnames=fieldnames)
-    wtr.writeheader()
-    wtr.writerows(rows)
+from csvprogs.common import (CSVArgParser, CSVWriter, ExternalSort, KeySet,
+                             SORT_MEMORY, openinputs, parse_size, usage)
+
+# default memory budget in bytes
+MEMORY = parse_size(SORT_MEMORY)
+
+def cat(files, key, presorted=False, memory=MEMORY, insep=",",
+        outsep=",", encoding="utf-8", outf=None, verify=True):
+    """write the rows of files to outf (default stdout), sorted on key.
+
+    Only the first row with each key value is written. If verify is
+    false, key hashes are trusted (see distinct). Returns the list of
+    ExternalSorts used.
+    """
+    with openinputs(files, encoding) as inputs:
+        readers = [csv.reader(inp, delimiter=insep) for inp in inputs]
+        headers = [next(rdr, []) for rdr in readers]
+        fieldnames = list(dict.fromkeys(name for header in headers
+                                            for name in header))
+        if key not in fieldnames:
+            raise KeyError(key)
+        getkey = operator.itemgetter(fieldnames.index(key))
+        streams = [aligned(rdr, header, fieldnames, key if presorted else None,
+                           getattr(inp, "name", "-"))
+                       for (rdr, header, inp) in zip(readers, headers,
+                                                     inputs)]
+        sorters = []
+        if presorted:
+            rows = heapq.merge(*streams, key=getkey)
+        else:
+            rows = distinct(itertools.chain(*streams), getkey, sorters, memory,
+                            verify)
+
+        wtr = CSVWriter(outf or sys.stdout, delimiter=outsep)
+        wtr.writerow(fieldnames)
+        # Both heapq.merge and ExternalSort are stable, so the first row
+        # with a given key is the first one read.
+        last = None
+        for row in rows:
+            value = getkey(row)
+            if value != last:
+                wtr.writerow(row)
+                last = value
+    return sorters
+
+def distinct(rows, getkey, sorters, memory=MEMORY, verify=True):
+    """yield rows sorted on getkey, with most duplicate keys dropped.
+
+    The first row with each key is kept in a dict while they fit in the
+    memory budget. Past that, hashed_distinct takes over. The
+    ExternalSorts used are appended to sorters.
+    """
+    seen = {}
+    used = 0
+    for row in rows:
+        value = getkey(row)
+        if value in seen:
+            continue
+        seen[value] = row
+        if len(seen) % ExternalSort.SAMPLE == 0:
+            used += ExternalSort.SAMPLE * ExternalSort.row_size(row)
+            if used > memory:
+                break
+    else:
+        sorter = ExternalSort(getkey, memory)
+        sorters.append(sorter)
+        yield from sorter.sort(seen.values())
+        return
+    first = list(seen.values())
+    del seen
+    yield from hashed_distinct(itertools.chain(first, rows), getkey, sorters,
+                               memory, verify)
+
+def hashed_distinct(rows, getkey, sorters, memory=MEMORY, verify=True):
+    """yield rows sorted on getkey, with most duplicate keys dropped.
+
+    Keys are remembered in a KeySet, and only rows with a new key hash
+    are sorted. The others almost certainly have duplicate keys. If verify
+    is true, they are written to a spill file, sorted separately and
+    merged after the first, so that a row whose key merely shares a hash
+    is never lost, leaving the caller to drop the true duplicates. The
+    ExternalSorts used are appended to sorters.
+    """
+    seen = KeySet()
+    kept = ExternalSort(getkey, memory // 2 if verify else memory)
+    sorters.append(kept)
+    if not verify:
+        yield from kept.sort(row for row in rows if not seen.add(getkey(row)))
+        return
+
+    # pylint: disable=import-outside-toplevel
+    import tempfile
+    with tempfile.TemporaryFile("w+", encoding="utf-8", newline="") as spill:
+        writer = csv.writer(spill)
+
+        def first(rows):
+            "rows with new key hashes, spilling the rest"
+            for row in rows:
+                if seen.add(getkey(row)):
+                    writer.writerow(row)
+                else:
+                    yield row
+        unique = kept.sort(first(rows))
+        # ExternalSort reads all its input before yielding anything, so
+        # this completes the spill file.
+        for head in unique:
+            break
+        else:
+            return
+        spill.seek(0)
+        dups = ExternalSort(getkey, memory // 2)
+        sorters.append(dups)
+        yield from heapq.merge(itertools.chain([head], unique),
+                               dups.sort(csv.reader(spill)), key=getkey)
+
+def aligned(rdr, header, fieldnames, key=None, name="-"):
+    """yield the rows of rdr (with columns header) laid out as fieldnames.
+
+    If key is given, raise ValueError if the rows of the input called name
+    aren't sorted on it.
+    """
+    if header == fieldnames:
+        layout = None
+    else:
+        index = {field: i for (i, field) in enumerate(header)}
+        layout = [index.get(field) for field in fieldnames]
+    width = len(header)
+    keypos = header.index(key) if key in header else None
+    last = None
+    for row in rdr:
+        if not row:
+            continue
+        if len(row) != width:
+            row = (row + [""] * width)[:width]
+        if keypos is not None:
+            if last is not None and row[keypos] < last:
+                raise ValueError(f"{name}, line {rdr.line_num}: not sorted"
+                                 f" on {key} at {row[keypos]!r}; output is"
+                                 " incomplete")
+            last = row[keypos]
+        if layout is None:
+            yield row
+        else:
+            yield ["" if i is None else row[i] for i in layout]
 
 def main():
     "see __doc__"
-    parser = CSVArgParser(usage=usage(__doc__, globals()))
+    parser = CSVArgParser(usage=usage(__doc__, globals()), float_format=False)
     parser.add_argument("--key", "-k", required=True,
                         help="key field for the merge operation")
+    parser.add_argument("--presorted", default=False, action="store_true",
+                        help="inputs are already sorted on the key")
+    parser.add_argument("-m", "--memory", default=SORT_MEMORY, type=parse_size,
+                        help="memory budget before spilling to disk, e.g. 2G")
+    parser.add_argument("--no-verify", dest="verify", default=True,
+                        action="store_false",
+                        help="drop rows whose key hash has been seen")
     parser.add_argument("files", nargs="+", help="list of input files")
     options = parser.parse_args()
 
-    cat(options.files, options.key)
+    try:
+        sorters = cat(options.files, options.key, options.presorted,
+                      options.memory, options.insep, options.outsep,
+                      options.encoding, verify=options.verify)
+    except KeyError as exc:
+        print(usage(__doc__, globals(), f"Unknown key: {exc.args[0]}"),
+              file=sys.stderr)
+        return 1
+    except ValueError as exc:
+        print(f"csvcat: {exc}", file=sys.stderr)
+        return 1
 
+    if options.verbose and sorters:
+        print(f"csvcat: {sum(sorter.runs for sorter in sorters)} runs,"
+              f" {sum(sorter.spilled for sorter in sorters)} bytes spilled",
+              file=sys.stderr)
     return 0
 
 if __name__ == "__main__":
@@ -19,12 +19,20 @@ Collapse multiple rows having the same key into a single row
 SYNOPSIS
 ========
 
- %(PROG)s -k f1,f2,f3,...
+ %(PROG)s -k f1,f2,f3,... [ -A col:agg[:name],... ] [ --unsorted
+      [ --order first|key ] [ -m size ] ] [ infile [ outfile ] ]
 
 OPTIONS
 =======
 
 -k names   comma-separated list of field names
+-A specs   comma-separated per-column aggregates (may be repeated)
+--unsorted collapse rows with identical keys wherever they occur
+--order    with --unsorted, write groups in order of first appearance
+           (first, the default) or sorted by key (key)
+-m size    with --unsorted, memory budget before spilling to disk
+           (default %(SORT_MEMORY)s)
+-v         report the number of bytes spilled to disk
 
 DESCRIPTION
 ===========
@@ -32,7 +40,29 @@ DESCRIPTION
 For each row in stdin which has identical values for the given key(s),
 collapse them into one row. Values in later rows overwrite values in
 earlier rows. Output is to stdout. To be collapsed, rows with
-identical key(s) must be adjacent to one another.
+identical key(s) must be adjacent to one another, unless --unsorted is
+given.
+
+With --unsorted, groups are collected in a hash table. Once they outgrow
+the memory budget, rows with new keys are spilled to temporary files (in
+$TMPDIR), partitioned by key, which are collapsed in turn, so there is
+no need to sort the input first. Each group still sees its rows in input
+order.
+
+With -A, a column can be aggregated differently. Empty values are always
+ignored. The aggregates are:
+
+first  the first non-empty value
+last   the last non-empty value (the default)
+sum    the sum of the values
+min    the numerically smallest value
+max    the numerically largest value
+count  the number of non-empty values
+
+Given a name, an aggregate is written to a new column of that name,
+appended to the output, and the column it reads keeps its own value.
+It is an error for a sum, min or max column to hold something other
+than a number.
 
 EXAMPLE
 =======
@@ -53,6 +83,12 @@ time,pos1,pos2,pos3
 This program is often used to collapse rows with common keys in the
 output of csvmerge.
 
+To build per-minute open, high, low, close and volume columns for tick
+data which has a minute column::
+
+    %(PROG)s -k symbol,minute -A price:first:open,price:max:high \\
+        -A price:min:low,price:last:close,size:sum:volume
+
 SEE ALSO
 ========
 
@@ -60,47 +96,328 @@ SEE ALSO
 * csv2csv
 """
 
+from contextlib import ExitStack
 import csv
-import sys
+import heapq
+import itertools
+import operator
 import os
+import pickle
+import sys
 
-from csvprogs.common import CSVArgParser, openpair, usage
+from csvprogs.common import (CSVArgParser, CSVWriter, ExternalSort,
+                             SORT_MEMORY, openpair, parse_size, usage)
 
 PROG = os.path.split(sys.argv[0])[1]
 
+# rows per pickle in HashCollapse's temporary files
+BATCH = 1000
+
+def number(value):
+    "value as an int if possible, else a float"
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+# Reducers combine the accumulated value (None at first) with the next
+# non-empty value. Finishers turn the accumulated value into output.
+def _first(acc, value):
+    return value if acc is None else acc
+
+def _sum(acc, value):
+    return number(value) if acc is None else acc + number(value)
+
+def _min(acc, value):
+    value = (number(value), value)
+    return value if acc is None or value[0] < acc[0] else acc
+
+def _max(acc, value):
+    value = (number(value), value)
+    return value if acc is None or value[0] > acc[0] else acc
+
+def _count(acc, _value):
+    return 1 if acc is None else acc + 1
+
+def _same(acc):
+    return acc
+
+def _text(acc):
+    "min and max write the winning value as it was given"
+    return acc[1]
+
+# name -> (reducer, finisher). "last" is handled inline, being the
+# default for every column.
+AGGREGATES = {
+    "first": (_first, _same),
+    "last": (None, _same),
+    "sum": (_sum, _same),
+    "min": (_min, _text),
+    "max": (_max, _text),
+    "count": (_count, _same),
+}
+
+def parse_aggregates(specs, fieldnames):
+    """parse col:agg[:name] specs, returning (output fieldnames, columns).
+
+    columns holds one (input index, aggregate name) pair per output
+    column. Columns without a spec (and any key columns) keep their last
+    non-empty value. A spec with a name adds a new output column.
+    """
+    fieldnames = list(fieldnames)
+    columns = [(i, "last") for i in range(len(fieldnames))]
+    for spec in specs:
+        (col, _, rest) = spec.partition(":")
+        (agg, _, name) = rest.partition(":")
+        if col not in fieldnames:
+            raise ValueError(f"unknown column {col!r} in {spec!r}")
+        if agg not in AGGREGATES:
+            raise ValueError(f"unknown aggregate {agg!r} in {spec!r}")
+        if not name or name == col:
+            columns[fieldnames.index(col)] = (fieldnames.index(col), agg)
+        elif name in fieldnames:
+            raise ValueError(f"duplicate output column {name!r}")
+        else:
+            fieldnames.append(name)
+            columns.append((fieldnames.index(col), agg))
+    return (fieldnames, columns)
+
+class Aggregator:
+    """Precompiled aggregation of input rows into output columns.
+
+    columns is as returned by parse_aggregates. The default "last"
+    columns are copied in a tight loop, and the rest get a list of
+    (output index, input index, reducer) triples.
+    """
+
+    def __init__(self, columns):
+        self.width = len(columns)
+        self.lasts = [(out, i) for (out, (i, agg)) in enumerate(columns)
+                        if agg == "last"]
+        self.reducers = [(out, i, AGGREGATES[agg][0])
+                            for (out, (i, agg)) in enumerate(columns)
+                                if agg != "last"]
+        self.finishers = [AGGREGATES[agg][1] for (_, agg) in columns]
+        self.counts = [out for (out, (_, agg)) in enumerate(columns)
+                          if agg == "count"]
+
+    def new(self):
+        "accumulated values for a new group"
+        return [None] * self.width
+
+    def update(self, accs, row):
+        "fold row into accs"
+        for (out, i) in self.lasts:
+            value = row[i]
+            if value:
+                accs[out] = value
+        for (out, i, reducer) in self.reducers:
+            value = row[i]
+            if value:
+                accs[out] = reducer(accs[out], value)
+
+    def finish(self, accs):
+        "output row for accs, or None if all its values were empty"
+        if all(acc is None for acc in accs):
+            return None
+        for out in self.counts:
+            if accs[out] is None:
+                accs[out] = 0
+        return ["" if acc is None else finish(acc)
+                    for (acc, finish) in zip(accs, self.finishers)]
+
+def rows(reader, width):
+    "non-blank rows of reader, padded or truncated to width"
+    for row in reader:
+        if len(row) != width:
+            if not row:
+                continue
+            row = (row + [""] * width)[:width]
+        yield row
+
+def collapse(rows, keys, agg):
+    "yield one output row per run of adjacent rows with the same keys"
+    update = agg.update
+    last = None
+    accs = None
+    for row in rows:
+        row_key = [row[i] for i in keys]
+        if row_key != last:
+            if accs is not None and (out := agg.finish(accs)) is not None:
+                yield out
+            last = row_key
+            accs = agg.new()
+        update(accs, row)
+    if accs is not None and (out := agg.finish(accs)) is not None:
+        yield out
+
+class HashCollapse:
+    """Collapse rows with the same keys wherever they occur.
+
+    Groups are kept in a dict until their estimated size reaches memory
+    bytes. After that, rows with keys not yet seen are spilled to one of
+    PARTITIONS temporary files by key hash, while rows of groups already
+    in memory keep updating them, so every group sees all of its rows in
+    input order. Each partition is then collapsed the same way, spilling
+    again if need be. Groups come out in order of first appearance or,
+    if by_key, sorted by key.
+
+    After collapsing, spilled holds the number of bytes written to
+    temporary files.
+    """
+
+    PARTITIONS = 16
+    # new groups between size estimates
+    SAMPLE = 64
+
+    def __init__(self, keys, agg, memory=SORT_MEMORY, by_key=False):
+        self.keys = keys
+        self.agg = agg
+        self.memory = parse_size(memory) if isinstance(memory, str) else memory
+        self.by_key = by_key
+        self.spilled = 0
+
+    def collapse(self, rows):
+        "yield the output row of every group in rows"
+        for (_, out) in self._collapse(enumerate(rows), 0):
+            yield out
+
+    def _collapse(self, numbered, depth):
+        "yield (order, output row) in order for (input seq, row) pairs"
+        (keys, agg) = (self.keys, self.agg)
+        update = agg.update
+        with ExitStack() as stack:
+
+            def spill(mode="w+b", **kwargs):
+                "a new temporary file, closed once collapsing is done"
+                # pylint: disable=import-outside-toplevel
+                import tempfile
+                return stack.enter_context(
+                    tempfile.TemporaryFile(mode, **kwargs))
+
+            groups = {}
+            used = 0
+            (partitions, writers) = (None, None)
+            for (seq, row) in numbered:
+                key = tuple([row[i] for i in keys])
+                group = groups.get(key)
+                if group is None:
+                    if writers is not None:
+                        writers[hash((depth, key)) % self.PARTITIONS].writerow(
+                            [seq] + row)
+                        continue
+                    group = groups[key] = (seq, agg.new())
+                    if len(groups) % self.SAMPLE == 0:
+                        used += self.SAMPLE * ExternalSort.row_size(row)
+                        if used >= self.memory:
+                            partitions = [
+                                spill("w+", encoding="utf-8", newline="")
+                                for _ in range(self.PARTITIONS)]
+                            writers = [csv.writer(part)
+                                       for part in partitions]
+                update(group[1], row)
+
+            results = self._results(groups)
+            if partitions is None:
+                yield from results
+                return
+            # Write the groups in memory out before collapsing the
+            # partitions, then merge everything in order.
+            del groups
+            files = [self._save(spill(), results)]
+            for part in partitions:
+                self.spilled += part.tell()
+                part.seek(0)
+                numbered = ((int(row[0]), row[1:]) for row in csv.reader(part))
+                files.append(self._save(spill(),
+                                        self._collapse(numbered, depth + 1)))
+            yield from heapq.merge(*map(self._load, files),
+                                   key=operator.itemgetter(0))
+
+    def _results(self, groups):
+        "(order, output row) for each of groups, in order"
+        finish = self.agg.finish
+        if self.by_key:
+            items = sorted(groups.items())
+        else:
+            # dicts keep insertion order, which is order of appearance
+            items = groups.items()
+        for (key, (seq, accs)) in items:
+            out = finish(accs)
+            if out is not None:
+                yield ((key if self.by_key else seq), out)
+
+    def _save(self, file, results):
+        "pickle (order, output row) pairs to file, returning it rewound"
+        results = iter(results)
+        while batch := list(itertools.islice(results, BATCH)):
+            pickle.dump(batch, file, pickle.HIGHEST_PROTOCOL)
+        self.spilled += file.tell()
+        file.seek(0)
+        return file
+
+    @staticmethod
+    def _load(file):
+        "(order, output row) pairs saved by _save"
+        while True:
+            try:
+                yield from pickle.load(file)
+            except EOFError:
+                return
+
 def main():
     parser = CSVArgParser(usage=usage(__doc__, globals()))
     parser.add_argument("-k", "--keys", required=True,
                         help="column(s) to use as keys for the merge/collapse")
+    parser.add_argument("-A", "--aggregate", action="append", default=[],
+                        help="per-column aggregates, e.g. volume:sum,high:max")
+    parser.add_argument("--unsorted", default=False, action="store_true",
+                        help="group rows wherever they occur")
+    parser.add_argument("--order", default="first", choices=["first", "key"],
+                        help="--unsorted output order: of first appearance"
+                        " (the default) or sorted by key")
+    parser.add_argument("-m", "--memory", default=SORT_MEMORY, type=parse_size,
+                        help="memory budget before spilling to disk, e.g. 2G")
     options, args = parser.parse_known_args()
 
-    keys = tuple(options.keys.split(","))
-
-    last = ()
-    result = {}
+    keys = options.keys.split(",")
+    specs = [spec for arg in options.aggregate
+                for spec in arg.split(",") if spec]
 
     with openpair(options, args) as (inf, outf):
-        reader = csv.DictReader(inf, delimiter=options.insep)
-        writer = csv.DictWriter(outf, fieldnames=reader.fieldnames,
-            delimiter=options.outsep)
+        reader = csv.reader(inf, delimiter=options.insep)
+        fieldnames = next(reader, None)
+        if fieldnames is None:
+            return 0
+        try:
+            missing = [k for k in keys if k not in fieldnames]
+            if missing:
+                raise ValueError(f"unknown key(s): {', '.join(missing)}")
+            (outnames, columns) = parse_aggregates(specs, fieldnames)
+        except ValueError as exc:
+            print(usage(__doc__, globals(), str(exc)), file=sys.stderr)
+            return 1
+        writer = CSVWriter(outf, delimiter=options.outsep,
+                           float_format=options.float_format)
         if not options.append:
-            writer.writeheader()
-        for row in reader:
-            row_key = []
-            for k in keys:
-                row_key.append(row.get(k))
-            row_key = tuple(row_key)
-            if row_key != last:
-                last = row_key
-                if result:
-                    writer.writerow(result)
-                    result.clear()
-            for key in row:
-                if row[key]:
-                    result[key] = row[key]
-
-        if result:
-            writer.writerow(result)
+            writer.writerow(outnames)
+        indexes = [fieldnames.index(k) for k in keys]
+        agg = Aggregator(columns)
+        inrows = rows(reader, len(fieldnames))
+        if options.unsorted:
+            collapser = HashCollapse(indexes, agg, options.memory,
+                                     by_key=options.order == "key")
+            outrows = collapser.collapse(inrows)
+        else:
+            outrows = collapse(inrows, indexes, agg)
+        try:
+            writer.writerows(outrows)
+        except ValueError as exc:
+            print(f"{PROG}: {exc}", file=sys.stderr)
+            return 1
+        if options.verbose and options.unsorted:
+            print(f"{PROG}: {collapser.spilled} bytes spilled",
+                  file=sys.stderr)
 
     return 0
 
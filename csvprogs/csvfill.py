@@ -87,7 +87,7 @@ import csv
 import os
 import sys
 
-from csvprogs.common import usage, CSVArgParser, openpair
+from csvprogs.common import usage, CSVArgParser, CSVWriter, openpair
 
 PROG = os.path.splitext(os.path.split(sys.argv[0])[1])[0]
 
@@ -105,7 +105,8 @@ def main():
 
     with openpair(options, args) as (inf, outf):
         reader = csv.DictReader(inf, delimiter=options.insep)
-        writer = csv.DictWriter(outf, fieldnames=reader.fieldnames, restval="")
+        writer = CSVWriter(outf, fieldnames=reader.fieldnames,
+                           float_format=options.float_format)
 
         if not options.append:
             writer.writeheader()
@@ -15,24 +15,34 @@ Merge multiple CSV files
 SYNOPSIS
 ========
 
- %(PROG)s -k f1,f2,f3,... [ options ] infile ...
+ %(PROG)s -k f1,f2,f3,... [ options ] [ -O outfile ] infile ...
 
 OPTIONS
 =======
 
 -k fields    merge fields (quote if names contain spaces)
 -d fields    normalize fields as date
-if given, infile specifies the input CSV file (default: stdin)
+-F format    strftime format for date fields (default: guessed from input)
+-O outfile   write to outfile instead of stdout
+-i sep       input field separator (default is comma)
+-o sep       output field separator (default is comma)
+-a           append to outfile without writing a header
+
+Each infile may be a glob pattern, whose matches are merged in sorted
+order, or - for stdin. Files ending in .gz, .bz2 or .xz are decompressed
+as they are read.
 
 DESCRIPTION
 ===========
 
 Data are read from the input files.  Each row is written to the
 output, merging the inputs together. Files must be sorted by the key
-field(s).  The output will have the union of all columns.
+field(s).  The output will have the union of all columns.  Inputs are
+read a row at a time, so memory use doesn't grow with their size.  Rows
+with equal keys are written in the order their files were given.
 
 Multiple input files are given on the command line.  Output is to
-stdout.  On output the key fields are listed first (in the order
+stdout, or outfile if given.  On output the key fields are listed first (in the order
 given).  The remaining fields are simply sorted.
 
 EXAMPLE
@@ -43,6 +53,10 @@ To merge two csv files, A.csv and B.csv, by both the date and time fields:
 
     %(PROG)s -k 'date,time' A.csv B.csv
 
+To merge a month of compressed daily tick files into one::
+
+    %(PROG)s -k time -d time -O 2025-01.csv 'ticks-2025-01-*.csv.gz'
+
 SEE ALSO
 ========
 
@@ -58,17 +72,16 @@ SEE ALSO
 :Manual group: data filters
 """
 
-from contextlib import suppress
+from contextlib import ExitStack, suppress
 import datetime
+import heapq
 import sys
 import csv
 import os
+import re
 
-import dateutil.parser
-# Create a trivial guess_... function in common?
-from pandas.tseries.api import guess_datetime_format
-
-from csvprogs.common import CSVArgParser, usage
+from csvprogs.common import (CSVArgParser, CSVWriter, DateParser, openinputs,
+                             usage)
 
 
 PROG = os.path.split(sys.argv[0])[1]
@@ -78,6 +91,87 @@ PROG = os.path.split(sys.argv[0])[1]
 #      ...-Nope-There-are-no-150-year-olds-on-Social-Security-It-s-COBOL
 EPOCH = datetime.datetime.fromtimestamp(0)
 
+# bytes buffered when writing to an output file
+OUTPUT_BUFFER = 1 << 20
+
+# fixed-width strptime directives compile_format understands, in datetime
+# argument order
+DIRECTIVES = {
+    "Y": r"(\d{4})",
+    "m": r"(\d\d)",
+    "d": r"(\d\d)",
+    "H": r"(\d\d)",
+    "M": r"(\d\d)",
+    "S": r"(\d\d)",
+    "f": r"(\d{6})",
+}
+
+def compile_format(fmt):
+    """Return a fast parser for the strptime format fmt, or None.
+
+    Only formats made of literal text and the fixed-width numeric
+    DIRECTIVES (including year, month and day) can be compiled. The
+    parser returns None for values which don't match fmt exactly, so
+    anything it accepts is reproduced unchanged by strftime(fmt).
+    """
+    if not fmt:
+        return None
+    (pattern, order) = ([], [])
+    for (i, part) in enumerate(re.split("(%.)", fmt)):
+        if i % 2 == 0:
+            pattern.append(re.escape(part))
+        elif part == "%%":
+            pattern.append("%")
+        elif part[1] in DIRECTIVES and part[1] not in order:
+            pattern.append(DIRECTIVES[part[1]])
+            order.append(part[1])
+        else:
+            return None
+    if not {"Y", "m", "d"} <= set(order):
+        return None
+    match = re.compile("".join(pattern)).fullmatch
+    positions = [order.index(d) if d in order else None for d in DIRECTIVES]
+
+    def parse(value):
+        mat = match(value)
+        if mat is None:
+            return None
+        fields = mat.groups()
+        try:
+            return datetime.datetime(*[0 if pos is None else int(fields[pos])
+                                         for pos in positions])
+        except ValueError:
+            return None
+    return parse
+
+class DateColumn:
+    """Parse the values of one date key in one input file.
+
+    The format is guessed once, from the first value. Values in exactly
+    that format are parsed by a function compiled from it, anything else
+    by a DateParser.
+    """
+
+    def __init__(self, guess):
+        self.guess = guess
+        self.format = None
+        self.fast = None
+        self.parser = None
+
+    def __call__(self, value):
+        "return (datetime, True if value is in self.format)"
+        if self.guess is not None:
+            self.format = self.guess(value)
+            self.fast = compile_format(self.format)
+            self.guess = None
+        if self.fast is not None:
+            result = self.fast(value)
+            if result is not None:
+                return (result, True)
+        if self.parser is None:
+            self.parser = DateParser()
+        return (self.parser(value), False)
+
 
 def main():
     parser = CSVArgParser()
@@ -88,10 +182,11 @@ def main():
     # maybe into CSVArgParser?
     parser.add_argument("-F", "--date-format", dest="date_format",
                         default="", help="output datetime format")
+    parser.add_argument("-O", "--output", default=None,
+                        help="output file (default stdout)")
     (options, args) = parser.parse_known_args()
 
     keys = options.keys.split(",")
-    readers = []
     if options.date_keys:
         date_keys = set(options.date_keys.split(","))
     else:
@@ -102,81 +197,106 @@ def main():
               file=sys.stderr)
         return 1
 
-    all_fields = set()
-    for fname in args:
-        with open(fname, encoding="utf-8") as fp:
-            rdr = csv.DictReader(fp)
-            all_fields |= set(rdr.fieldnames)
-            readers.append(iter(list(rdr)))
+    with ExitStack() as stack:
+        # Inputs are read lazily, one row at a time, so only the headers
+        # are read here.
+        readers = []
+        all_fields = set()
+        for fp in stack.enter_context(openinputs(args, options.encoding)):
+            rdr = csv.DictReader(fp, delimiter=options.insep)
+            all_fields |= set(rdr.fieldnames or ())
+            readers.append(rdr)
 
-    rest = sorted(all_fields - set(keys))
+        rest = sorted(all_fields - set(keys))
 
-    out_fields = keys + sorted(rest)
+        out_fields = keys + sorted(rest)
 
-    writer = csv.DictWriter(sys.stdout, fieldnames=out_fields, restval="")
-    writer.writeheader()
+        if options.output:
+            outf = stack.enter_context(
+                open(options.output, "a" if options.append else "w",
+                     encoding=options.encoding, buffering=OUTPUT_BUFFER))
+        else:
+            outf = sys.stdout
+        writer = CSVWriter(outf, fieldnames=out_fields,
+                           float_format=options.float_format,
+                           delimiter=options.outsep)
+        if not options.append:
+            writer.writeheader()
 
-    return merge(keys, date_keys, readers, writer, options.date_format)
+        return merge(keys, date_keys, readers, writer, options.date_format)
 
 def merge(keys, date_keys, readers, writer, date_format):
-    "merge rows from all readers, sending to writer"
+    """merge rows from all readers, sending to writer.
 
-    formats = set()
+    Only the next row of each reader is held, in a heap ordered by (key,
+    reader index), so rows with equal keys come from the earlier reader
+    first.
+    """
 
-    def construct_key(row, keys, date_keys):
+    formats = set()
+    if date_keys:
+        # pandas is slow to import, so only load it when it's needed.
+        # Create a trivial guess_... function in common?
+        # pylint: disable=import-outside-toplevel
+        from pandas.tseries.api import guess_datetime_format
+
+        def guess(value):
+            "guess_datetime_format, noting the result in formats"
+            fmt = guess_datetime_format(value)
+            if fmt is not None:
+                formats.add(fmt)
+            return fmt
+        columns = [{k: DateColumn(guess) for k in date_keys}
+                     for _ in readers]
+    # output date format, once known
+    fmt = date_format or None
+
+    def construct_key(row, index):
         "helper"
         key = []
         for k in keys:
             v = row.get(k, "")
             if k in date_keys:
                 if v:
-                    formats.add(guess_datetime_format(v))
-                    v = dateutil.parser.parse(v)
-                    row[k] = v
+                    column = columns[index][k]
+                    (v, exact) = column(v)
+                    # Text already in the output format is written as is.
+                    if not exact or column.format != fmt:
+                        row[k] = v
                 else:
                     # Comparison will still fail if the key is
                     # missing, so substitute epoch for empty
                     # string.
                     v = EPOCH
             key.append(v)
-        return key
+        return tuple(key)
 
-    rows = {}
-    # Populate dict of readers with the first row from each.
-    for rdr in readers:
-        try:
-            row = next(rdr)
-        except StopIteration:
-            pass
-        else:
-            key = construct_key(row, keys, date_keys)
-            rows[rdr] = (key, sorted(row.items()), rdr)
+    # Populate the heap with the first row from each reader.
+    heap = []
+    for (index, rdr) in enumerate(readers):
+        for row in rdr:
+            heap.append((construct_key(row, index), index, row, rdr))
+            break
+    heapq.heapify(heap)
 
-    if date_format:
-        fmt = date_format
-    else:
+    if not fmt:
         # punt, pick one of the input formats
-        fmt = formats.pop()
-
-    while True:
-        if not rows:
-            return 0
+        fmt = formats.pop() if formats else "%Y-%m-%dT%H:%M:%S"
 
-        _, row, rdr = min(rows.values(), key=lambda x: x[0])
-        # Back to dict form for writing...
-        row = dict(row)
+    while heap:
+        (_, index, row, rdr) = heap[0]
         for k in date_keys:
-            row[k] = row[k].strftime(fmt)
+            if isinstance(row.get(k), datetime.datetime):
+                row[k] = row[k].strftime(fmt)
         writer.writerow(row)
 
         # Fill in the now stale slot with the next row.
-        try:
-            row = next(rdr)
-        except StopIteration:
-            del rows[rdr]
+        for row in rdr:
+            heapq.heapreplace(heap, (construct_key(row, index), index, row,
+                                     rdr))
+            break
         else:
-            key = construct_key(row, keys, date_keys)
-            rows[rdr] = (key, sorted(row.items()), rdr)
+            heapq.heappop(heap)
     return 0
 
 if __name__ == "__main__":
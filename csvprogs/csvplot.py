@@ -175,14 +175,9 @@ import os
 import re
 import io
 
-import dateutil.parser
-import numpy
-import matplotlib.dates
-from  matplotlib import pyplot
-import matplotlib.ticker
 from public import public, private
 
-from csvprogs.common import CSVArgParser, openi, usage
+from csvprogs.common import CSVArgParser, DateParser, openi, usage
 
 
 PROG = os.path.splitext(os.path.basename(sys.argv[0]))[0]
@@ -225,7 +220,7 @@ def main():
     "see __doc__"
     # see comment in common.usage()
     docstring = __doc__.format(**globals())
-    parser = CSVArgParser(usage=usage(docstring, {}))
+    parser = CSVArgParser(usage=usage(docstring, {}), float_format=False)
     parser.add_argument("-B", "--backend", default="",
                         help="Matplotlib backend renderer")
     parser.add_argument("-F", "--format", "--xfmt", dest="xfmt", default="",
@@ -275,6 +270,12 @@ def main():
     options.y_min_max = parse_y_range(options.y_range)
     options.x_min_max = parse_x_range(options.x_range)
 
+    # matplotlib takes far longer to import than anything else here, so
+    # wait until the command line has been checked.
+    # pylint: disable=import-outside-toplevel
+    import matplotlib
+    from matplotlib import pyplot
+
     if not options.backend:
         if not os.environ.get("DISPLAY"):
             # Allow non-interactive use (e.g. running with -p from cron)
@@ -304,6 +305,12 @@ def main():
 @public
 def plot(options, rdr, block=False):
     "guts of the plotter"
+    # pylint: disable=import-outside-toplevel
+    import dateutil.parser
+    import matplotlib.dates
+    import matplotlib.ticker
+    from matplotlib import pyplot
+
     raw = list(rdr)
     left = []
     right = []
@@ -313,9 +320,10 @@ def plot(options, rdr, block=False):
     if options.xtime:
         min_x = datetime.datetime(9999, 12, 31, 23, 59, 59)
         max_x = datetime.datetime(1970, 1, 1, 0, 0, 0)
+        parse_dt = DateParser()
         def parse_x(x_val):
             try:
-                return dateutil.parser.parse(x_val)
+                return parse_dt(x_val)
             except dateutil.parser.ParserError as err:
                 if err.args:
                     msg = err.args[0]
@@ -540,6 +548,8 @@ def parse_x_date_range(min_dt, max_dt):
         elif dt == "yesterday":
             date = datetime.datetime.now() - datetime.timedelta(days=1)
         else:
+            # pylint: disable=import-outside-toplevel
+            import dateutil.parser
             date = dateutil.parser.parse(dt)
         result.append(date)
     return result
@@ -575,6 +585,8 @@ def color_background(backgrounds, plot_, y_range, raw_data, parse_x):
     "Add background fill colors."
     if not backgrounds:
         return
+    # pylint: disable=import-outside-toplevel
+    import numpy
 
     for col1, col2, low, high, color in backgrounds:
         xdata = []
@@ -19,31 +19,84 @@ OPTIONS
 
 ::
 
--k fields   list merge fields (quote if names contain spaces)
+-k keys     comma-separated sort keys (quote if names contain spaces),
+            each of the form name[:type][:asc|desc]
 -s          strip fields in the sort key function (data are not changed)
+-m size     memory budget for rows held in memory (default %(SORT_MEMORY)s)
+-j N        sort in N worker processes (input must be a file)
+-v          report the number of sorted runs and bytes spilled to disk
 
 An optional input file can be given on the command line.  If not
 given, input is read from stdin.  Output is to stdout.  Column order
 remains unchanged on output.
 
+Key types are 'str' (the default), 'int', 'float', 'date', 'time' and
+'datetime'. Numbers are parsed according to the locale (-l). Timestamps
+may be in any format dateutil understands; aware ones are compared in
+UTC. Each key column is converted once per row, not once per
+comparison. Empty or unconvertible values of typed keys sort before all
+others, or after them with desc. Rows with equal keys stay in input
+order.
+
+Input larger than the memory budget (which takes K, M, G or T
+suffixes) is sorted in runs which are spilled to temporary files (in
+$TMPDIR) and merged, so files much larger than RAM can be sorted. The
+sort is stable, however the input is split.
+
+With -j, a file given on the command line (or redirected to stdin) is
+split into byte ranges ending at record boundaries, which N worker
+processes parse and sort. The main process merges the sorted chunks.
+The output is exactly what a serial sort produces. Piped input is
+sorted serially. Chunk boundaries are found by counting quote
+characters, so -j assumes the default doubled-quote escaping.
+
 EXAMPLE
 =======
 
 To sort stdin by date and time::
 
     %(PROG)s -k 'Date Stamp,Time Stamp'
+
+To sort by price, highest first, then by time::
+
+    %(PROG)s -k price:float:desc,time:datetime
 """
 
 from contextlib import suppress
 import sys
 import csv
+import datetime
+import heapq
+import io
+import itertools
+from locale import setlocale, localeconv, LC_ALL, atoi, atof
+import math
+import operator
 import os
+import pickle
+import types
 
-from csvprogs.common import CSVArgParser, openpair, usage
+from csvprogs.common import (CSVArgParser, CSVWriter, DateParser,
+                             ExternalSort, MappedFile, SORT_MEMORY, openpair,
+                             parse_size, usage)
 
 
 PROG = os.path.basename(sys.argv[0])
 
+TYPES = {
+    "str": None,
+    "int": atoi,
+    "float": atof,
+    "date": DateParser,
+    "time": DateParser,
+    "datetime": DateParser,
+}
+
+DIRECTIONS = ("asc", "desc")
+
+# rows per pickle in ParallelSort's temporary files
+CHUNK_BATCH = 10_000
+
 
 def main():
     parser = CSVArgParser(usage=usage(__doc__, globals()))
@@ -51,22 +104,301 @@ def main():
                         help="sort keys")
     parser.add_argument("-s", "--strip", default=False, action='store_true',
                         help="strip values in key function")
+    parser.add_argument("-m", "--memory", default=SORT_MEMORY, type=parse_size,
+                        help="memory budget before spilling to disk, e.g. 2G")
+    parser.add_argument("-j", "--jobs", default=1, type=int,
+                        help="number of worker processes")
     options, args = parser.parse_known_args()
 
-    options.keys = options.keys.split(",")
+    try:
+        keys = [parse_key(spec) for spec in options.keys.split(",")]
+    except ValueError as exc:
+        print(usage(__doc__, globals(), str(exc)), file=sys.stderr)
+        return 1
 
-    def keyfunc(x):
-        return [(x[k].strip() if options.strip else x[k]) for k in options.keys]
+    setlocale(LC_ALL, options.locale)
 
-    with openpair(options, args) as (inf, outf):
-        reader = csv.DictReader(inf, delimiter=options.insep)
-        writer = csv.DictWriter(outf, fieldnames=reader.fieldnames, delimiter=options.outsep)
+    with openpair(options, args, mapped=options.jobs > 1) as (inf, outf):
+        reader = csv.reader(inf, delimiter=options.insep)
+        fieldnames = next(reader, None)
+        if fieldnames is None:
+            return 0
+        missing = [name for (name, _, _) in keys if name not in fieldnames]
+        if missing:
+            print(usage(__doc__, globals(),
+                        f"Unknown sort key(s): {', '.join(missing)}"),
+                  file=sys.stderr)
+            return 1
+
+        writer = CSVWriter(outf, delimiter=options.outsep,
+                           float_format=options.float_format)
         if not options.append:
-            writer.writeheader()
-        writer.writerows(sorted(reader, key=keyfunc))
+            writer.writerow(fieldnames)
+        if isinstance(inf, MappedFile):
+            sorter = ParallelSort(fieldnames, keys, options)
+            outf.writelines(sorter.sort(inf))
+        else:
+            sorter = ExternalSort(make_key(fieldnames, keys, options.strip),
+                                  options.memory)
+            writer.writerows(sorter.sort(rows(reader, len(fieldnames))))
 
+    if options.verbose:
+        print(f"{PROG}: {sorter.runs} runs, {sorter.spilled} bytes spilled",
+              file=sys.stderr)
     return 0
 
+def rows(reader, width):
+    "rows from reader, made width fields wide as DictReader would"
+    for row in reader:
+        if not row:
+            # DictReader skips blank lines
+            continue
+        if len(row) != width:
+            row = (row + [""] * width)[:width]
+        yield row
+
+class ParallelSort:
+    """Sort a MappedFile in chunks in a pool of worker processes.
+
+    Each worker parses and sorts one chunk, writing the sort keys and
+    formatted output lines to a temporary file. The main process merges
+    the chunks in file order, which keeps the sort stable. Chunks are
+    sized so that jobs of them fit in the memory budget.
+    """
+
+    # memory used by parsed rows per byte of CSV, roughly
+    EXPANSION = 12
+
+    def __init__(self, fieldnames, keys, options):
+        self.fieldnames = fieldnames
+        self.keys = keys
+        self.options = options
+        self.runs = 0
+        self.spilled = 0
+
+    def chunks(self, inf):
+        "(start, end) byte ranges of the records after the header"
+        jobs = self.options.jobs
+        start = inf.record_starts([0])[0]
+        size = inf.size
+        length = max(1, min(-(-(size - start) // jobs),
+                            self.options.memory // (jobs * self.EXPANSION)))
+        bounds = inf.record_starts(range(start + length, size, length))
+        bounds = sorted(set([start] + bounds + [size]))
+        return list(zip(bounds, bounds[1:]))
+
+    def sort(self, inf):
+        "yield the sorted output lines of inf"
+        # multiprocessing takes longer to import than the rest of csvsort
+        # pylint: disable=import-outside-toplevel
+        from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+        opts = self.options
+        args = (opts.encoding, opts.insep, opts.outsep, self.fieldnames,
+                self.keys, opts.strip)
+        # every temporary file written so far, whatever goes wrong
+        temps = set()
+        try:
+            with ProcessPoolExecutor(opts.jobs, initializer=setlocale,
+                                     initargs=(LC_ALL, opts.locale)) as pool:
+                futures = []
+                pending = set()
+                try:
+                    for (start, end) in self.chunks(inf):
+                        if len(pending) >= 2 * opts.jobs:
+                            # don't copy the whole file into the queue at once
+                            (_, pending) = wait(pending,
+                                                return_when=FIRST_COMPLETED)
+                        futures.append(pool.submit(sort_chunk,
+                                                   inf.raw(start, end), *args))
+                        pending.add(futures[-1])
+                finally:
+                    paths = self._gather(futures, temps)
+                self.runs = len(paths)
+                while len(paths) > ExternalSort.MAX_MERGE:
+                    # merge groups of neighbouring chunks to bound open files
+                    groups = [paths[i:i + ExternalSort.MAX_MERGE]
+                                for i in range(0, len(paths),
+                                               ExternalSort.MAX_MERGE)]
+                    futures = [pool.submit(merge_chunks, group)
+                                for group in groups]
+                    (old, paths) = (paths, self._gather(futures, temps))
+                    for path in old:
+                        temps.discard(path)
+                        os.unlink(path)
+            for (_, line) in merge_chunks(paths, None):
+                yield line
+        finally:
+            for path in temps:
+                os.unlink(path)
+
+    def _gather(self, futures, temps):
+        """paths of the files written by futures, in order.
+
+        Wait for all of them, adding each file written to temps, before
+        raising the first worker's exception, if any.
+        """
+        # pylint: disable=import-outside-toplevel
+        from concurrent.futures import wait
+        wait(futures)
+        paths = []
+        for future in futures:
+            if future.exception() is None:
+                (path, size) = future.result()
+                temps.add(path)
+                paths.append(path)
+                self.spilled += size
+        for future in futures:
+            future.result()
+        return paths
+
+def sort_chunk(data, encoding, insep, outsep, fieldnames, keys, strip):
+    """Sort the rows in bytes data in a worker process.
+
+    The sort keys and formatted output lines are pickled to a temporary
+    file in batches. Return its path and size.
+    """
+    reader = csv.reader(io.TextIOWrapper(io.BytesIO(data), encoding=encoding),
+                        delimiter=insep)
+    key = make_key(fieldnames, keys, strip)
+    keyed = [(key(row), row) for row in rows(reader, len(fieldnames))]
+    del data, reader
+    keyed.sort(key=operator.itemgetter(0))
+    # csv.writer calls write() once per row
+    lines = []
+    writer = csv.writer(types.SimpleNamespace(write=lines.append),
+                        delimiter=outsep)
+    writer.writerows(row for (_, row) in keyed)
+    return write_chunk(zip((key for (key, _) in keyed), lines))
+
+def write_chunk(pairs):
+    "pickle (key, line) pairs to a temporary file, returning (path, size)"
+    # pylint: disable=import-outside-toplevel
+    import tempfile
+    pairs = iter(pairs)
+    with tempfile.NamedTemporaryFile("wb", prefix="csvsort-",
+                                     delete=False) as outf:
+        while batch := list(itertools.islice(pairs, CHUNK_BATCH)):
+            pickle.dump(batch, outf, pickle.HIGHEST_PROTOCOL)
+        return (outf.name, outf.tell())
+
+def merge_chunks(paths, out=True):
+    """merge the (key, line) pairs in the files at paths.
+
+    Write them to a new temporary file, returning (path, size), or if out
+    is None, return an iterator over them.
+    """
+    merged = heapq.merge(*map(read_chunk, paths), key=operator.itemgetter(0))
+    return merged if out is None else write_chunk(merged)
+
+def read_chunk(path):
+    "yield the (key, line) pairs written by sort_chunk"
+    with open(path, "rb") as inf:
+        while True:
+            try:
+                yield from pickle.load(inf)
+            except EOFError:
+                return
+
+def parse_key(spec):
+    "convert 'name[:type][:asc|desc]' to (name, type, descending)"
+    parts = spec.split(":")
+    direction = "asc"
+    if len(parts) > 1 and parts[-1] in DIRECTIONS:
+        direction = parts.pop()
+    typ = "str"
+    if len(parts) > 1 and parts[-1] in TYPES:
+        typ = parts.pop()
+    name = ":".join(parts)
+    if not name:
+        raise ValueError(f"missing field name in sort key {spec!r}")
+    return (name, typ, direction == "desc")
+
+class Descending:
+    "wrapper which reverses the order of values it compares"
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+def _converter(typ, descending):
+    """function converting one key value to a (flag, value) pair.
+
+    The flag puts missing values first (last if descending).
+    """
+    (present, missing) = (0, 1) if descending else (1, 0)
+    if typ in ("int", "float"):
+        convert = TYPES[typ]
+        # The builtins are much faster than locale's functions, which are
+        # only needed for grouped or non-"." decimal numbers.
+        fast = {"int": int, "float": float}[typ]
+        if localeconv()["decimal_point"] != ".":
+            fast = convert
+        sign = -1 if descending else 1
+        def number(value):
+            try:
+                value = fast(value)
+            except ValueError:
+                try:
+                    value = convert(value)
+                except ValueError:
+                    return (missing, 0)
+            # NaN has no place in the order, so treat it as missing
+            if math.isnan(value):
+                return (missing, 0)
+            return (present, sign * value)
+        return number
+
+    parse = DateParser()
+    wrap = Descending if descending else lambda value: value
+    def timestamp(value):
+        try:
+            value = parse(value)
+        except (ValueError, OverflowError):
+            return (missing, None)
+        if value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return (present, wrap(value))
+    return timestamp
+
+def make_key(fieldnames, keys, strip=False):
+    """sort key function for rows with the given fieldnames.
+
+    keys is a list of (name, type, descending) tuples from parse_key.
+    """
+    # like DictReader, the last of any duplicate names wins
+    index = {name: i for (i, name) in enumerate(fieldnames)}
+    offsets = [index[name] for (name, _, _) in keys]
+    if all(typ == "str" and not desc for (_, typ, desc) in keys):
+        # plain string comparison, as always
+        if strip:
+            return lambda row: [row[i].strip() for i in offsets]
+        return operator.itemgetter(*offsets)
+
+    parts = []
+    for (offset, (_, typ, desc)) in zip(offsets, keys):
+        if typ != "str":
+            parts.append((offset, _converter(typ, desc), True))
+        else:
+            parts.append((offset, Descending if desc else None, False))
+
+    def key(row):
+        result = []
+        for (offset, convert, pair) in parts:
+            value = row[offset].strip() if strip else row[offset]
+            if pair:
+                result.extend(convert(value))
+            else:
+                result.append(convert(value) if convert else value)
+        return tuple(result)
+    return key
+
 if __name__ == "__main__":
     with suppress((BrokenPipeError, KeyboardInterrupt)):
         sys.exit(main())
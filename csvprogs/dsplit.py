@@ -89,7 +89,7 @@ import datetime
 import os
 import sys
 
-from csvprogs.common import CSVArgParser, openpair#, usage
+from csvprogs.common import CSVArgParser, CSVWriter, openpair#, usage
 PROG = os.path.basename(sys.argv[0])
 
 def main():
@@ -109,13 +109,12 @@ def main():
 
     with openpair(options, args) as (inf, outf):
         reader = csv.DictReader(inf, delimiter=options.insep)
-        rows = list(reader)
 
         major = {}
         columns = set()
 
         first, second = options.split[1:].split(options.split[0])
-        for row in rows:
+        for row in reader:
             dt = datetime.datetime.strptime(row[options.field], options.pattern)
             colname = str(dt.strftime(first))
             rowname = str(dt.strftime(second))
@@ -127,8 +126,8 @@ def main():
             major[rowname][colname] = row[options.column]
         fieldnames = [options.output]
         fieldnames.extend(sorted(columns))
-        wtr = csv.DictWriter(outf, fieldnames=fieldnames,
-            delimiter=options.outsep)
+        wtr = CSVWriter(outf, fieldnames=fieldnames,
+            delimiter=options.outsep, float_format=options.float_format)
         wtr.writeheader()
         for row in sorted(major):
             wtr.writerow(major[row])
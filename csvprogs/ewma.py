@@ -49,21 +49,18 @@ SEE ALSO
 __all__ = ["ewma"]
 
 from contextlib import suppress
-import csv
-import math
 import os
 import sys
 
-from csvprogs.common import CSVArgParser, usage
+from csvprogs.common import CSVArgParser, CSVWriter, ColumnReader, usage
+from csvprogs.kernels import EMA
 
 
 PROG = os.path.basename(sys.argv[0])
 
 def ewma(rdr, field, outcol, alpha, gap):
     "core moving average calculation: outcol = ewma(field)"
-    nan = float('nan')
-    val = nan
-    missing = 0
+    kernel = EMA(alpha, gap)
     result = []
 
     # Trim trailing rows with empty string values for the field of
@@ -77,17 +74,7 @@ def ewma(rdr, field, outcol, alpha, gap):
         del rows[-1]
 
     for row in rows:
-        if not row[field] or math.isnan(float(row[field])):
-            missing += 1
-            if missing >= gap:
-                val = nan
-        else:
-            missing = 0
-            if math.isnan(val):
-                val = float(row[field])
-            else:
-                val = alpha * float(row[field]) + (1-alpha) * val
-        row[outcol] = val
+        row[outcol] = kernel.update(float(row[field] or "nan"))
         result.append(row)
 
     # Restore the rows we removed for the ewma calculation, for use
@@ -110,16 +97,29 @@ def main():
               file=sys.stderr)
         return 1
 
-    rdr = csv.DictReader(sys.stdin, delimiter=options.insep, restval="")
-    fnames = rdr.fieldnames[:]
-    fnames.append(options.outcol)
-    wtr = csv.DictWriter(sys.stdout, delimiter=options.outsep,
-        fieldnames=fnames)
-    wtr.writeheader()
-
-    result = ewma(rdr, options.field, options.outcol, options.alpha,
-        options.gap)
-    wtr.writerows(result)
+    rdr = ColumnReader(sys.stdin, delimiter=options.insep,
+                       numeric=[options.field])
+    wtr = CSVWriter(sys.stdout, delimiter=options.outsep,
+                    float_format=options.float_format)
+    wtr.writerow(rdr.fieldnames + [options.outcol])
+
+    # As in ewma(), trailing rows with no value for the field get no
+    # average. Rows without a value are held back until we know whether
+    # any more values follow.
+    kernel = EMA(options.alpha, options.gap)
+    offset = rdr.index[options.field]
+    held = []
+    for batch in rdr:
+        values = kernel.batch(batch[options.field]).tolist()
+        for (row, val) in zip(batch.rows, values):
+            if row[offset] == "":
+                held.append(row + [val])
+                continue
+            if held:
+                wtr.writerows(held)
+                del held[:]
+            wtr.writerow(row + [val])
+    wtr.writerows(row[:-1] + [""] for row in held)
     return 0
 
 
@@ -27,6 +27,11 @@ OPTIONS
 
     -v - make output more verbose
     -h - display this help and exit
+    --no-prefilter - parse every line (see DETAILS)
+    -j jobs - extract from pieces of the input in this many worker
+              processes at once (default 1); -v implies -j 1
+    --chunk-size size - bytes of input in each piece with -j
+              (default 4M)
 
 input is read from stdin, output written to stdout.
 
@@ -76,25 +81,38 @@ DETAILS
 =======
 
 Under the covers, the script builds a Python function which compares
-the user's expression against the values of a given row.  The first
-example would generate a function like this::
+the user's expression against the values of a given row.  Literals are
+converted once, to numbers or dates where possible, and each column
+the expression refers to is given a converter picked from the first
+100 rows.  With a header of contract,price, the first example would
+generate a function like this::
 
     def compare_func(row):
-        return ((row["contract"] == "F:LGOV13") and
-                ((row["price"] > "96125" or row["price"] < "96000")))
-
-The second example generates this function::
-
-    def compare_func(row):
-        return ((row["User Name"] == "zelenskyy") and
-                (row["Source or Destination"] == "From Exchange") and
-                (row["Transaction"] == "EXECUTION"))
+        try:
+            return bool((row[0] == _k0) and
+                        ((_c1(row[1]) > _k2) or (_c1(row[1]) < _k4)))
+        except TypeError:
+            return bool(...)
+
+where _k0 is "F:LGOV13", _k2 and _k4 are the integers 96125 and 96000
+and _c1 converts a price to a number.  Equality with a string is
+tested against the text as read, without conversion.  Values of
+different types, such as an empty cell and a number, compare false.
+String literals may be given with or without quotes.  Matching rows
+are written exactly as they were read.
+
+If every row the expression selects must contain some text, such as
+"zelenskyy" in the second example or "F:LGOV13" in the first, lines
+without it are skipped before they are parsed, which makes selective
+queries several times faster.  For a match term the text is the
+pattern's literal prefix, compared without regard to case.  Lines
+with quoted fields are only skipped if they hold a complete record,
+so the output is the same as with --no-prefilter.  With -v every row
+is parsed, so that all of them can be shown.
 
 LIMITATIONS
 ===========
 
-* Note that comparisons are currently done as strings.  This is
-  obviously suboptimal for many uses.
 * The interaction of the constraint notation with shell quoting makes
   writing the expressions less intuitive than it should be.
 * Should allow the user to specify a function defined in a Python
@@ -110,95 +128,393 @@ SEE ALSO
 
 """
 
+import ast
+from contextlib import nullcontext
 import csv
+from functools import partial
+import io
+import itertools
+import operator
 from locale import setlocale, LC_ALL
 import os
+import re
 import sys
 
-from csvprogs.common import CSVArgParser, usage, type_convert
+from csvprogs.common import (CHUNK_SIZE, CSVArgParser, CSVWriter, MappedFile,
+                             chunk_sample, chunk_text, column_converters,
+                             mappable, parallel_map, parse_size,
+                             record_chunks, timed, type_convert, usage)
 
 
 PROG = os.path.split(sys.argv[0])[1]
 
+# relational operators and the functions which apply them
+RELOPS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+# rows used to pick a converter for each referenced column
+SAMPLE = 100
+
 def main():
     parser = CSVArgParser(usage=usage(__doc__, globals()))
+    parser.add_argument("--no-prefilter", dest="prefilter", default=True,
+                        action="store_false",
+                        help="parse every line, even ones which can't match")
+    parser.add_argument("-j", "--jobs", default=1, type=int,
+                        help="number of worker processes")
+    parser.add_argument("--chunk-size", default=CHUNK_SIZE, type=parse_size,
+                        help="bytes of input per piece with -j, e.g. 1M")
     options, args = parser.parse_known_args()
 
     setlocale(LC_ALL, options.locale)
 
-    rdr = csv.DictReader(sys.stdin)
-    func = build_compare_func(args, verbose=options.verbose, keys=rdr.fieldnames)
-    wtr = csv.DictWriter(sys.stdout, fieldnames=rdr.fieldnames)
-    if not options.append:
-        wtr.writeheader()
-    for row in rdr:
-        mods = {}
-        for key in row:
-            cvt = type_convert(row[key])
-            if cvt != row[key]:
-                mods[key] = cvt
-        row.update(mods)
-        if options.verbose:
-            eprint(row, func(row))
-        if func(row):
-            wtr.writerow(row)
+    # -v reports every row in order
+    jobs = 1 if options.verbose else options.jobs
+    mapped = jobs > 1 and mappable(sys.stdin, options.encoding)
+    with (MappedFile(sys.stdin, options.encoding) if mapped
+              else nullcontext(sys.stdin)) as inf:
+        lines = iter(inf)
+        rdr = csv.reader(lines, delimiter=options.insep)
+        fieldnames = next(rdr, None)
+        if fieldnames is None:
+            return 0
+        if jobs > 1:
+            (head, chunks) = chunk_sample(
+                record_chunks(inf if mapped else lines, options.chunk_size),
+                partial(csv.reader, delimiter=options.insep), SAMPLE,
+                options.encoding)
+        else:
+            head = list(itertools.islice(rdr, SAMPLE))
+        try:
+            func = build_compare_func(args, verbose=options.verbose,
+                                      keys=fieldnames, sample=head)
+        except ValueError as exc:
+            print(usage(__doc__, globals(), str(exc)), file=sys.stderr)
+            return 1
+        # -v reports every row, so they must all be parsed
+        search = (prefilter(args, fieldnames)
+                      if options.prefilter and not options.verbose else None)
+        wtr = CSVWriter(sys.stdout, delimiter=options.outsep,
+                        float_format=options.float_format)
+        if not options.append:
+            wtr.writerow(fieldnames)
+
+        if jobs > 1:
+            args = (options.encoding, options.insep, options.outsep,
+                    options.float_format, fieldnames, args, head,
+                    search is not None)
+            for text in parallel_map(extract_chunk, chunks, jobs, args,
+                                     options.locale):
+                sys.stdout.write(text)
+            return 0
+
+        if search is not None:
+            # the reader hasn't read past the sample, so the rest of the
+            # lines can be screened before they are parsed
+            rdr = screened(lines, search, options.insep)
+        extract(timed(itertools.chain(head, rdr), "parse"), func, wtr,
+                len(fieldnames), options.verbose)
 
     return 0
 
-def build_compare_func(args, verbose=False, keys=()):
-    "Build a comparison function from cmdline args"
-
-    keys = set(keys)
-    func = ["def compare_func(row):\n",
-            "    import re\n",
-            "    return ( "]
-
-    for (i, arg) in enumerate(args):
-        args[i] = type_convert(arg)
+def extract(rows, func, wtr, width, verbose=False):
+    "write the rows for which func is true, padded to width"
+    for row in rows:
+        if len(row) < width:
+            if not row:
+                continue
+            row += [""] * (width - len(row))
+        result = func(row)
+        if verbose:
+            eprint(row, result)
+        if result:
+            wtr.writerow(row)
 
+def extract_chunk(chunk, encoding, insep, outsep, float_format, fieldnames,
+                  args, sample, screen):
+    """Extract the matching rows of a piece of the input in a worker process.
+
+    Columns are converted as if sample had been the first rows, and lines
+    are screened first if screen is true. Returns the output text.
+    """
+    func = build_compare_func(args, keys=fieldnames, sample=sample)
+    lines = iter(io.StringIO(chunk_text(chunk, encoding), newline="\n"))
+    search = prefilter(args, fieldnames) if screen else None
+    rows = (csv.reader(lines, delimiter=insep) if search is None
+                else screened(lines, search, insep))
+    out = io.StringIO()
+    extract(rows, func, CSVWriter(out, delimiter=outsep,
+                                  float_format=float_format),
+            len(fieldnames))
+    return out.getvalue()
+
+def parse_operand(token, keys):
+    """("column", index) if token names a column, else ("literal", value).
+
+    Literals are converted once, to a number or datetime if possible. A
+    quoted string, such as '"F:LGOV13"', is a Python string literal.
+    """
+    if token in keys:
+        return ("column", keys.index(token))
+    value = type_convert(token)
+    if isinstance(value, str):
+        try:
+            value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            pass
+    return ("literal", value)
+
+def build_compare_func(args, verbose=False, keys=(), sample=()):
+    """Build a comparison function from cmdline args.
+
+    The function takes a row as a list of strings, in keys order. Only
+    the columns the expression refers to are converted, each with a
+    converter chosen from the sample rows, and only when the term using
+    them is evaluated, so "and" and "or" short-circuit the work too.
+    Comparisons between values of different types (an empty cell and a
+    number, say) are false. Raises ValueError if args can't be parsed.
+    """
+
+    keys = list(keys)
+    args = list(args)
+    # constants referenced by the generated code
+    names = {}
+    referenced = set()
+
+    def constant(value):
+        name = f"_k{len(names)}"
+        names[name] = value
+        return name
+
+    def column(index):
+        "code to convert the cell at index"
+        referenced.add(index)
+        return f"_c{index}(row[{index}])"
+
+    # the expression, plus a version in which each comparison treats
+    # TypeError as false, for the rows the first chokes on
+    (terms, safe) = ([], [])
     while args:
         # Expect the start of a constraint, a paren or the words "and"
         # or "or".
         if args[0] in ("(", ")", "and", "or"):
-            func.append(f" {args[0]} ")
-            if verbose:
-                eprint(repr(func[-1]))
-            del args[0]
+            terms.append(args[0])
+            safe.append(args.pop(0))
             continue
 
-        if args[1] == "match":
-            # args[0] must match args[2], e.g.:
-            #    re.match(args[2], row[args[0]], re.I) is not None
-            func.append(f"(re.match(str({args[2]!r}), str(row[{args[0]!r}]), re.I) is not None)")
-            if verbose:
-                eprint(repr(func[-1]))
-            del args[0:3]
-            continue
-
-        # Now we know we must find a constraint.  It must consume the
-        # next three tokens.
-        if args[0] in keys:
-            args[0] = f"row[{args[0]!r}]"
-        if args[2] in keys:
-            args[2] = f"row[{args[2]!r}]"
-
-        func.append(f"({args[0]} {args[1]} {args[2]})")
-        if verbose:
-            eprint(repr(func[-1]))
+        if len(args) < 3:
+            raise ValueError(f"incomplete term: {' '.join(args)}")
+        (left, relop, right) = args[:3]
         del args[0:3]
 
-    func.append(" )\n")
-    func = "".join(func)
+        if relop == "match":
+            # left must match the right pattern, compiled once:
+            #    re.match(right, row[left], re.IGNORECASE) is not None
+            pattern = constant(re.compile(str(right), re.IGNORECASE).match)
+            (kind, value) = parse_operand(left, keys)
+            text = f"row[{value}]" if kind == "column" else constant(str(value))
+            terms.append(f"({pattern}({text}) is not None)")
+            safe.append(terms[-1])
+            continue
+
+        if relop not in RELOPS:
+            raise ValueError(f"unknown operator {relop!r}")
+        operands = [parse_operand(left, keys), parse_operand(right, keys)]
+        # equality with a string needs no conversion at all
+        raw = (relop in ("==", "!=") and
+               any(kind == "literal" and isinstance(value, str)
+                       for (kind, value) in operands))
+        code = []
+        for (kind, value) in operands:
+            if kind == "literal":
+                code.append(constant(value))
+            elif raw:
+                code.append(f"row[{value}]")
+            else:
+                code.append(column(value))
+        terms.append(f"({code[0]} {relop} {code[1]})")
+        safe.append(f"{constant(_safe(RELOPS[relop]))}({code[0]}, {code[1]})")
+
+    func = ("def compare_func(row):\n"
+            "    try:\n"
+            f"        return bool({' '.join(terms) or 'True'})\n"
+            "    except TypeError:\n"
+            f"        return bool({' '.join(safe) or 'True'})\n")
     if verbose:
         eprint(func)
-    # We've now built a function.  Compile the code and proceed.
 
-    glbls = {}
+    sample = [[row[i] if i < len(row) else "" for i in sorted(referenced)]
+                  for row in sample]
+    converters = column_converters(sample)
+    glbls = dict(names)
+    for (n, index) in enumerate(sorted(referenced)):
+        glbls[f"_c{index}"] = converters.get(n, type_convert)
+    # We've now built a function.  Compile the code and proceed.
     # pylint: disable=exec-used
     exec(func, glbls)
 
     return glbls["compare_func"]
 
+def prefilter(args, keys):
+    """A test of raw lines which rejects most rows args can't match, or None.
+
+    A row can only satisfy column == "string" if the string appears in
+    its line, and column match pattern if the pattern's literal prefix
+    (say, "ES" for "ES[HM]5") does, in any case. The required text is
+    combined through "and", "or" and parentheses: an "and" needs the text
+    of any one of its terms, an "or" the text of one of them all. None is
+    returned if args needn't contain any text at all.
+    """
+    items = []
+    args = list(args)
+    while args:
+        if args[0] in ("(", ")", "and", "or"):
+            items.append(args.pop(0))
+        else:
+            items.append(_needle(args[:3], keys))
+            del args[:3]
+    pos = 0
+
+    def either():
+        "needles for an or expression"
+        nonlocal pos
+        needles = both()
+        while pos < len(items) and items[pos] == "or":
+            pos += 1
+            more = both()
+            needles = None if needles is None or more is None else needles + more
+        return needles
+
+    def both():
+        "needles for an and expression"
+        nonlocal pos
+        needles = atom()
+        while pos < len(items) and items[pos] == "and":
+            pos += 1
+            more = atom()
+            if needles is None or more is not None and len(more) < len(needles):
+                needles = more
+        return needles
+
+    def atom():
+        "needles for a term or a parenthesized expression"
+        nonlocal pos
+        item = items[pos]
+        pos += 1
+        if item == "(":
+            needles = either()
+            pos += 1
+            return needles
+        return item
+
+    needles = either()
+    if not needles:
+        return None
+    # "in" is much faster than a search for alternatives
+    names = {}
+    tests = []
+    for (text, nocase) in needles:
+        name = f"_n{len(names)}"
+        if nocase:
+            names[name] = re.compile(re.escape(text), re.IGNORECASE).search
+            tests.append(f"{name}(line) is not None")
+        else:
+            names[name] = text
+            tests.append(f"{name} in line")
+    # pylint: disable=eval-used
+    return eval(f"lambda line: {' or '.join(tests)}", names)
+
+def _needle(term, keys):
+    """[(text, ignore case)] which the line of any row matching term has.
+
+    None if there is no such text. The text never contains a quote, which
+    the line might have doubled.
+    """
+    if len(term) < 3:
+        return None
+    (left, relop, right) = term
+    operands = [parse_operand(left, keys), parse_operand(right, keys)]
+    if relop == "match":
+        # the pattern is always right, and left is the text matched
+        if operands[0][0] != "column":
+            return None
+        text = _literal_prefix(str(right))
+        # case only matters if there's some
+        nocase = text.lower() != text.upper()
+    elif relop == "==":
+        kinds = sorted(operands, key=operator.itemgetter(0))
+        if ([kind for (kind, _) in kinds] != ["column", "literal"] or
+                not isinstance(kinds[1][1], str)):
+            return None
+        (text, nocase) = (kinds[1][1], False)
+    else:
+        return None
+    return [(text, nocase)] if text and '"' not in text else None
+
+def _literal_prefix(pattern):
+    "text which every string pattern matches starts with"
+    if "|" in pattern:
+        return ""
+    pattern = pattern.removeprefix("^")
+    prefix = []
+    for char in pattern:
+        if char in ".^$*+?{}[]\\|()":
+            # the last character might be optional
+            if char in "*?{" and prefix:
+                prefix.pop()
+            break
+        prefix.append(char)
+    return "".join(prefix)
+
+def screened(lines, search, delimiter=","):
+    """Yield the rows of lines which might satisfy search.
+
+    Lines are only tested at the start of a record, and only when they
+    hold the whole of it: either there is no quote, or every field is
+    plain or properly quoted. Everything else goes to a csv reader, which
+    reads continuation lines itself, so the rows are exactly the rows of
+    lines, less some which search rejects.
+    """
+    delim = re.escape(delimiter)
+    cell = rf'(?:[^"{delim}\n]*|"(?:[^"]|"")*")'
+    whole = re.compile(rf"{cell}(?:{delim}{cell})*\n?").fullmatch
+    pending = []
+
+    def feed():
+        "the current line, then whatever the reader needs to finish it"
+        while True:
+            if pending:
+                yield pending.pop()
+            else:
+                line = next(lines, None)
+                if line is None:
+                    return
+                yield line
+
+    rdr = csv.reader(feed(), delimiter=delimiter)
+    for line in lines:
+        if not search(line) and ('"' not in line or whole(line)):
+            continue
+        pending.append(line)
+        row = next(rdr, None)
+        if row is None:
+            return
+        yield row
+
+def _safe(relop):
+    "relop, but false for values of types it can't compare"
+    def compare(left, right):
+        try:
+            return relop(left, right)
+        except TypeError:
+            return False
+    return compare
 
 def eprint(*args, file=sys.stderr, **kwds):
     print(*args, file=file, **kwds)
@@ -19,7 +19,8 @@ Filter input values based upon user-defined function
 SYNOPSIS
 ========
 
- %(PROG)s -f lambda [ -k name ] [ infile [ outfile ] ]
+ %(PROG)s -f lambda [ -k name ] [ -j jobs [ --chunk-size size ] ]
+          [ infile [ outfile ] ]
 
 OPTIONS
 =======
@@ -31,6 +32,12 @@ OPTIONS
             associated with this key in the output (if input has a
             header). If given but the input has no header, the return
             value will simply be appended to the output.
+-j jobs     Filter pieces of the input in this many worker processes
+            at once (default 1). The output is the same, in the same
+            order. Each worker evaluates the lambda expression itself,
+            so it shouldn't depend on rows it has seen before.
+--chunk-size size
+            Bytes of input in each piece with -j (default 4M).
 
 DESCRIPTION
 ===========
@@ -92,8 +99,9 @@ like this::
     }
 
 Code in the lambda expression can thus access elements using list or
-dictionary notation.  (Note that negative offsets such as x[-1] won't
-work, however.)
+dictionary notation, including negative offsets such as x[-1].  Fields
+are only converted when the lambda looks them up, and rows are
+written exactly as they were read.
 
 This tool is obviously going to be slower than grep or sed, but offers
 the user a lot more flexibility and if the user has Python experience
@@ -113,14 +121,22 @@ SEE ALSO
 """
 
 import csv
+import io
+import itertools
 import os
 import sys
 
-from csvprogs.common import type_convert, CSVArgParser, usage, openpair
+from csvprogs.common import (CSVArgParser, CSVWriter, ListyRow, usage,
+                             openpair, chunk_sample, chunk_text,
+                             column_converters, parallel_map, record_chunks,
+                             timed, type_convert, CHUNK_SIZE, parse_size)
 
 
 PROG = os.path.basename(sys.argv[0])
 
+# rows used to pick a converter for each column
+SAMPLE = 100
+
 
 def main():
     parser = CSVArgParser(usage=usage(__doc__, globals()))
@@ -128,38 +144,95 @@ def main():
                         help="Python lambda expression to use as row filter")
     parser.add_argument("-k", "--lambda-key", default="",
                         help="Result of lambda expression evaluation, if given")
+    parser.add_argument("-j", "--jobs", default=1, type=int,
+                        help="number of worker processes")
+    parser.add_argument("--chunk-size", default=CHUNK_SIZE, type=parse_size,
+                        help="bytes of input per piece with -j, e.g. 1M")
     options, args = parser.parse_known_args()
 
     # pylint: disable=W0123
     func = eval(options.function)
 
-    with openpair(options, args) as (inf, outf):
-        reader = csv.DictReader(inf, delimiter=options.insep)
-        fieldnames = reader.fieldnames[:]
+    with openpair(options, args, mapped=options.jobs > 1) as (inf, outf):
+        reader = csv.reader(inf, delimiter=options.insep)
+        fieldnames = next(reader, None)
+        if fieldnames is None:
+            return 0
+        outfields = fieldnames[:]
         if options.lambda_key:
             if options.lambda_key in fieldnames:
                 raise ValueError(f"{options.lambda_key} is already in {fieldnames}")
-            fieldnames.append(options.lambda_key)
-        writer = csv.DictWriter(outf, fieldnames=fieldnames, delimiter=options.outsep)
+            outfields.append(options.lambda_key)
+        writer = CSVWriter(outf, fieldnames=outfields,
+                           delimiter=options.outsep,
+                           float_format=options.float_format)
         if not options.append:
             writer.writeheader()
 
-        for row in reader:
-            type_convert_row(row)
-
-            eff_row = row.copy()
-            val = func(eff_row)
-            if options.lambda_key:
-                row[options.lambda_key] = val
-            if val:
-                writer.writerow(row)
+        if options.jobs <= 1:
+            rows = (row for row in timed(reader, "parse") if row)
+            head = list(itertools.islice(rows, SAMPLE))
+            select(itertools.chain(head, rows), fieldnames, func, writer,
+                   column_converters(head), options.lambda_key)
+            return 0
+
+        (sample, chunks) = chunk_sample(
+            record_chunks(inf, options.chunk_size),
+            lambda inf: (row for row in csv.reader(inf,
+                                                   delimiter=options.insep)
+                             if row),
+            SAMPLE, options.encoding)
+        args = (options.function, options.encoding, options.insep,
+                options.outsep, options.float_format, fieldnames, outfields,
+                options.lambda_key, sample)
+        for text in parallel_map(filter_chunk, chunks, options.jobs, args,
+                                 options.locale):
+            outf.write(text)
 
     return 0
 
-
-def type_convert_row(row):
-    for k in row:
-        row[k] = type_convert(row[k])
+def select(rows, fieldnames, func, writer, convert, lambda_key=""):
+    """write the list rows for which func is true.
+
+    func is passed a ListyRow view of each row, whose fields are
+    converted by convert (column_converters of a sample) when it looks
+    them up. The rows themselves are written as they were read. Short
+    rows are padded with empty fields; longer ones raise ValueError.
+    """
+    width = len(fieldnames)
+    indexes = {name: i for (i, name) in enumerate(fieldnames)}
+    for row in rows:
+        if len(row) != width:
+            if not row:
+                continue
+            if len(row) > width:
+                raise ValueError(f"row has {len(row)} fields, more than"
+                                 f" the {width} in the header: {row!r}")
+            row = row + [""] * (width - len(row))
+        val = func(ListyRow(row, indexes, convert, type_convert))
+        if lambda_key:
+            row.append(val)
+        if val:
+            writer.writerow(row)
+
+def filter_chunk(chunk, function, encoding, insep, outsep, float_format,
+                 fieldnames, outfields, lambda_key, sample):
+    """Filter a piece of the input in a worker process.
+
+    Cells are converted as if sample had been the first rows. Returns
+    the output text.
+    """
+    # pylint: disable=W0123
+    func = eval(function)
+    reader = csv.reader(io.StringIO(chunk_text(chunk, encoding),
+                                    newline="\n"),
+                        delimiter=insep)
+    out = io.StringIO()
+    writer = CSVWriter(out, fieldnames=outfields, delimiter=outsep,
+                       float_format=float_format)
+    select(reader, fieldnames, func, writer, column_converters(sample),
+           lambda_key)
+    return out.getvalue()
 
 
 if __name__ == "__main__":
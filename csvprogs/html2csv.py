@@ -40,20 +40,19 @@ SEE ALSO
 
 """
 
-import csv
 import datetime
 from html.parser import HTMLParser
 import os
 import sys
 
-from csvprogs.common import CSVArgParser, usage, openio
+from csvprogs.common import CSVArgParser, CSVWriter, usage, openio
 
 
 PROG = os.path.splitext(os.path.basename(sys.argv[0]))[0]
 EPOCH = datetime.datetime.fromtimestamp(0)
 
 def main():
-    parser = CSVArgParser(usage=usage(__doc__, globals()))
+    parser = CSVArgParser(usage=usage(__doc__, globals()), float_format=False)
     parser.add_argument("-t", "--table", dest="table", default=1,
                         type=int)
     (options, args) = parser.parse_known_args()
@@ -65,7 +64,7 @@ def main():
         for line in inf:
             tbl_parser.feed(line)
         tbl_parser.close()
-        wrtr = csv.writer(outf)
+        wrtr = CSVWriter(outf)
         for row in tbl_parser.rows:
             wrtr.writerow(row)
     return 0
@@ -53,12 +53,15 @@ SEE ALSO
 """
 
 from contextlib import suppress
-import csv
 import math
 import os
 import sys
 
-from csvprogs.common import CSVArgParser, openpair, usage, weighted_ma
+import numpy
+
+from csvprogs.common import (CSVArgParser, CSVWriter, ColumnReader, openpair,
+                             usage)
+from csvprogs.kernels import HMA
 
 
 PROG = os.path.basename(sys.argv[0])
@@ -73,45 +76,24 @@ def main():
                         help="output column")
     (options, args) = parser.parse_known_args()
 
+    kernel = HMA(options.length)
+
     with openpair(options, args) as (inf, outf):
-        reader = csv.DictReader(inf, delimiter=options.insep)
-        fnames = reader.fieldnames + [options.column]
-        wtr = csv.DictWriter(outf, delimiter=options.outsep, fieldnames=fnames)
+        reader = ColumnReader(inf, delimiter=options.insep,
+                              numeric=[options.field])
+        wtr = CSVWriter(outf, delimiter=options.outsep,
+                        float_format=options.float_format)
         if not options.append:
-            wtr.writeheader()
-        coeffs = list(range(options.length, 0, -1))
-        half = options.length // 2
-        sqrt_len = int(round(math.sqrt(options.length)))
-        # values correspond to raw data, wma(n), wma(n/2), hull(n).
-        # Values for wma(n), wma(n/2) and hull(n) are only computed when
-        # the raw data fills up enough to eliminate the None values in the
-        # raw data.
-        values = [
-            [None] * options.length,        # raw inputs, appended to end
-            [None] * options.length,        # wma(n)
-            [None] * options.length,        # wma(n/2)
-            [None] * options.length,        # 2 * wma(n/2) - wma(n)
-        ]
-        for row in reader:
-            val = ""
-            if row[options.field]:
-                values[0].append(float(row[options.field]))
-                del values[0][0]
-                if None not in values[0]:
-                    # wma(n)
-                    values[1].append(weighted_ma(values[0], coeffs))
-                    del values[1][0]
-                    # wma(n/2)
-                    values[2].append(weighted_ma(values[0][-half:], coeffs[-half:]))
-                    del values[2][0]
-                    # 2 * wma(n/2) - wma(n)
-                    values[3].append(2 * values[2][-1] - values[1][-1])
-                    del values[3][0]
-                    vals = values[3][-sqrt_len:]
-                    if None not in vals:
-                        val = weighted_ma(vals, coeffs[-sqrt_len:])
-            row[options.column] = val
-            wtr.writerow(row)
+            wtr.writerow(reader.fieldnames + [options.column])
+        for batch in reader:
+            values = batch[options.field]
+            # Rows without a value are passed through without disturbing
+            # the averages.
+            present = ~numpy.isnan(values)
+            hull = numpy.full(len(values), numpy.nan)
+            hull[present] = kernel.batch(values[present])
+            wtr.writerows(row + ["" if math.isnan(val) else val]
+                              for (row, val) in zip(batch.rows, hull.tolist()))
     return 0
 
 
@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+
+"""
+===========
+%(PROG)s
+===========
+
+----------------------------------------------------
+compute several moving averages in one pass
+----------------------------------------------------
+
+:Author: skip.montanaro@gmail.com
+:Date: 2026-10-17
+:Copyright: Skip Montanaro 2026
+:Version: 0.1
+:Manual section: 1
+:Manual group: data filters
+
+SYNOPSIS
+========
+
+  %(PROG)s -I spec[,spec ...] [ -I spec ... ] [ infile [ outfile ] ]
+
+OPTIONS
+=======
+
+-I specs  comma-separated indicator specs (may be repeated)
+-i sep    use sep as the input field separator (default is comma)
+-o sep    use sep as the output field separator (default is comma)
+
+DESCRIPTION
+===========
+
+Each spec has the form kind:field[:param=value ...], for example
+
+  ewma:weight:alpha=0.1,mvavg:hr:n=7,hull:close:n=30
+
+Every indicator is computed from the input in a single pass and appended
+as a new column, in the order given. The output is the same as chaining
+the corresponding programs in a pipeline. Available kinds and their
+parameters are:
+
+ewma   alpha (default 0.1), gap (default 5), out (default "ewma")
+mvavg  n (default 5), w (weighted, no value), out (default "mean")
+hull   n (default 30), out (default "hull")
+
+Output column names must be distinct, so when the same kind appears
+more than once, give each an out parameter.
+
+SEE ALSO
+========
+
+* ewma
+* hull
+* mvavg
+"""
+
+import math
+import os
+import pickle
+import sys
+from abc import ABC, abstractmethod
+from typing import ClassVar
+
+import numpy
+
+from csvprogs.common import ColumnReader, CSVArgParser, CSVWriter, openpair, usage
+from csvprogs.kernels import EMA, HMA, SMA, WMA
+
+PROG = os.path.basename(sys.argv[0])
+
+# rows held back in memory (see HeldRows) before spilling to disk
+HOLD = 10000
+
+def flag(value):
+    "boolean parameter, given bare or as name=1/true/yes"
+    return value is True or str(value).lower() in ("1", "true", "yes")
+
+class Indicator(ABC):
+    "one output column computed from one input column"
+
+    # parameter name -> (type, default)
+    params: ClassVar[dict] = {}
+    outcol = None
+
+    def __init__(self, field, **kwds):
+        self.field = field
+        self.outcol = kwds.pop("out", self.outcol)
+        for (name, (typ, default)) in self.params.items():
+            setattr(self, name, typ(kwds.pop(name, default)))
+        if kwds:
+            raise ValueError(f"unknown parameter(s) for {self.kind}: "
+                             f"{', '.join(kwds)}")
+
+    @abstractmethod
+    def compute(self, values):
+        "return a list of output values for an array of input values"
+
+class MovingAverage(Indicator):
+    "mvavg: simple or weighted moving average"
+
+    kind = "mvavg"
+    params: ClassVar[dict] = {"n": (int, 5), "w": (flag, False)}
+    outcol = "mean"
+
+    def __init__(self, field, **kwds):
+        super().__init__(field, **kwds)
+        self.kernel = (WMA if self.w else SMA)(self.n)
+
+    def compute(self, values):
+        return self.kernel.batch(values).tolist()
+
+class HullAverage(Indicator):
+    "hull: hull moving average of the rows which have a value"
+
+    kind = "hull"
+    params: ClassVar[dict] = {"n": (int, 30)}
+    outcol = "hull"
+
+    def __init__(self, field, **kwds):
+        super().__init__(field, **kwds)
+        self.kernel = HMA(self.n)
+
+    def compute(self, values):
+        present = ~numpy.isnan(values)
+        hull = numpy.full(len(values), numpy.nan)
+        hull[present] = self.kernel.batch(values[present])
+        return ["" if math.isnan(val) else val for val in hull.tolist()]
+
+class ExpAverage(Indicator):
+    "ewma: exponentially weighted moving average"
+
+    kind = "ewma"
+    params: ClassVar[dict] = {"alpha": (float, 0.1), "gap": (int, 5)}
+    outcol = "ewma"
+
+    def __init__(self, field, **kwds):
+        super().__init__(field, **kwds)
+        if self.gap <= 0:
+            raise ValueError("gap must be greater than zero")
+        self.kernel = EMA(self.alpha, self.gap)
+
+    def compute(self, values):
+        return self.kernel.batch(values).tolist()
+
+KINDS = {cls.kind: cls for cls in (ExpAverage, MovingAverage, HullAverage)}
+
+def parse_spec(spec):
+    "convert 'kind:field:name=value:...' to an Indicator"
+    (kind, _, rest) = spec.partition(":")
+    if kind not in KINDS:
+        raise ValueError(f"unknown indicator {kind!r} in {spec!r}")
+    (field, *params) = rest.split(":")
+    if not field:
+        raise ValueError(f"missing field in {spec!r}")
+    kwds = {}
+    for param in params:
+        (name, eq, value) = param.partition("=")
+        # a bare name is a flag
+        kwds[name] = value if eq else True
+    return KINDS[kind](field, **kwds)
+
+def parse_specs(specs):
+    "convert a list of comma-separated spec strings to Indicators"
+    indicators = [parse_spec(spec.strip())
+                    for arg in specs
+                        for spec in arg.split(",") if spec.strip()]
+    outcols = [ind.outcol for ind in indicators]
+    dups = sorted({col for col in outcols if outcols.count(col) > 1})
+    if dups:
+        raise ValueError(f"duplicate output column(s): {', '.join(dups)}")
+    return indicators
+
+def compute(inf, outf, indicators, insep=",", outsep=",", header=True,
+            float_format=None):
+    "append all indicators to the rows of inf, writing to outf"
+    rdr = ColumnReader(inf, delimiter=insep,
+                       numeric=[ind.field for ind in indicators])
+    missing = [ind.field for ind in indicators if ind.field not in rdr.index]
+    if missing:
+        raise KeyError(", ".join(missing))
+    wtr = CSVWriter(outf, delimiter=outsep, float_format=float_format)
+    if header:
+        wtr.writerow(rdr.fieldnames + [ind.outcol for ind in indicators])
+
+    # Like ewma, trailing rows without a value get no ewma, so a row is
+    # held back until every ewma column has had a value in it or a later
+    # row (or the input ends).
+    nfields = len(rdr.fieldnames)
+    ewmas = [(nfields + i, rdr.index[ind.field])
+                for (i, ind) in enumerate(indicators)
+                    if isinstance(ind, ExpAverage)]
+    rows = (row + vals
+                for batch in rdr
+                    for (row, *vals) in zip(batch.rows,
+                                            *[ind.compute(batch[ind.field])
+                                                for ind in indicators]))
+    if not ewmas:
+        wtr.writerows(rows)
+        return
+    # pylint: disable=import-outside-toplevel
+    import tempfile
+    with tempfile.TemporaryFile() as spill:
+        held = HeldRows(ewmas, HOLD, spill)
+        for row in rows:
+            held.release(wtr, held.add(row))
+        held.finish(wtr)
+
+class HeldRows:
+    """Rows waiting for a value in each of their ewma columns.
+
+    ewmas is a list of (output offset, input offset) pairs. Rows are
+    numbered from 0 as they are added. Every row up to the last value of
+    the column which has least recently had one can be written. Sparse
+    columns could hold back any number of rows, so beyond hold rows they
+    are pickled to the binary file spill.
+    """
+
+    def __init__(self, ewmas, hold, spill):
+        self.ewmas = ewmas
+        self.hold = hold
+        # Held rows are, oldest first, head[used:], the lists of rows
+        # pickled to spill after offset, and rows.
+        (self.head, self.used) = ([], 0)
+        (self.spill, self.offset, self.spilled) = (spill, 0, 0)
+        self.rows = []
+        # number of the first held row and of the next row
+        (self.start, self.count) = (0, 0)
+        # number of the last row with a value, by input offset
+        self.last = {offset: -1 for (_, offset) in ewmas}
+
+    def add(self, row):
+        "hold row, returning the number of the last row which may be written"
+        for (_, offset) in self.ewmas:
+            if row[offset] != "":
+                self.last[offset] = self.count
+        self.count += 1
+        self.rows.append(row)
+        if len(self.rows) >= self.hold:
+            self.spill.seek(0, os.SEEK_END)
+            pickle.dump(self.rows, self.spill, pickle.HIGHEST_PROTOCOL)
+            self.spilled += len(self.rows)
+            self.rows = []
+        return min(self.last.values())
+
+    def release(self, wtr, end, trailing=False):
+        """write the held rows up to number end.
+
+        If trailing is true, no more rows follow, so rows after the last
+        value of an ewma column get no ewma.
+        """
+        while self.start <= end:
+            if self.used == len(self.head):
+                (self.head, self.used) = (self._next(), 0)
+            rows = self.head[self.used:self.used + end + 1 - self.start]
+            self.used += len(rows)
+            if trailing:
+                for (outcol, offset) in self.ewmas:
+                    last = self.last[offset]
+                    for row in rows[max(0, last + 1 - self.start):]:
+                        row[outcol] = ""
+            wtr.writerows(rows)
+            self.start += len(rows)
+
+    def finish(self, wtr):
+        "write the remaining rows"
+        self.release(wtr, self.count - 1, trailing=True)
+
+    def _next(self):
+        "the oldest held rows not in head"
+        if not self.spilled:
+            (rows, self.rows) = (self.rows, [])
+            return rows
+        self.spill.seek(self.offset)
+        rows = pickle.load(self.spill)
+        self.offset = self.spill.tell()
+        self.spilled -= len(rows)
+        if not self.spilled:
+            # reuse the space
+            self.spill.seek(0)
+            self.spill.truncate()
+            self.offset = 0
+        return rows
+
+def main():
+    parser = CSVArgParser(usage=usage(__doc__, globals()))
+    parser.add_argument("-I", "--indicators", action="append", required=True,
+                        help="indicator specs, e.g. ewma:weight:alpha=0.1")
+    (options, args) = parser.parse_known_args()
+
+    try:
+        indicators = parse_specs(options.indicators)
+    except ValueError as exc:
+        print(usage(__doc__, globals(), str(exc)), file=sys.stderr)
+        return 1
+
+    with openpair(options, args) as (inf, outf):
+        compute(inf, outf, indicators, insep=options.insep,
+                outsep=options.outsep, header=not options.append,
+                float_format=options.float_format)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -18,9 +18,6 @@ interpolation is TBD.
 import os
 import sys
 
-import numpy as np
-import pandas as pd
-
 from csvprogs.common import CSVArgParser, openpair, usage
 
 
@@ -36,6 +33,10 @@ def main():
                         help="date/time column")
     options, args = parser.parse_known_args()
 
+    # Defer the slow pandas import until after --help has had its chance.
+    # pylint: disable=import-outside-toplevel
+    import pandas as pd
+
     with openpair(options, args) as (inf, outf):
         header = next(inf).strip().split(options.insep)
         dtype = {
@@ -53,8 +54,8 @@ def main():
         frame = field_data.join(frame, how="outer")
         del frame[options.xaxis]
         frame = frame.reset_index()
-        frame = frame.replace(np.nan, "")
-        frame.to_csv(outf, index=False)
+        frame.to_csv(outf, index=False, na_rep="",
+                     float_format=options.float_format)
 
     return 0
 
@@ -48,12 +48,12 @@ SEE ALSO
 
 """
 
-import csv
 import math
 import os
 import sys
 
-from csvprogs.common import CSVArgParser, openpair, usage
+from csvprogs.common import (CSVArgParser, CSVWriter, ColumnReader, openpair,
+                             usage)
 
 
 PROG = os.path.basename(sys.argv[0])
@@ -69,23 +69,28 @@ def main():
     options, args = parser.parse_known_args()
 
     with openpair(options, args) as (inf, outf):
-        reader = csv.DictReader(inf, delimiter=options.insep)
+        # Keltner is cheap enough per row that numpy's import time would
+        # dominate on the small inputs it usually sees, so stick to floats.
+        reader = ColumnReader(inf, delimiter=options.insep)
 
         upper = options.prefix + "upper"
         lower = options.prefix + "lower"
-        fnames = reader.fieldnames + [upper, lower]
-        writer = csv.DictWriter(outf, delimiter=options.outsep, fieldnames=fnames)
+        writer = CSVWriter(outf, delimiter=options.outsep,
+                           float_format=options.float_format)
         if not options.append:
-            writer.writeheader()
-        for row in reader:
-            atr = float(row.get(options.atr, "") or 'nan')
-            ewma = float(row.get(options.ewma, "") or 'nan')
-            if math.isnan(atr) or math.isnan(ewma):
-                writer.writerow(row)
+            writer.writerow(reader.fieldnames + [upper, lower])
+        for batch in reader:
+            if options.atr not in batch or options.ewma not in batch:
+                writer.writerows(row + ["", ""] for row in batch.rows)
                 continue
-            row[upper] = ewma + 2 * atr
-            row[lower] = ewma - 2 * atr
-            writer.writerow(row)
+            for (row, atr, ewma) in zip(batch.rows, batch[options.atr],
+                                        batch[options.ewma]):
+                atr = float(atr or "nan")
+                ewma = float(ewma or "nan")
+                if math.isnan(atr) or math.isnan(ewma):
+                    writer.writerow(row + ["", ""])
+                else:
+                    writer.writerow(row + [ewma + 2 * atr, ewma - 2 * atr])
     return 0
 
 
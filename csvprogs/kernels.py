@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+
+"""
+Indicator kernels shared by mvavg, hull, ewma, atr and indicators
+
+Each moving average is a class holding the state of one series. Call
+update() with one value at a time (the streaming form) or batch() with a
+numpy array (the batch form). Both cost O(1) per value, can be mixed
+freely and return NaN where the indicator isn't yet defined.
+
+SMA, WMA and HMA are computed from windowed differences of cumulative sums,
+so the batch form is fully vectorized. EMA and Wilder smoothing are
+recurrences; their batch forms are tight loops which reproduce the
+original arithmetic exactly rather than pulling in scipy.signal (which
+takes about a second to import) or a numerically different closed form.
+"""
+
+import math
+from collections import deque
+
+import numpy
+from public import public
+
+NAN = float("nan")
+
+
+def _rolling(values, length, weighted):
+    """Windowed sums of values, NaN where the window holds any NaN.
+
+    If weighted is true the weights run length, length-1, ..., 1 from the
+    oldest value in the window to the newest, the convention mvavg -w and
+    hull have always used with common.weighted_ma.
+    """
+    if length == 1:
+        return values.copy()
+    result = numpy.full(len(values), NAN)
+    # Windowed differences of cumulative sums lose precision as the sums
+    # grow, so work in blocks which overlap by one window, on values
+    # centered about their mean.
+    block = max(256, 32 * length)
+    start = 0
+    while start + length <= len(values):
+        end = min(start + block, len(values))
+        chunk = values[start:end]
+        valid = ~numpy.isnan(chunk)
+        counts = numpy.concatenate(([0], numpy.cumsum(valid)))
+        ref = chunk[valid].mean() if valid.any() else 0.0
+        dev = numpy.where(valid, chunk - ref, 0.0)
+        sums = numpy.concatenate(([0.0], numpy.cumsum(dev)))
+        full = counts[length:] - counts[:-length] == length
+        window = sums[length:] - sums[:-length]
+        if weighted:
+            # weight of value i in the window ending at t is t + 1 - i
+            idx = numpy.arange(len(chunk), dtype=float)
+            isums = numpy.concatenate(([0.0], numpy.cumsum(idx * dev)))
+            ends = numpy.arange(length, len(chunk) + 1, dtype=float)
+            window = ends * window - (isums[length:] - isums[:-length])
+            window += ref * (length * (length + 1) / 2)
+        else:
+            window += ref * length
+        result[start + length - 1:end] = numpy.where(full, window, NAN)
+        start = end - length + 1
+    return result
+
+
+@public
+class SMA:
+    """Simple moving average of the last length values.
+
+    A NaN input restarts the average, so output is NaN until length more
+    values have been seen.
+    """
+
+    weighted = False
+
+    def __init__(self, length):
+        if length < 1:
+            raise ValueError("length must be at least 1")
+        self.length = length
+        self.window = deque(maxlen=length)
+        self.divisor = (length * (length + 1) / 2 if self.weighted
+                        else float(length))
+        self._reset_sums()
+
+    def _reset_sums(self):
+        "recompute the running sums from the window"
+        self.total = math.fsum(self.window)
+        # the newest value has weight 1, the one before it 2, etc.
+        self.wtotal = math.fsum((age + 1) * val
+                                for (age, val) in enumerate(reversed(self.window)))
+        self.turns = 0
+
+    def update(self, value):
+        "add one value, returning the current average"
+        window = self.window
+        if math.isnan(value):
+            window.clear()
+            self._reset_sums()
+            return NAN
+        if len(window) == self.length:
+            oldest = window[0]
+            # everything still in the window gets one step older
+            self.wtotal += self.total - oldest * (self.length + 1) + value
+            self.total += value - oldest
+        else:
+            self.wtotal += self.total + value
+            self.total += value
+        window.append(value)
+        self.turns += 1
+        if self.turns >= self.length:
+            # bound the rounding error in the running sums
+            self._reset_sums()
+        if len(window) < self.length:
+            return NAN
+        return (self.wtotal if self.weighted else self.total) / self.divisor
+
+    def batch(self, values):
+        "add an array of values, returning an array of averages"
+        values = numpy.asarray(values, dtype=float)
+        if not len(values):
+            return numpy.empty(0)
+        prefix = list(self.window)[-(self.length - 1):] if self.length > 1 else []
+        data = numpy.concatenate((prefix, values))
+        result = _rolling(data, self.length, self.weighted)[len(prefix):]
+        result /= self.divisor
+
+        # carry forward the values seen since the last NaN
+        nans = numpy.flatnonzero(numpy.isnan(values))
+        tail = values[nans[-1] + 1:] if len(nans) else data
+        self.window.clear()
+        self.window.extend(tail[-self.length:].tolist())
+        self._reset_sums()
+        return result
+
+
+@public
+class WMA(SMA):
+    """Weighted moving average of the last length values.
+
+    Weights run length, length-1, ..., 1 from the oldest value to the
+    newest, matching common.weighted_ma with descending coefficients as
+    used by mvavg -w and hull. A NaN input restarts the average.
+    """
+
+    weighted = True
+
+
+@public
+class HMA:
+    """Hull moving average: wma(2 * wma(x, n/2) - wma(x, n), sqrt(n)).
+
+    n/2 is truncated and sqrt(n) rounded. The inner averages only start once
+    length values have been seen.
+    """
+
+    def __init__(self, length):
+        self.length = length
+        self.full = WMA(length)
+        self.half = WMA(length // 2 or length)
+        self.hull = WMA(round(math.sqrt(length)))
+
+    def update(self, value):
+        "add one value, returning the current hull average"
+        diff = 2 * self.half.update(value) - self.full.update(value)
+        return self.hull.update(diff)
+
+    def batch(self, values):
+        "add an array of values, returning an array of hull averages"
+        values = numpy.asarray(values, dtype=float)
+        diff = 2 * self.half.batch(values) - self.full.batch(values)
+        return self.hull.batch(diff)
+
+
+@public
+class EMA:
+    """Exponentially weighted moving average.
+
+    Missing (NaN) values hold the previous average, until gap consecutive
+    values are missing, at which point the average is reset. The first
+    value after a reset starts the average afresh.
+    """
+
+    def __init__(self, alpha, gap=5):
+        self.alpha = alpha
+        self.gap = gap
+        self.value = NAN
+        self.missing = 0
+
+    def update(self, value):
+        "add one value, returning the current average"
+        if math.isnan(value):
+            self.missing += 1
+            if self.missing >= self.gap:
+                self.value = NAN
+        else:
+            self.missing = 0
+            if math.isnan(self.value):
+                self.value = value
+            else:
+                self.value = self.alpha * value + (1 - self.alpha) * self.value
+        return self.value
+
+    def batch(self, values):
+        "add an array of values, returning an array of averages"
+        alpha, gap = self.alpha, self.gap
+        val, missing = self.value, self.missing
+        result = []
+        append = result.append
+        isnan = math.isnan
+        for value in numpy.asarray(values, dtype=float).tolist():
+            if isnan(value):
+                missing += 1
+                if missing >= gap:
+                    val = NAN
+            else:
+                missing = 0
+                if isnan(val):
+                    val = value
+                else:
+                    val = alpha * value + (1 - alpha) * val
+            append(val)
+        self.value, self.missing = val, missing
+        return numpy.array(result, dtype=float)
+
+
+@public
+class Wilder:
+    """Wilder's smoothing, as used for the average true range.
+
+    The first length values are averaged, after which each new value is
+    folded in as (previous * (length - 1) + value) / length.
+    """
+
+    def __init__(self, length):
+        self.length = length
+        self.seed = []
+        self.value = None
+
+    def update(self, value):
+        "add one value, returning the current smoothed value"
+        if self.value is None:
+            self.seed.append(value)
+            if len(self.seed) < self.length:
+                return NAN
+            self.value = sum(self.seed) / self.length
+            self.seed = []
+        else:
+            self.value = (self.value * (self.length - 1) + value) / self.length
+        return self.value
+
+    def batch(self, values):
+        "add an array of values, returning an array of smoothed values"
+        values = numpy.asarray(values, dtype=float).tolist()
+        result = []
+        while values and self.value is None:
+            result.append(self.update(values.pop(0)))
+        length = self.length
+        val = self.value
+        for value in values:
+            val = (val * (length - 1) + value) / length
+            result.append(val)
+        self.value = val
+        return numpy.array(result, dtype=float)
+
+
+@public
+class TrueRange:
+    """True range of a bar: max(high - low, |high - prev close|, |low - prev close|).
+
+    The first bar has no previous close, so its true range is NaN.
+    """
+
+    def __init__(self):
+        self.close = NAN
+
+    def update(self, high, low, close):
+        "add one bar, returning its true range"
+        prev, self.close = self.close, close
+        if math.isnan(prev):
+            return NAN
+        return max(high - low, abs(low - prev), abs(high - prev))
+
+    def batch(self, high, low, close):
+        "add arrays of bars, returning their true ranges"
+        high = numpy.asarray(high, dtype=float)
+        low = numpy.asarray(low, dtype=float)
+        close = numpy.asarray(close, dtype=float)
+        if not len(close):
+            return numpy.empty(0)
+        prev = numpy.concatenate(([self.close], close[:-1]))
+        self.close = float(close[-1])
+        return numpy.maximum(high - low,
+                             numpy.maximum(abs(low - prev), abs(high - prev)))
+
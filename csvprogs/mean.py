@@ -48,13 +48,13 @@ SEE ALSO
 * sigavg
 """
 
-import csv
 import os
 import statistics
 import sys
 
 
-from csvprogs.common import CSVArgParser, openpair, usage
+from csvprogs.common import (CSVArgParser, CSVWriter, ColumnReader, openpair,
+                             usage)
 
 
 PROG = os.path.basename(sys.argv[0])
@@ -71,18 +71,18 @@ def main():
     options, args = parser.parse_known_args()
 
     with openpair(options, args) as (inf, outf):
-        reader = csv.DictReader(inf, delimiter=options.insep)
+        reader = ColumnReader(inf, delimiter=options.insep,
+                              numeric=[options.field])
         values = []
-        for row in reader:
-            if row[options.field]:
-                val = float(row[options.field])
-                if val < options.minval or val > options.maxval:
-                    continue
-                values.append(val)
+        for batch in reader:
+            vals = batch[options.field]
+            keep = (vals >= options.minval) & (vals <= options.maxval)
+            values.extend(vals[keep].tolist())
         median = statistics.median(values)
         mean = statistics.mean(values)
         pstd = statistics.pstdev(values, mu=mean)
-        writer = csv.writer(outf, delimiter=options.outsep)
+        writer = CSVWriter(outf, delimiter=options.outsep,
+                           float_format=options.float_format)
         writer.writerow([len(values), mean, median, pstd])
     return 0
 
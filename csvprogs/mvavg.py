@@ -52,11 +52,12 @@ SEE ALSO
 * mpl
 """
 
-import csv
 import os
 import sys
 
-from csvprogs.common import CSVArgParser, openpair, usage, weighted_ma
+from csvprogs.common import (CSVArgParser, CSVWriter, ColumnReader, openpair,
+                             usage)
+from csvprogs.kernels import SMA, WMA
 
 
 PROG = os.path.basename(sys.argv[0])
@@ -73,32 +74,19 @@ def main():
                         help="length of moving average window")
     options, args = parser.parse_known_args()
 
-
-    nan = float('nan')
-    elts = [None] * options.length
+    # a missing value restarts the moving average
+    kernel = (WMA if options.weighted else SMA)(options.length)
 
     with openpair(options, args) as (inf, outf):
-        rdr = csv.DictReader(inf, delimiter=options.insep)
-        wtr = csv.DictWriter(outf, delimiter=options.outsep,
-            fieldnames=rdr.fieldnames+[options.column])
+        rdr = ColumnReader(inf, delimiter=options.insep,
+                           numeric=[options.field])
+        wtr = CSVWriter(outf, delimiter=options.outsep,
+                        float_format=options.float_format)
         if not options.append:
-            wtr.writeheader()
-        coeffs = ([1] * options.length
-            if not options.weighted
-            else list(range(options.length, 0, -1)))
-        for row in rdr:
-            if row[options.field]:
-                elts.append(float(row[options.field]))
-                del elts[0]
-            else:
-                # restart mv avg calc
-                elts = [None] * options.length
-            if None not in elts:
-                val = weighted_ma(elts, coeffs)
-            else:
-                val = nan
-            row[options.column] = val
-            wtr.writerow(row)
+            wtr.writerow(rdr.fieldnames + [options.column])
+        for batch in rdr:
+            values = kernel.batch(batch[options.field]).tolist()
+            wtr.writerows(row + [val] for (row, val) in zip(batch.rows, values))
     return 0
 
 
@@ -49,7 +49,8 @@ import os
 import csv
 import statistics
 
-from csvprogs.common import CSVArgParser, usage, openpair
+from csvprogs.common import (CSVArgParser, CSVWriter, usage, openpair,
+                             rescannable)
 
 PROG = os.path.basename(sys.argv[0])
 
@@ -63,20 +64,29 @@ def main():
                         help="fields input to regression")
     options, args = parser.parse_known_args()
 
-    with openpair(options, args) as (inf, outf):
-        reader = csv.DictReader(inf, delimiter=options.insep)
-        writer = csv.DictWriter(outf, delimiter=options.outsep,
-            fieldnames=reader.fieldnames+[options.column])
+    field1, field2 = options.fields.split(",")
+
+    def convert(row):
+        "convert both fields to float if both are present"
+        if row[field1] and row[field2]:
+            row[field1] = float(row[field1])
+            row[field2] = float(row[field2])
+            return True
+        return False
+
+    with openpair(options, args, mapped=True) as (inf, outf):
+        # Two passes: one to fit, one to write.
+        lines = rescannable(inf)
+        reader = csv.DictReader(lines, delimiter=options.insep)
+        writer = CSVWriter(outf, delimiter=options.outsep,
+            fieldnames=reader.fieldnames+[options.column],
+            float_format=options.float_format)
 
         x = []
         y = []
 
-        field1, field2 = options.fields.split(",")
-        rows = list(reader)
-        for row in rows:
-            if row[field1] and row[field2]:
-                row[field1] = float(row[field1])
-                row[field2] = float(row[field2])
+        for row in reader:
+            if convert(row):
                 x.append(row[field1])
                 y.append(row[field2])
 
@@ -93,7 +103,8 @@ def main():
 
         if not options.append:
             writer.writeheader()
-        for row in rows:
+        for row in csv.DictReader(lines, delimiter=options.insep):
+            convert(row)
             if row[field1]:
                 val = slope * float(row[field1]) + intercept
                 row[options.column] = val
@@ -67,7 +67,10 @@ def main():
         _median = float(fields[2])
         std = float(fields[3])
 
-        print(mean / std * math.sqrt(options.days), file=outf)
+        ratio = mean / std * math.sqrt(options.days)
+        if options.float_format is not None:
+            ratio = options.float_format % ratio
+        print(ratio, file=outf)
 
 
 if __name__ == "__main__":
@@ -29,17 +29,21 @@ Note: The entire contents of the input must be read first, so it is not a good
 idea to use this filter with very large files.
 """
 
+import array
 from contextlib import suppress
 import os
 import random
 import sys
 
-from csvprogs.common import CSVArgParser, openio, usage
+from csvprogs.common import CSVArgParser, MappedFile, openio, usage
 
 PROG = os.path.basename(sys.argv[0])
 
+# lines written at a time from a mapped file
+CHUNK = 8192
+
 def main():
-    parser = CSVArgParser(usage=usage(__doc__, globals()))
+    parser = CSVArgParser(usage=usage(__doc__, globals()), float_format=False)
     options, args = parser.parse_known_args()
 
     if len(args) > 2:
@@ -49,10 +53,18 @@ def main():
 
     with openio(args[0] if len(args) >= 1 else sys.stdin, "r",
                 args[1] if len(args) == 2 else sys.stdout, "w",
-                encoding=options.encoding) as (inf, outf):
-        lines = list(inf)
-        random.shuffle(lines)
-        outf.writelines(lines)
+                encoding=options.encoding, mapped=True) as (inf, outf):
+        if isinstance(inf, MappedFile):
+            # shuffle line numbers rather than holding every line
+            offsets = inf.line_offsets()
+            order = array.array("q", range(len(offsets) - 1))
+            random.shuffle(order)
+            for i in range(0, len(order), CHUNK):
+                outf.write(inf.lines(offsets, order[i:i + CHUNK]))
+        else:
+            lines = list(inf)
+            random.shuffle(lines)
+            outf.writelines(lines)
     return 0
 
 
@@ -49,9 +49,8 @@ import sys
 import os
 import csv
 
-import dateutil.parser
-
-from csvprogs.common import CSVArgParser, openpair, usage
+from csvprogs.common import (CSVArgParser, CSVWriter, DateParser, openpair,
+                             usage)
 
 
 PROG = os.path.basename(sys.argv[0])
@@ -68,18 +67,20 @@ def main():
     options, args = parser.parse_known_args()
 
     times = {}
+    parse = DateParser()
 
     with openpair(options, args) as (inf, outf):
         reader = csv.DictReader(inf, delimiter=options.insep)
-        writer = csv.DictWriter(outf, delimiter=options.outsep,
-            fieldnames=["time", "mean", "sum", "n"])
+        writer = CSVWriter(outf, delimiter=options.outsep,
+            fieldnames=["time", "mean", "sum", "n"],
+            float_format=options.float_format)
         if not options.append:
             writer.writeheader()
         for row in reader:
             val = float(row[options.y])
             if val < options.minval or val > options.maxval:
                 continue
-            now = dateutil.parser.parse(row[options.x])
+            now = parse(row[options.x])
             nowfmt = now.strftime(options.format)
             total, n = times.get(nowfmt, (0.0, 0))
             total += val
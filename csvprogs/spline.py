@@ -30,8 +30,9 @@ DESCRIPTION
 Data are read from stdin or file, spline values are added to the end as a new
 column.
 
-Note that by default $(PROG)s uses dateutil.parser.parse to parse
-timestamps. This is robust, but quite slow for large datasets.
+Timestamps are parsed with common.DateParser, which learns the format
+from the first few values, so is much faster than dateutil.parser.parse
+on large datasets while remaining just as robust.
 
 
 SEE ALSO
@@ -51,11 +52,8 @@ import os
 import sys
 import time
 
-import numpy
-from scipy import interpolate
-import dateutil.parser
-
-from csvprogs.common import CSVArgParser, usage, openpair
+from csvprogs.common import (CSVArgParser, CSVWriter, DateParser, usage,
+                             openpair, rescannable)
 
 PROG = os.path.basename(sys.argv[0])
 
@@ -74,23 +72,30 @@ def main():
                         help="indicate independent variable is not time-based")
     (options, args) = parser.parse_known_args()
 
-    with openpair(options, args) as (inf, outf):
-        rdr = csv.DictReader(inf, delimiter=options.insep)
-        wtr = csv.DictWriter(outf, fieldnames=rdr.fieldnames+[options.column],
-            delimiter=options.outsep)
+    # Defer the slow scipy import until after --help has had its chance.
+    # pylint: disable=import-outside-toplevel
+    import numpy
+    from scipy import interpolate
+
+    with openpair(options, args, mapped=True) as (inf, outf):
+        # Two passes: one to fit, one to write.
+        lines = rescannable(inf)
+        rdr = csv.DictReader(lines, delimiter=options.insep)
+        wtr = CSVWriter(outf, fieldnames=rdr.fieldnames+[options.column],
+            delimiter=options.outsep, float_format=options.float_format)
         if not options.append:
             wtr.writeheader()
 
-        rows = list(rdr)
         x = []
         y = []
-        for row in rows:
+        parse = DateParser()
+        for row in rdr:
             x1 = row[options.x]
             y1 = row[options.field]
             if not x1 or not y1:
                 continue
             if options.istime:
-                x.append(to_timestamp(dateutil.parser.parse(x1)))
+                x.append(to_timestamp(parse(x1)))
             else:
                 x.append(float(x1))
             y.append(float(y1))
@@ -99,14 +104,16 @@ def main():
         y = numpy.array(y, dtype=float)
         tck, u = interpolate.splprep([x, y], s=options.smooth)
         ynew = interpolate.splev(u, tck)
-        for (y, row) in zip(ynew[1], rows):
-            row[options.column] = y
+        # as before, values are paired with rows from the top
+        values = iter(ynew[1])
+        for row in csv.DictReader(lines, delimiter=options.insep):
+            row[options.column] = next(values, "")
+            wtr.writerow(row)
         # maybe someday? but not yet (too much difference in outpus)
         # bspline = interpolate.make_splrep(x, y, s=options.smooth)
         # ynew = bspline(xx)
         # for (y, row) in zip(ynew, rows):
         #     row[options.column] = y
-        wtr.writerows(rows)
 
     return 0
 
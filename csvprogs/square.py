@@ -80,7 +80,7 @@ import csv
 import os
 import copy
 
-from csvprogs.common import CSVArgParser, openio
+from csvprogs.common import CSVArgParser, CSVWriter, openio
 
 PROG = os.path.basename(sys.argv[0])
 
@@ -94,8 +94,8 @@ def main():
                 args[1] if len(args) == 2 else sys.stdout, "w",
                 encoding=options.encoding) as (inf, outf):
         rdr = csv.DictReader(inf, delimiter=options.insep)
-        wtr = csv.DictWriter(outf, fieldnames=rdr.fieldnames,
-            delimiter=options.outsep)
+        wtr = CSVWriter(outf, fieldnames=rdr.fieldnames,
+            delimiter=options.outsep, float_format=options.float_format)
         wtr.writeheader()
         yvals = rdr.fieldnames[:]
         yvals.remove(options.x)
@@ -44,7 +44,7 @@ from csvprogs.common import CSVArgParser
 PROG = os.path.basename(sys.argv[0])
 
 def main():
-    parser = CSVArgParser()
+    parser = CSVArgParser(float_format=False)
     parser.add_argument("-n", type=int, default=10,
                         help="print every n'th line from the input")
     options = parser.parse_args()
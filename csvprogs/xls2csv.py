@@ -37,13 +37,10 @@ SEE ALSO
 
 import sys
 import tempfile
-import csv
 import os
 import datetime
 
-import xlrd
-
-from csvprogs.common import CSVArgParser, usage
+from csvprogs.common import CSVArgParser, CSVWriter, usage
 
 
 PROG = os.path.splitext(os.path.basename(sys.argv[0]))[0]
@@ -61,7 +58,7 @@ def main():
               file=sys.stderr)
         return 1
 
-    wrtr = csv.writer(sys.stdout)
+    wrtr = CSVWriter(sys.stdout, float_format=options.float_format)
 
     try:
         (fd, xlsf) = tempfile.mkstemp()
@@ -79,6 +76,8 @@ def main():
 
 
 def xls2csv(xlsf, sheet):
+    # pylint: disable=import-outside-toplevel
+    import xlrd
     book = xlrd.open_workbook(xlsf)
     worksheet = book.sheet_by_index(sheet)
 
@@ -90,6 +89,8 @@ def xls2csv(xlsf, sheet):
 
 
 def cell_value(cell, datemode):
+    # pylint: disable=import-outside-toplevel
+    import xlrd
     if cell.ctype == xlrd.XL_CELL_DATE:
         if cell.value != 0.0:
             t = xlrd.xldate_as_tuple(cell.value, datemode)
@@ -66,8 +66,7 @@ cvtdays () {
 CSV2CSV=csv2csv
 CSVPLOT=csvplot
 DSPLIT=dsplit
-EWMA=ewma
-MVAVG=mvavg
+INDICATORS=indicators
 
 # Differing (prime) numbers of colors and styles to increase visual
 # differences when plotting multiple lines.
@@ -79,7 +78,8 @@ WT="-f date,weight,l,red,'',dotted -f date,'weight (avg)',l,red,'Weight (l)'"
 tO2=O2
 tHR=HR
 tWT=Weight
-AVG="${MVAVG} -n 7"
+AVG="mvavg"
+AVGARGS="n=7"
 MISSING=2
 
 while getopts 'de:opwh' OPTION; do
@@ -89,12 +89,12 @@ while getopts 'de:opwh' OPTION; do
             CSV2CSV=${dbgpfx}/${CSV2CSV}.py
             CSVPLOT=${dbgpfx}/${CSVPLOT}.py
             DSPLIT=${dbgpfx}/${DSPLIT}.py
-            EWMA=${dbgpfx}/${EWMA}.py
-            MVAVG=${dbgpfx}/${MVAVG}.py
+            INDICATORS=${dbgpfx}/${INDICATORS}.py
             ;;
         e)
             MISSING=${OPTARG}
-            AVG="${EWMA} -m ${MISSING}"
+            AVG="ewma"
+            AVGARGS="gap=${MISSING}"
             ;;
         o)
             O2=
@@ -116,15 +116,6 @@ while getopts 'de:opwh' OPTION; do
 done
 shift "$(($OPTIND -1))"
 
-# Chicken-and-egg situation dictates a last-minute patch-up. If -d was
-# given but -e wasn't, ${AVG} won't reference the uninstalled version
-# of mvavg.
-if [ "x{dbgpfx}" != "x" ] ; then
-    if [ "x${AVG}" = "xmvavg -n 7" ] ; then
-        AVG="${MVAVG} -n 7"
-    fi
-fi
-
 if [ "x${O2}${WT}${HR}" = "x" ] ; then
     echo
     usage 1>&2
@@ -159,9 +150,9 @@ printf "$y "
 done) )
 
 cat > ${scr} <<EOF
-${AVG} -f weight --outcol 'weight (avg)' < ${csv} \
-    | ${AVG} -f O2 --outcol 'O2 (avg)' \
-    | ${AVG} -f hr --outcol 'HR (avg)' \
+${INDICATORS} -I "${AVG}:weight:${AVGARGS}:out=weight (avg)" \
+    -I "${AVG}:O2:${AVGARGS}:out=O2 (avg)" \
+    -I "${AVG}:hr:${AVGARGS}:out=HR (avg)" < ${csv} \
     | ${CSVPLOT} -T "${title}" \
            ${WT} ${O2} ${HR} \
            -Y 165:200,40:100 \
@@ -169,9 +160,9 @@ ${AVG} -f weight --outcol 'weight (avg)' < ${csv} \
            &
 EOF
 
-# EWMA for each of the years to be plotted...
-MA="$(for ((i=0; i<${#years[@]}; i++)); do
-    printf " | ${EWMA} -m ${MISSING} -f ${years[i]} --outcol e${years[i]}"
+# EWMA for each of the years to be plotted, all in one pass...
+MA="| ${INDICATORS}$(for ((i=0; i<${#years[@]}; i++)); do
+    printf " -I ewma:${years[i]}:gap=${MISSING}:out=e${years[i]}"
 done)"
 
 # Plot one line for each year, varying colors and line styles...
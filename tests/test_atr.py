@@ -13,3 +13,13 @@ def test_atr():
         "-c", "High,Low,Close", SPY_CSV],
         stdout=subprocess.PIPE, stderr=None)
     assert result.stdout == expected
+
+def test_atr_missing():
+    # an empty price would turn every later ATR into NaN
+    result = subprocess.run(["./venv/bin/python", "-m", "csvprogs.atr",
+        "-n", "1"], input=b"Date,High,Low,Close\n2024-01-02,,,10\n"
+        b"2024-01-03,11,9,10\n2024-01-04,,9,10\n",
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    assert result.returncode == 1
+    assert b"missing High,Low,Close value" in result.stderr
+    assert b"2024-01-04" in result.stderr
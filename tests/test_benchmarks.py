@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+
+"benchmarks tests"
+
+import csv
+import io
+
+from benchmarks import compare, generate, run
+
+
+def test_generate_deterministic():
+    for kind in generate.KINDS:
+        outputs = []
+        for _ in range(2):
+            outf = io.StringIO()
+            generate.write(kind, 500, outf)
+            outputs.append(outf.getvalue())
+        assert outputs[0] == outputs[1]
+        rows = list(csv.reader(io.StringIO(outputs[0])))
+        assert len(rows) == 501
+
+def test_daily_blocks():
+    rows = list(generate.daily(generate.BLOCK_DAYS + 1))
+    assert rows[1][1] == "S0000" and rows[-1][1] == "S0001"
+    assert rows[-1][0] == generate.DAILY_START.isoformat()
+
+def test_every_entry_point_covered():
+    for name in run.entry_points(run.TOP):
+        assert name in run.CASES or name in run.SKIP
+
+def test_compare_regressions():
+    def results(rate, rss, startup):
+        return {"revision": "x", "rows": 10, "results": {
+            "a": {"rows_per_sec": rate, "peak_rss": rss, "startup": startup},
+            "b": {"rows_per_sec": 10.0, "peak_rss": 1, "startup": 0.1},
+        }}
+    base = results(100.0, 1000, 0.1)
+    assert not list(compare.regressions(base, results(95.0, 1050, 0.105)))
+    found = list(compare.regressions(base, results(50.0, 2000, 0.2)))
+    assert [name for (name, _) in found] == ["a", "a", "a"]
+    broken = results(100.0, 1000, 0.1)
+    broken["results"]["b"] = {"failed": "exit status 1"}
+    assert list(compare.regressions(base, broken)) == [("b", "exit status 1")]
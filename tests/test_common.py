@@ -2,15 +2,28 @@
 
 "usage..."
 
+import bz2
 import csv
 import datetime
+import gzip
+import io
+import math
 import os
+import pstats
 import subprocess
 import sys
 import tempfile
 
-from csvprogs.common import usage, openi, as_days, ListyDict
-from tests import RANDOM_CSV
+import dateutil.parser
+import pytest
+
+from csvprogs.common import (CSVArgParser, usage, openi, as_days, ListyDict, DateParser,
+                             type_convert, typed_rows, column_converters,
+                             ColumnReader, CSVWriter, MappedFile, openio,
+                             rescannable, parse_size, ExternalSort,
+                             expand_inputs, openinputs, KeySet, record_chunks,
+                             chunk_text, chunk_sample, parallel_map, ListyRow)
+from tests import RANDOM_CSV, NVDA, VRTX_DAILY, BAD_DATE_1, WEIGHT_CSV
 
 INPUT = b"""\
 time,close,position\r
@@ -64,6 +77,131 @@ def test_openio_files():
         os.unlink(inf)
         os.unlink(outf)
 
+def test_mapped_file():
+    (fd, inf) = tempfile.mkstemp()
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(INPUT + b'x,"two\nlines"\nlast')
+        with open(inf, encoding="utf-8") as fp:
+            expected = list(fp)
+        with open(inf, "rb") as fp, MappedFile(fp) as mapped:
+            # every iteration starts from the top
+            assert list(mapped) == expected
+            assert list(csv.reader(mapped)) == list(csv.reader(expected))
+            offsets = mapped.line_offsets()
+            assert len(offsets) == len(expected) + 1
+            assert offsets[-1] == os.path.getsize(inf)
+            assert mapped.lines(offsets, [2, 0]) == expected[2] + expected[0]
+            # offsets inside a quoted field move past the record's end
+            data = mapped.raw(0, mapped.size)
+            two = data.index(b"two")
+            lines = data.index(b"lines")
+            assert mapped.record_starts([1, two, lines]) == [
+                data.index(b"\n") + 1, data.index(b"last"),
+                data.index(b"last")]
+    finally:
+        os.unlink(inf)
+
+def test_record_chunks():
+    data = b"a,b\r\n" + b"".join(b'%d,"x\r\ny"\r\n' % i if i % 7 == 0
+                                    else b"%d,x\r\n" % i for i in range(200))
+    expected = list(csv.reader(io.StringIO(data.decode(), newline="")))[1:]
+    (fd, inf) = tempfile.mkstemp()
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(data)
+        with open(inf, "rb") as fp, MappedFile(fp) as mapped:
+            mapped_chunks = list(record_chunks(mapped, 50))
+        with open(inf, encoding="utf-8") as fp:
+            next(csv.reader(fp))
+            text_chunks = list(record_chunks(fp, 50))
+    finally:
+        os.unlink(inf)
+
+    for chunks in (mapped_chunks, text_chunks):
+        assert len(chunks) > 10
+        # every piece holds whole records
+        rows = [row for chunk in chunks
+                    for row in csv.reader(io.StringIO(chunk_text(chunk)))]
+        assert rows == [[n, b.replace("\r\n", "\n")] for (n, b) in expected]
+        (sample, again) = chunk_sample(chunks, csv.reader, 30)
+        assert sample == rows[:30]
+        assert list(again) == chunks
+        assert list(parallel_map(chunk_text, chunks, 2)) == [
+            chunk_text(chunk) for chunk in chunks]
+
+def test_openio_mapped():
+    (fd, inf) = tempfile.mkstemp()
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(INPUT)
+        with openio(inf, "r", os.devnull, "w", mapped=True) as (fp, _):
+            assert isinstance(fp, MappedFile)
+            assert rescannable(fp) is fp
+        with openio(inf, "r", os.devnull, "w") as (fp, _):
+            assert not isinstance(fp, MappedFile)
+            assert rescannable(fp) == (INPUT.decode().replace("\r", "")
+                                       .splitlines(True))
+        with openio(inf, "r", os.devnull, "w", mapped=True,
+                    encoding="utf-16") as (fp, _):
+            # not ASCII-compatible, so read as usual
+            assert not isinstance(fp, MappedFile)
+    finally:
+        os.unlink(inf)
+
+def test_parse_size():
+    assert parse_size("100") == 100
+    assert parse_size("2k") == 2048
+    assert parse_size("1.5M") == 3 * 2**19
+    assert parse_size("2GiB") == 2 * 2**30
+    for bad in ("", "2X", "G"):
+        try:
+            parse_size(bad)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"{bad!r} accepted")
+
+def test_external_sort():
+    rows = [[str(i % 7), str(i)] for i in range(1000)]
+    expected = sorted(rows, key=lambda row: row[0])
+    for (memory, max_merge) in ((10**9, 128), (4096, 128), (4096, 3)):
+        sorter = ExternalSort(lambda row: row[0], memory)
+        sorter.MAX_MERGE = max_merge
+        assert list(sorter.sort(row[:] for row in rows)) == expected
+        assert (sorter.runs > 1) == (memory < 10**9)
+        assert (sorter.spilled > 0) == (memory < 10**9)
+
+def test_openinputs():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        names = [os.path.join(tmpdir, name)
+                    for name in ("b.csv", "a.csv.gz", "c.csv.bz2")]
+        for name in names:
+            with open_compressed(name) as outf:
+                outf.write(name.encode("utf-8"))
+        missing = os.path.join(tmpdir, "*.xz")
+        assert expand_inputs([os.path.join(tmpdir, "*.csv*"), "-", missing]) == (
+            sorted(names) + ["-", missing])
+        with openinputs([os.path.join(tmpdir, "*")]) as files:
+            assert [fp.read() for fp in files] == sorted(names)
+
+def open_compressed(name):
+    "open name for writing, compressed according to its extension"
+    opener = {".gz": gzip.open, ".bz2": bz2.open}.get(os.path.splitext(name)[1],
+                                                     open)
+    return opener(name, "wb")
+
+def test_key_set():
+    keys = KeySet()
+    values = [str(i) for i in range(5000)]
+    assert not any(keys.add(value) for value in values)
+    assert all(keys.add(value) for value in values)
+    assert len(keys) == 5000 and "5000" not in keys and "42" in keys
+    # three quarters full at most, at 8 bytes a slot
+    assert keys.nbytes <= 8 * 4 / 3 * 2 * len(keys)
+    # 0 marks empty slots, and hash(-1) == hash(-2)
+    assert not keys.add(0) and 0 in keys and not keys.add(-1) and keys.add(-2)
+
 def test_usage():
     usage_msg = usage(__doc__, globals(), msg="msg")
     assert "usage..." in usage_msg and "msg" in usage_msg
@@ -99,3 +237,177 @@ def test_listy_dict():
             assert ld[0] == 2
             del ld["i"]
             assert "i" not in ld and 0 not in ld
+
+def test_listy_dict_lazy():
+    calls = []
+    def convert(value):
+        calls.append(value)
+        return float(value)
+    data = {"a": "1.50", "b": "x", "c": "2"}
+    ld = ListyDict(data, enumerate(data), {"a": convert, "b": str},
+                   default=int)
+    assert ld[-3] == ld["a"] == 1.5 and calls == ["1.50"]
+    assert ld[1] == "x" and ld[-1] == 2
+    assert ld.get("d", 3) == 3 and ld.items() == [("a", 1.5), ("b", "x"),
+                                                  ("c", 2)]
+    # only the fields which were changed are written back
+    ld[-1] = 4
+    assert ld["c"] == 4
+    assert data == {"a": "1.50", "b": "x", "c": 4}
+    del ld[0]
+    assert data == {"b": "x", "c": 4}
+    assert calls == ["1.50"]
+
+def test_listy_row():
+    row = ["1.50", "x", "2"]
+    lr = ListyRow(row, {"a": 0, "b": 1, "c": 2}, {0: float, 1: str},
+                  default=int)
+    assert str(lr) == "<ListyRow {'a': '1.50', 'b': 'x', 'c': '2'}>"
+    assert lr.keys() == ["a", "b", "c"] and len(lr) == 3
+    assert "b" in lr and "d" not in lr
+    assert lr["a"] == lr[-3] == 1.5 and lr[1] == "x" and lr["c"] == 2
+    assert lr.get("d") is None and lr.get(3) is None
+    # assignments go to a copy of the row
+    lr["c"] = 4
+    assert lr[-1] == 4 and lr.values() == [1.5, "x", 4]
+    assert row == ["1.50", "x", "2"]
+    with pytest.raises(TypeError):
+        del lr["a"]
+
+def test_date_parser_iso():
+    parse = DateParser(sample=3)
+    values = [f"2025-01-17 08:30:{s:02d}.{s * 1000:06d}" for s in range(60)]
+    for val in values:
+        assert parse(val) == dateutil.parser.parse(val)
+    assert parse.format is None
+
+def test_date_parser_strptime():
+    parse = DateParser(sample=3)
+    values = [f"11/{d}/2013 14:{d:02d}" for d in range(1, 30)]
+    for val in values:
+        assert parse(val) == dateutil.parser.parse(val)
+    assert parse.format == "%m/%d/%Y %H:%M"
+
+def test_date_parser_fallback():
+    parse = DateParser(sample=2)
+    for val in ("2015-04-15T12:00", "2015-04-16T12:00", "Apr 17, 2015 12:00",
+                "2015-04-18T12:00Z"):
+        assert parse(val) == dateutil.parser.parse(val)
+    try:
+        parse("2015-02-29T12:00")
+    except dateutil.parser.ParserError:
+        pass
+    else:
+        assert False, "Feb 29th parsed in non-leap year"
+
+def test_column_converters():
+    rows = [
+        {"i": "1", "f": "1.5", "d": "2025-01-17", "s": "abc", "e": ""},
+        {"i": "2", "f": "2", "d": "2025-01-18", "s": "def", "e": ""},
+    ]
+    cvts = column_converters(rows)
+    assert cvts["i"]("3") == 3
+    assert cvts["f"]("3") == 3 and isinstance(cvts["f"]("3"), int)
+    assert cvts["f"]("3.25") == 3.25
+    assert cvts["d"]("2025-01-19") == datetime.datetime(2025, 1, 19)
+    assert cvts["s"]("ghi") == "ghi"
+    # cells which don't fit the column type are still converted
+    assert cvts["i"]("x") == "x"
+    assert cvts["s"]("17") == 17
+    assert cvts["d"]("17.5") == 17.5
+    assert cvts["e"]("1e3") == 1000.0
+
+def test_typed_rows_matches_type_convert():
+    for fname in (NVDA, VRTX_DAILY, BAD_DATE_1):
+        with open(fname, encoding="utf-8") as fp:
+            rows = list(csv.reader(fp))[1:]
+        expected = [[type_convert(cell) for cell in row] for row in rows]
+        actual = list(typed_rows([row[:] for row in rows], sample=10))
+        assert len(actual) == len(expected)
+        for (exp_row, act_row) in zip(expected, actual):
+            for (exp, act) in zip(exp_row, act_row):
+                assert type(exp) is type(act), (exp, act)
+                assert exp == act or exp != exp, (exp, act)
+
+def test_column_reader():
+    inf = io.StringIO("date,weight,hr\n"
+                      "2024-09-07,179.8,50\n"
+                      "2024-09-08,\n"
+                      "2024-09-09,181.4,51\n")
+    reader = ColumnReader(inf, numeric=["weight"], batch_size=2)
+    assert reader.fieldnames == ["date", "weight", "hr"]
+    batches = list(reader)
+    assert [len(batch.rows) for batch in batches] == [2, 1]
+    first = batches[0]
+    assert list(first) == reader.fieldnames and "hr" in first
+    assert first["date"] == ["2024-09-07", "2024-09-08"]
+    assert first["weight"][0] == 179.8 and math.isnan(first["weight"][1])
+    # short rows are padded, as DictReader would
+    assert first.rows[1] == ["2024-09-08", "", ""]
+    assert first["hr"] == ["50", ""]
+    assert batches[1]["weight"].tolist() == [181.4]
+
+def test_csv_writer():
+    outf = io.StringIO()
+    wtr = CSVWriter(outf, fieldnames=["a", "b", "c"], lineterminator="\n")
+    wtr.writeheader()
+    wtr.writerow({"a": 1, "b": 2.5, "c": "x"})
+    # missing keys are written empty
+    wtr.writerows([{"a": 3}, ["4", 5.0, ""]])
+    assert outf.getvalue() == "a,b,c\n1,2.5,x\n3,,\n4,5.0,\n"
+
+def test_csv_writer_extras():
+    outf = io.StringIO()
+    wtr = CSVWriter(outf, fieldnames=["a", "b"], lineterminator="\n")
+    # like csv.DictWriter, extra keys are an error...
+    with pytest.raises(ValueError, match="'extra'"):
+        wtr.writerow({"a": 1, "b": 2, "extra": 3})
+    with pytest.raises(ValueError, match="'extra'"):
+        wtr.writerow({"a": 1, "extra": 3})
+    # ... unless they are ignored
+    wtr = CSVWriter(outf, fieldnames=["a", "b"], extrasaction="ignore",
+                    lineterminator="\n")
+    wtr.writerow({"a": 1, "extra": 3})
+    assert outf.getvalue() == "1,\n"
+    with pytest.raises(ValueError):
+        CSVWriter(outf, fieldnames=["a"], extrasaction="skip")
+    # dict rows need fieldnames
+    with pytest.raises(ValueError, match="fieldnames"):
+        CSVWriter(outf).writerow({"a": 1})
+
+def test_csv_writer_float_format():
+    outf = io.StringIO()
+    wtr = CSVWriter(outf, fieldnames=["x"], float_format="%.3g",
+                    lineterminator="\n")
+    wtr.writerows([{"x": math.pi}, {"x": float("nan")}, {"x": 7},
+                   {"x": "1.23456"}])
+    assert outf.getvalue() == "3.14\nnan\n7\n1.23456\n"
+
+def test_float_format_option():
+    options = CSVArgParser().parse_args(["--float-format", "%.2f"])
+    assert options.float_format == "%.2f"
+    with pytest.raises(SystemExit):
+        CSVArgParser().parse_args(["--float-format", "%s %s"])
+    # tools which don't write numbers leave it out
+    (options, rest) = CSVArgParser(float_format=False).parse_known_args(
+        ["--float-format", "%.2f"])
+    assert not hasattr(options, "float_format")
+    assert rest == ["--float-format", "%.2f"]
+
+def test_stats_and_profile():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        profile = os.path.join(tmpdir, "mvavg.prof")
+        result = subprocess.run(["./venv/bin/python", "-m", "csvprogs.mvavg",
+                                 "-f", "weight", "--stats", "--profile", profile,
+                                 WEIGHT_CSV], check=True,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        report = result.stderr.decode("utf-8")
+        with open(WEIGHT_CSV, encoding="utf-8") as inf:
+            nlines = len(inf.readlines())
+        assert report.startswith("mvavg: ")
+        assert f"lines in {nlines} " in report
+        assert f"out {nlines} ({len(result.stdout)} bytes)" in report
+        for phase in ("parse", "convert", "compute", "write", "peak RSS"):
+            assert phase in report
+        # readable by pstats
+        assert pstats.Stats(profile).total_calls > 0
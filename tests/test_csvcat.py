@@ -1,7 +1,10 @@
 import csv
 import io
+import os
 import subprocess
+import tempfile
 
+from csvprogs.csvcat import hashed_distinct
 from tests import IWY_CSVS
 
 
@@ -21,3 +24,51 @@ def test_cli():
     new_dates = [row["Date"] for row in rdr]
 
     assert len(old_dates) > len(new_dates) and len(new_dates) == len(set(new_dates))
+
+def test_cli_modes():
+    # presorted merging and spilling give the same output as the default
+    cmd = ["./venv/bin/python", "-m", "csvprogs.csvcat", "-k", "Date"]
+    expected = subprocess.run(cmd + IWY_CSVS, check=True,
+                              stdout=subprocess.PIPE).stdout
+    for args in (["--presorted"], ["-m", "20k"], ["-m", "20k", "--no-verify"]):
+        result = subprocess.run(cmd + args + IWY_CSVS, check=True,
+                                stdout=subprocess.PIPE)
+        assert result.stdout == expected
+
+def test_cli_union():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        (first, second) = (os.path.join(tmpdir, "a.csv"),
+                           os.path.join(tmpdir, "b.csv"))
+        with open(first, "w", encoding="utf-8") as outf:
+            outf.write("Date,Close\n2025-01-02,2\n2025-01-03,3\n")
+        with open(second, "w", encoding="utf-8") as outf:
+            outf.write("Volume,Date\n100,2025-01-01\n300,2025-01-03\n")
+        for args in ([], ["--presorted"]):
+            result = subprocess.run(["./venv/bin/python", "-m",
+                                     "csvprogs.csvcat", "-k", "Date"] + args +
+                                    [first, second], check=True,
+                                    stdout=subprocess.PIPE)
+            assert result.stdout.decode("utf-8").splitlines() == [
+                "Date,Close,Volume",
+                "2025-01-01,,100",
+                "2025-01-02,2,",
+                "2025-01-03,3,",
+            ]
+        # presorted inputs are checked
+        with open(first, "w", encoding="utf-8") as outf:
+            outf.write("Date,Close\n2025-01-03,3\n2025-01-02,2\n")
+        result = subprocess.run(["./venv/bin/python", "-m", "csvprogs.csvcat",
+                                 "-k", "Date", "--presorted", first, second],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        assert result.returncode == 1
+        assert (f"{first}, line 3: not sorted on Date at '2025-01-02'"
+                .encode("utf-8") in result.stderr)
+
+def test_hashed_distinct():
+    # hash(-1) == hash(-2), so only verification keeps both keys
+    rows = [["-1", "a"], ["-2", "b"], ["-1", "c"], ["-2", "d"]]
+    key = lambda row: int(row[0])
+    assert list(hashed_distinct(iter(rows), key, [])) == [
+        ["-2", "b"], ["-2", "d"], ["-1", "a"], ["-1", "c"]]
+    assert list(hashed_distinct(iter(rows), key, [], verify=False)) == [
+        ["-1", "a"]]
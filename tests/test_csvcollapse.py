@@ -33,3 +33,53 @@ def test_cli():
     assert result.returncode == 0
     out_count = len(result.stdout.decode("utf-8").strip().split("\r\n")) - 1
     assert in_count // 2 == out_count, (in_count, out_count)
+
+def test_cli_aggregate():
+    data = ("time,symbol,price,size\n"
+            "09:30,ES,10.5,2\n"
+            "09:30,ES,,1\n"
+            "09:30,ES,9.75,4\n"
+            "09:31,ES,11,\n"
+            "09:31,NQ,20,1\n")
+    result = subprocess.run(["./venv/bin/python", "-m", "csvprogs.csvcollapse",
+        "-k", "time,symbol", "-A", "price:first:open,price:max:high",
+        "-A", "price:min:low,size:sum,size:count:n"],
+        stdout=subprocess.PIPE, stderr=None, input=data.encode("utf-8"))
+    assert result.returncode == 0
+    assert result.stdout.decode("utf-8").splitlines() == [
+        "time,symbol,price,size,open,high,low,n",
+        "09:30,ES,9.75,7,10.5,10.5,9.75,3",
+        "09:31,ES,11,,11,11,11,0",
+        "09:31,NQ,20,1,20,20,20,1",
+    ]
+
+def test_cli_bad_aggregate():
+    for spec in ("price:median", "cost:sum", "price:max:size"):
+        result = subprocess.run(["./venv/bin/python", "-m",
+            "csvprogs.csvcollapse", "-k", "time", "-A", spec],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            input=b"time,price,size\n09:30,1,2\n")
+        assert result.returncode == 1
+
+def test_cli_unsorted():
+    # keys recur far apart; a tiny budget forces nested spills
+    lines = ["key,value"] + [f"k{i * 7919 % 1000},{i}" for i in range(5000)]
+    data = "\n".join(lines).encode("utf-8")
+    cmd = ["./venv/bin/python", "-m", "csvprogs.csvcollapse", "-k", "key",
+           "-A", "value:first,value:sum:total,value:count:n"]
+    first = {}
+    for line in lines[1:]:
+        (key, value) = line.split(",")
+        first.setdefault(key, []).append(int(value))
+    expected = ["key,value,total,n"] + [
+        f"{key},{values[0]},{sum(values)},{len(values)}"
+            for (key, values) in first.items()]
+    for memory in ("1G", "8k"):
+        result = subprocess.run(cmd + ["--unsorted", "-m", memory], input=data,
+                                stdout=subprocess.PIPE, check=True)
+        assert result.stdout.decode("utf-8").splitlines() == expected
+        result = subprocess.run(cmd + ["--unsorted", "--order", "key", "-m",
+                                       memory], input=data,
+                                stdout=subprocess.PIPE, check=True)
+        assert result.stdout.decode("utf-8").splitlines() == (
+            expected[:1] + sorted(expected[1:]))
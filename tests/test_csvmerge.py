@@ -1,8 +1,15 @@
 #!/usr/bin/env python
 
+import csv
+import datetime
+import gzip
+import io
+import os
 import subprocess
+import tempfile
 
-from tests import FIRST, SECOND, MERGED, SECOND_SHORT, MERGED_SHORT, EMPTY, MERGED_SECS
+from csvprogs.csvmerge import compile_format
+from tests import IWY_CSVS, FIRST, SECOND, MERGED, SECOND_SHORT, MERGED_SHORT, EMPTY, MERGED_SECS
 
 def test_bad_cli():
     result = subprocess.run(["./venv/bin/python", "-m", "csvprogs.csvmerge",
@@ -39,3 +46,50 @@ def test_merge_date_format():
     assert result.returncode == 0
     with open(MERGED_SECS, "rb") as merged:
         assert result.stdout == merged.read()
+
+def test_merge_many():
+    # plain string keys, and the same input given more than once
+    inputs = sorted(IWY_CSVS) * 3
+    result = subprocess.run(["./venv/bin/python", "-m", "csvprogs.csvmerge",
+        "-k", "Date"] + inputs, stdout=subprocess.PIPE, stderr=None)
+    assert result.returncode == 0
+    rows = list(csv.DictReader(io.StringIO(result.stdout.decode("utf-8"))))
+    expected = []
+    for fname in inputs:
+        with open(fname, encoding="utf-8") as fp:
+            expected.extend(csv.DictReader(fp))
+    assert len(rows) == len(expected)
+    assert [row["Date"] for row in rows] == sorted(row["Date"]
+                                                   for row in expected)
+
+def test_compile_format():
+    parse = compile_format("%Y-%m-%dT%H:%M")
+    assert parse("2015-04-15T15:00") == datetime.datetime(2015, 4, 15, 15, 0)
+    # only text strftime would reproduce is accepted
+    assert parse("2015-4-15T15:00") is None
+    assert parse("2015-04-15 15:00") is None
+    assert parse("2015-02-30T15:00") is None
+    assert compile_format("%d/%m/%Y %%")("05/04/2015 %") == datetime.datetime(
+        2015, 4, 5)
+    assert compile_format("%d %b %Y") is None
+    assert compile_format("%H:%M") is None
+    assert compile_format(None) is None
+
+def test_merge_inputs():
+    # stdin, glob patterns, compressed files, separators and an output file
+    with open(FIRST, "rb") as inf:
+        first = inf.read().replace(b",", b";")
+    with open(SECOND, "rb") as inf:
+        second = inf.read().replace(b",", b";")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with gzip.open(os.path.join(tmpdir, "first.csv.gz"), "wb") as outf:
+            outf.write(first)
+        outfile = os.path.join(tmpdir, "out.csv")
+        result = subprocess.run(["./venv/bin/python", "-m", "csvprogs.csvmerge",
+            "-k", "time", "-d", "time", "-i", ";", "-O", outfile,
+            os.path.join(tmpdir, "f*.gz"), "-"], input=second,
+            stdout=subprocess.PIPE, stderr=None)
+        assert result.returncode == 0
+        assert result.stdout == b""
+        with open(outfile, "rb") as outf, open(MERGED, "rb") as merged:
+            assert outf.read() == merged.read()
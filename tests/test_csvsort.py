@@ -1,9 +1,19 @@
 import csv
 import io
+import os
+import re
 import subprocess
+import sys
+import tempfile
 
+import pytest
+
+from csvprogs import csvsort
 from csvprogs.common import type_convert
-from tests import RANDOM_CSV
+from csvprogs.csvsort import parse_key
+from tests import RANDOM_CSV, SPY_DAILY
+
+SORT_CHUNK = csvsort.sort_chunk
 
 
 def test_cli():
@@ -17,3 +27,101 @@ def test_cli():
     for row in rdr:
         values.append(row["random"])
     assert values == sorted(values)
+
+def test_cli_spill():
+    cmd = ["./venv/bin/python", "-m", "csvprogs.csvsort", "-k", "Close-SPY",
+           SPY_DAILY]
+    in_memory = subprocess.run(cmd, check=True, stdout=subprocess.PIPE)
+    spilled = subprocess.run(cmd + ["-m", "64k", "-v"], check=True,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    assert spilled.stdout == in_memory.stdout
+    (runs, spill) = re.search(r"(\d+) runs, (\d+) bytes spilled",
+                              spilled.stderr.decode("utf-8")).groups()
+    assert int(runs) > 1 and int(spill) > 0
+
+def test_cli_jobs():
+    # parallel chunks merge back to the serial order, pipes sort serially
+    cmd = ["./venv/bin/python", "-m", "csvprogs.csvsort", "-k",
+           "% Change-SPY:float:desc,Date:datetime"]
+    serial = subprocess.run(cmd + [SPY_DAILY], check=True,
+                            stdout=subprocess.PIPE)
+    for args in (["-j", "2"], ["-j", "3", "-m", "64k", "-v"]):
+        result = subprocess.run(cmd + args + [SPY_DAILY], check=True,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        assert result.stdout == serial.stdout
+    assert int(re.search(r"(\d+) runs",
+                         result.stderr.decode("utf-8")).group(1)) > 3
+    with open(SPY_DAILY, "rb") as inf:
+        piped = subprocess.run(cmd + ["-j", "2"], check=True, input=inf.read(),
+                               stdout=subprocess.PIPE)
+    assert piped.stdout == serial.stdout
+
+def failing_sort_chunk(data, *args):
+    "sort_chunk, failing for the chunk holding 2010's first rows"
+    if b"2010-01-0" in data:
+        raise ValueError("failing chunk")
+    return SORT_CHUNK(data, *args)
+
+def test_jobs_failure(monkeypatch, tmp_path):
+    # a failing worker leaves no temporary files behind
+    monkeypatch.setattr(csvsort, "sort_chunk", failing_sort_chunk)
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    out = str(tmp_path / "out.csv")
+    monkeypatch.setattr(sys, "argv", ["csvsort", "-k", "Date", "-j", "2",
+                                      "-m", "64k", SPY_DAILY, out])
+    with pytest.raises(ValueError, match="failing chunk"):
+        csvsort.main()
+    assert os.listdir(tmp_path) == ["out.csv"]
+
+def test_cli_stable():
+    # rows with equal keys keep their input order, spilled or not
+    with open(SPY_DAILY, encoding="utf-8") as inf:
+        expected = sorted(csv.DictReader(inf),
+                          key=lambda row: row["% Change-SPY"])
+    for memory in ("1G", "64k"):
+        result = subprocess.run(["./venv/bin/python", "-m", "csvprogs.csvsort",
+                                 "-k", "% Change-SPY", "-m", memory, SPY_DAILY],
+                                check=True, stdout=subprocess.PIPE)
+        rows = list(csv.DictReader(io.StringIO(result.stdout.decode("utf-8"))))
+        assert rows == expected
+
+def test_bad_key():
+    result = subprocess.run(["./venv/bin/python", "-m", "csvprogs.csvsort",
+                             "-k", "nope", RANDOM_CSV],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    assert result.returncode == 1
+    assert b"nope" in result.stderr
+
+TYPED_INPUT = b"""\
+name,price,time
+a,10,01/02/2025 10:00
+b,9.5,12/31/2024 09:00
+c,,01/02/2025 09:00
+d,10,01/01/2025 10:00
+e,100,01/02/2025 10:00
+"""
+
+def sort_names(*args):
+    "names in the order csvsort puts them, given args"
+    result = subprocess.run(["./venv/bin/python", "-m", "csvprogs.csvsort"]
+                            + list(args), input=TYPED_INPUT, check=True,
+                            stdout=subprocess.PIPE)
+    rows = csv.DictReader(io.StringIO(result.stdout.decode("utf-8")))
+    return "".join(row["name"] for row in rows)
+
+def test_cli_typed():
+    # lexical order first, for comparison
+    assert sort_names("-k", "price") == "cadeb"
+    assert sort_names("-k", "price:float") == "cbade"
+    # missing values go last when descending, ties stay in input order
+    assert sort_names("-k", "price:float:desc") == "eadbc"
+    assert sort_names("-k", "time:datetime") == "bdcae"
+    assert sort_names("-k", "price:float:desc,time:datetime") == "edabc"
+    assert sort_names("-k", "time:datetime:desc,name:desc") == "eacdb"
+    assert sort_names("-k", "price:float,time:datetime", "-m", "1") == "cbdae"
+
+def test_parse_key():
+    assert parse_key("price") == ("price", "str", False)
+    assert parse_key("price:float:desc") == ("price", "float", True)
+    assert parse_key("time:datetime") == ("time", "datetime", False)
+    assert parse_key("a:b:desc") == ("a:b", "str", True)
@@ -1,8 +1,10 @@
 import csv
 import io
+import itertools
 import subprocess
 import sys
 
+from csvprogs.extractcsv import prefilter, _literal_prefix
 from tests import NVDA
 
 
@@ -38,3 +40,119 @@ def test_cli():
         less_set.add(tuple(row.items()))
 
     assert not grt_eq_set & less_set
+
+def test_cli_typed():
+    data = (b"contract,price,when\r\n"
+            b"F:LGOV13,96200,2000-01-06\r\n"
+            b"F:LGOV13,,2000-01-07\r\n"
+            b"F:X,96300,2000-01-08\r\n"
+            b"F:LGOV13,95999.5,2000-01-09\r\n"
+            b"F:LGOV13,100000,2000-01-10\r\n")
+
+    def extract(*args):
+        result = subprocess.run(["./venv/bin/python", "-m",
+                                 "csvprogs.extractcsv"] + list(args),
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, input=data)
+        assert result.returncode == 0
+        return (result.stdout.decode("utf-8").splitlines()[1:],
+                result.stderr.decode("utf-8"))
+
+    # unquoted strings, numbers compared as numbers (96200 < 100000) and
+    # empty cells which match nothing, with rows written as they were read
+    (rows, _) = extract("contract", "==", "F:LGOV13", "and", "(", "price",
+                        ">", "96125", "or", "price", "<", "96000", ")")
+    assert rows == ["F:LGOV13,96200,2000-01-06",
+                    "F:LGOV13,95999.5,2000-01-09",
+                    "F:LGOV13,100000,2000-01-10"]
+    (rows, _) = extract("when", ">=", "2000-01-09", "or",
+                        "contract", "match", "f:x")
+    assert rows == ["F:X,96300,2000-01-08",
+                    "F:LGOV13,95999.5,2000-01-09",
+                    "F:LGOV13,100000,2000-01-10"]
+    (rows, _) = extract("contract", "!=", '"F:LGOV13"')
+    assert rows == ["F:X,96300,2000-01-08"]
+
+    # -v shows each row and its result once
+    (rows, err) = extract("-v", "price", "<", "96000")
+    assert rows == ["F:LGOV13,95999.5,2000-01-09"]
+    assert err.count("] True") == 1
+    assert err.count("] False") == 4
+
+def test_prefilter():
+    keys = ["Date", "Symbol", "Close"]
+    search = prefilter(["Symbol", "==", "S0042", "and", "Close", ">", "5"],
+                       keys)
+    assert search("2003-01-02,S0042,6\n")
+    assert not search("2003-01-02,S0043,6\n")
+    search = prefilter(["(", "Close", ">", "5", "or", "Symbol", "==", "S1",
+                        ")", "and", "Date", "match", "dec[12]"], keys)
+    assert search("2003-DEC-01,S2,6\n")
+    assert not search("2003-nov-01,S2,6\n")
+    search = prefilter(["S1", "==", "Symbol", "or", "Date", "match", "x"],
+                       keys)
+    assert search("1,S1,2\n") and search("X,S2,2\n")
+    assert not search("1,S2,2\n")
+    for args in (["Close", ">", "5"], ["Symbol", "!=", "S1"],
+                 ["Close", "==", "5"], ["Symbol", "==", 'a"b'],
+                 ["Symbol", "==", "S1", "or", "Close", "<", "2"],
+                 ["Date", "match", "x*"]):
+        assert prefilter(args, keys) is None
+
+    assert [_literal_prefix(pattern)
+                for pattern in ("abc", "ab?c", "^ab+", "a|b", "ab{2}",
+                                "(?x)a", "ab\\.c")] == [
+        "abc", "a", "ab", "", "a", "", "ab"]
+
+def test_cli_prefilter():
+    names = ["zelenskyy", "Zelenskyy", "a,zelenskyy", "zelenskyy\nx",
+             'ze"lenskyy', "bob", "", "x zelenskyy"]
+    out = io.StringIO()
+    wtr = csv.writer(out)
+    wtr.writerow(["User Name", "n", "note"])
+    for (i, (name, note)) in enumerate(itertools.product(names, names)):
+        wtr.writerow([name, i, note])
+    # a bare quote, and quoted fields which span lines
+    out.write('x,1,a"b\r\n"zelenskyy",2,"c\nd"\r\nzelenskyy,3,""\r\n'
+              '"p\nq",4,zelenskyy\r\n')
+    wtr = csv.writer(out, quoting=csv.QUOTE_ALL)
+    for (i, (name, note)) in enumerate(itertools.product(names, names)):
+        wtr.writerow([name, i, note])
+    data = out.getvalue().encode("utf-8")
+
+    for args in (["User Name", "==", "zelenskyy"],
+                 ["note", "match", "ZEL+e?"],
+                 ["User Name", "==", "zelenskyy", "or", "note", "==", "bob"],
+                 ["n", "==", "2"]):
+        outputs = []
+        for flags in (["--no-prefilter"], []):
+            result = subprocess.run(["./venv/bin/python", "-m",
+                                     "csvprogs.extractcsv"] + flags + args,
+                stdout=subprocess.PIPE, stderr=None, input=data)
+            assert result.returncode == 0
+            outputs.append(result.stdout)
+        assert outputs[0] == outputs[1]
+        assert outputs[0].count(b"\n") > 1
+
+def test_cli_jobs():
+    with open(NVDA, "rb") as nvda:
+        nvda_data = nvda.read()
+    assert len(nvda_data) > 4 * 4096
+    for args in (["bid", "<", "ask"], ["bid", "match", "1[23]"]):
+        outputs = []
+        for (jobs, piped) in (("1", False), ("2", False), ("2", True)):
+            # small chunks split the input among many tasks
+            cmd = ["./venv/bin/python", "-m", "csvprogs.extractcsv",
+                   "-j", jobs, "--chunk-size", "4k"] + args
+            if piped:
+                # a pipe is split into batches of lines
+                result = subprocess.run(cmd, stdout=subprocess.PIPE,
+                                        input=nvda_data)
+            else:
+                # a regular file is split into byte ranges
+                with open(NVDA, "rb") as nvda:
+                    result = subprocess.run(cmd, stdout=subprocess.PIPE,
+                                            stdin=nvda)
+            assert result.returncode == 0
+            outputs.append(result.stdout)
+        assert outputs[0] == outputs[1] == outputs[2]
+        assert outputs[0].count(b"\n") > 10
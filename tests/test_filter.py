@@ -1,8 +1,9 @@
 import csv
 import io
+import os
 import subprocess
 
-from tests import BATCH_EX
+from tests import BATCH_EX, NVDA
 
 def test_cli():
     with open(BATCH_EX, "rb") as ex:
@@ -24,3 +25,44 @@ def test_bad_lambda_key():
         "-f", 'lambda row: row["batch"] != "b=1"', "-k", "age"],
         stdout=subprocess.PIPE, stderr=None, input=ex_data)
     assert result.returncode != 0
+
+def test_jobs():
+    # small chunks split the input among many tasks
+    assert os.path.getsize(NVDA) > 4 * 4096
+    outputs = []
+    for jobs in ("1", "2"):
+        result = subprocess.run(["./venv/bin/python", "-m", "csvprogs.filter",
+            "-f", "lambda row: row['bid'] < row['ask']", "-k", "spread",
+            "-j", jobs, "--chunk-size", "4k", NVDA],
+            stdout=subprocess.PIPE, stderr=None)
+        assert result.returncode == 0
+        outputs.append(result.stdout)
+    assert outputs[0] == outputs[1]
+    assert outputs[0].count(b"\n") > 100
+
+def test_negative_index():
+    with open(BATCH_EX, "rb") as ex:
+        ex_data = ex.read()
+
+    result = subprocess.run(["./venv/bin/python", "-m", "csvprogs.filter",
+        "-f", 'lambda row: row[-1] != "b=1" and row[2] > 4'],
+        stdout=subprocess.PIPE, stderr=None, input=ex_data)
+    assert result.returncode == 0
+    # rows are written as they were read
+    lines = ex_data.decode("utf-8").splitlines()
+    assert result.stdout.decode("utf-8").splitlines() == [
+        lines[0], lines[1], lines[6], lines[8]]
+
+def test_extra_fields():
+    data = b"a,b\n1,2\n3,4,5\n"
+    result = subprocess.run(["./venv/bin/python", "-m", "csvprogs.filter",
+        "-f", "lambda row: True"],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, input=data)
+    assert result.returncode != 0
+    assert b"3 fields, more than the 2 in the header" in result.stderr
+    # short rows are padded, as before
+    result = subprocess.run(["./venv/bin/python", "-m", "csvprogs.filter",
+        "-f", "lambda row: row['b'] == ''"],
+        stdout=subprocess.PIPE, stderr=None, input=b"a,b\n1,2\n3\n")
+    assert result.returncode == 0
+    assert result.stdout.splitlines() == [b"a,b", b"3,"]
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+"indicators tests"
+
+import io
+import subprocess
+import tempfile
+import types
+
+import pytest
+
+from csvprogs import indicators
+from csvprogs.indicators import HeldRows, compute, parse_specs
+from tests.test_ewma import INPUT
+
+PYTHON = "./venv/bin/python"
+
+
+def pipeline(*commands):
+    "run INPUT through a shell-style pipeline of csvprogs"
+    data = INPUT.encode("utf-8")
+    for command in commands:
+        result = subprocess.run([PYTHON, "-m", f"csvprogs.{command[0]}"] +
+                                list(command[1:]), input=data,
+                                stdout=subprocess.PIPE, check=True)
+        data = result.stdout
+    return data
+
+
+def test_cli_matches_pipeline():
+    expected = pipeline(("mvavg", "-n", "7", "-f", "weight", "-c", "wt"),
+                        ("ewma", "-m", "2", "-f", "O2", "--outcol", "o2"),
+                        ("hull", "-f", "hr", "-n", "9"),
+                        ("mvavg", "-f", "hr", "-n", "3", "-w", "-c", "wma"),
+                        ("ewma", "-f", "hr", "--alpha", "0.3"))
+    actual = pipeline(("indicators",
+                       "-I", "mvavg:weight:n=7:out=wt,ewma:O2:gap=2:out=o2",
+                       "-I", "hull:hr:n=9,mvavg:hr:n=3:w:out=wma",
+                       "-I", "ewma:hr:alpha=0.3"))
+    assert actual == expected
+
+
+@pytest.mark.parametrize("hold", [indicators.HOLD, 2])
+def test_trailing_ewma_rows(monkeypatch, hold):
+    # with a tiny HOLD the held rows are spilled to disk
+    monkeypatch.setattr(indicators, "HOLD", hold)
+    outf = io.StringIO()
+    inf = io.StringIO(INPUT + "2024-11-13,,44\n2024-11-14,,43\n")
+    compute(inf, outf, parse_specs(["ewma:weight,ewma:hr:out=e2"]))
+    rows = [row.split(",") for row in outf.getvalue().splitlines()]
+    assert rows[0] == ["date", "weight", "hr", "O2", "ewma", "e2"]
+    # trailing rows without a weight get no weight ewma, but still get
+    # the hr ewma
+    assert rows[-3][0] == "2024-11-12" and rows[-3][-2] != ""
+    for row in rows[-2:]:
+        assert row[-2] == "" and row[-1] != ""
+
+
+@pytest.mark.parametrize("hold", [indicators.HOLD, 3])
+def test_sparse_ewma_rows(hold):
+    # two columns which never have a value in the same row: each row is
+    # written once both columns have had a value in it or a later row
+    written = []
+    wtr = types.SimpleNamespace(writerows=written.extend)
+    with tempfile.TemporaryFile() as spill:
+        held = HeldRows([(3, 1), (4, 2)], hold, spill)
+        for i in range(20):
+            row = [str(i), "1" if i % 2 else "", "" if i % 2 else "2",
+                   "e1", "e2"]
+            held.release(wtr, held.add(row))
+            assert [row[0] for row in written] == [str(j) for j in range(i)]
+        held.finish(wtr)
+    assert len(written) == 20
+    # the last row comes after the last value of the second column
+    assert written[-1][3:] == ["e1", ""] and written[-2][3:] == ["e1", "e2"]
+
+
+def test_bad_specs():
+    with pytest.raises(ValueError):
+        parse_specs(["macd:close"])
+    with pytest.raises(ValueError):
+        parse_specs(["ewma:close:beta=3"])
+    with pytest.raises(ValueError):
+        parse_specs(["ewma:close,ewma:open"])
+    result = subprocess.run([PYTHON, "-m", "csvprogs.indicators",
+                             "-I", "ewma:"], input=INPUT.encode("utf-8"),
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    assert result.returncode == 1
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 
+import csv
 import io
 import subprocess
 
@@ -11,3 +12,13 @@ def test_cli():
         "-f", "Close-SPY", "-x", "Date", SPY_DAILY],
         stdout=subprocess.PIPE, stderr=None)
     assert result.returncode == 0
+
+def test_float_format():
+    result = subprocess.run(["./venv/bin/python", "-m", "csvprogs.interp",
+        "-f", "Close-SPY", "-x", "Date", "--float-format", "%.3f", SPY_DAILY],
+        stdout=subprocess.PIPE, stderr=None)
+    assert result.returncode == 0
+    rows = list(csv.DictReader(io.StringIO(result.stdout.decode("utf-8"))))
+    closes = [row["Close-SPY"] for row in rows if row["Close-SPY"]]
+    assert closes and all(len(close.partition(".")[2]) == 3
+                          for close in closes)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+"kernels tests"
+
+import csv
+import math
+import random
+
+import numpy
+
+from csvprogs.common import weighted_ma
+from csvprogs.kernels import SMA, WMA, HMA, EMA, Wilder, TrueRange
+from tests import SPY_DAILY
+
+EPS = 1e-12
+NAN = float("nan")
+
+
+def close(a, b):
+    "same NaNs in the same places, otherwise equal to within EPS"
+    if math.isnan(a) or math.isnan(b):
+        return math.isnan(a) and math.isnan(b)
+    return abs(a - b) <= EPS * max(1.0, abs(b))
+
+def series(n=2000, seed=42, holes=0.02):
+    "random walk with occasional missing values"
+    rng = random.Random(seed)
+    val = 100.0
+    result = []
+    for _ in range(n):
+        val += rng.gauss(0, 1)
+        result.append(NAN if rng.random() < holes else val)
+    return result
+
+def spy_daily():
+    "high, low, close columns of SPY-daily.csv"
+    with open(SPY_DAILY, encoding="utf-8") as inf:
+        rows = list(csv.DictReader(inf))
+    return [[float(row[f"{col}-SPY"]) for row in rows]
+                for col in ("High", "Low", "Close")]
+
+# reference versions of the original per-row loops
+
+def ref_mvavg(values, length, weighted):
+    "mvavg's original restartable window"
+    coeffs = list(range(length, 0, -1)) if weighted else [1] * length
+    elts = [None] * length
+    result = []
+    for val in values:
+        if math.isnan(val):
+            elts = [None] * length
+        else:
+            elts.append(val)
+            del elts[0]
+        result.append(NAN if None in elts else weighted_ma(elts, coeffs))
+    return result
+
+def ref_hull(values, length):
+    "hull's original calculation, ignoring missing values"
+    coeffs = list(range(length, 0, -1))
+    half = length // 2
+    sqrt_len = int(round(math.sqrt(length)))
+    raw, diffs = [None] * length, [None] * length
+    result = []
+    for val in values:
+        raw.append(val)
+        del raw[0]
+        hull = NAN
+        if None not in raw:
+            diffs.append(2 * weighted_ma(raw[-half:], coeffs[-half:]) -
+                         weighted_ma(raw, coeffs))
+            del diffs[0]
+            vals = diffs[-sqrt_len:]
+            if None not in vals:
+                hull = weighted_ma(vals, coeffs[-sqrt_len:])
+        result.append(hull)
+    return result
+
+def ref_atr(high, low, close_, length):
+    "atr's original calculation, NaN where no value was written"
+    atrs = [None] * length
+    result = [NAN]
+    atr = None
+    for (hi, lo, prev, cls) in zip(high[1:], low[1:], close_, close_[1:]):
+        atrs.append(max(hi - lo, abs(lo - prev), abs(hi - prev)))
+        atrs.pop(0)
+        if None not in atrs:
+            if atr is None:
+                atr = sum(atrs) / len(atrs)
+            else:
+                atr = (atr * (len(atrs) - 1) + atrs[-1]) / len(atrs)
+        result.append(NAN if atr is None else atr)
+    return result
+
+def three_ways(make, values, chunk=37):
+    "run values through fresh kernels as one batch, in chunks and one at a time"
+    kernel = make()
+    whole = kernel.batch(numpy.array(values)).tolist()
+    kernel = make()
+    chunked = []
+    for i in range(0, len(values), chunk):
+        chunked.extend(kernel.batch(values[i:i+chunk]).tolist())
+    kernel = make()
+    streamed = [kernel.update(val) for val in values]
+    return (whole, chunked, streamed)
+
+
+def test_sma_wma():
+    values = series()
+    for length in (1, 2, 5, 30):
+        for (kernel, weighted) in ((SMA, False), (WMA, True)):
+            expected = ref_mvavg(values, length, weighted)
+            for result in three_ways(lambda: kernel(length), values):
+                assert all(close(a, b) for (a, b) in zip(result, expected))
+
+def test_sma_restart():
+    result = SMA(2).batch([1.0, 3.0, NAN, 5.0, 7.0, 9.0]).tolist()
+    assert math.isnan(result[0]) and math.isnan(result[2])
+    assert math.isnan(result[3])
+    assert result[1] == 2.0 and result[4] == 6.0 and result[5] == 8.0
+
+def test_wma_weights():
+    # oldest value is weighted most heavily
+    assert WMA(3).batch([1.0, 2.0, 3.0])[-1] == (3 + 4 + 3) / 6
+
+def test_hma():
+    values = [val for val in series() if not math.isnan(val)]
+    for length in (4, 9, 30):
+        expected = ref_hull(values, length)
+        for result in three_ways(lambda: HMA(length), values):
+            assert all(close(a, b) for (a, b) in zip(result, expected))
+
+def test_ema():
+    values = series(holes=0.2)
+    kernel = EMA(0.1, 3)
+    expected = [kernel.update(val) for val in values]
+    for result in three_ways(lambda: EMA(0.1, 3), values):
+        # same arithmetic, so exactly the same answer
+        assert all(a == b or (math.isnan(a) and math.isnan(b))
+                       for (a, b) in zip(result, expected))
+
+def test_ema_gap():
+    result = EMA(0.5, 2).batch([2.0, NAN, 4.0, NAN, NAN, 8.0]).tolist()
+    assert result[:3] == [2.0, 2.0, 3.0]
+    assert math.isnan(result[4])
+    assert result[5] == 8.0
+
+def test_atr():
+    (high, low, close_) = spy_daily()
+    for length in (1, 14):
+        expected = ref_atr(high, low, close_, length)
+        def make(length=length):
+            return Wilder(length)
+        true_range = TrueRange()
+        tr = true_range.batch(high, low, close_)
+        assert math.isnan(tr[0])
+        (whole, chunked, streamed) = three_ways(make, tr[1:].tolist())
+        for result in (whole, chunked, streamed):
+            assert all(a == b or (math.isnan(a) and math.isnan(b))
+                           for (a, b) in zip([NAN] + result, expected))
+
+def test_true_range_stream():
+    (high, low, close_) = spy_daily()
+    batch = TrueRange().batch(high, low, close_).tolist()
+    kernel = TrueRange()
+    streamed = [kernel.update(*bar) for bar in zip(high, low, close_)]
+    assert math.isnan(streamed[0]) and math.isnan(batch[0])
+    assert streamed[1:] == batch[1:]
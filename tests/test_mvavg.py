@@ -89,3 +89,14 @@ def test_cli():
     assert set(x["mean"] for x in csvdata[0:3]) == set(["nan"])
     m4 = float(csvdata[4]["mean"])
     assert abs(m4 - 181.04) < EPS, (m4, (m4 - 181.92))
+
+def test_cli_float_format():
+    result = subprocess.run(["./venv/bin/python", "-m", "csvprogs.mvavg",
+        "-f", "weight", "-n", "3", "--float-format", "%.2f"], check=True,
+        stdout=subprocess.PIPE, stderr=None,
+        input=bytes(INPUT, encoding="utf-8"))
+    csvdata = list(csv.DictReader(io.StringIO(result.stdout.decode("utf-8"))))
+    assert csvdata[1]["mean"] == "nan"
+    assert csvdata[2]["mean"] == "180.53"
+    # input values are passed through untouched
+    assert csvdata[2]["weight"] == "181.4"
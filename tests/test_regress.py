@@ -31,3 +31,11 @@ def test_cli_csv():
     output = list(csv.DictReader(io.StringIO(result.stdout.decode("utf-8"))))
     assert (abs(float(output[7]["reg"]) - 135.4728217) < EPS and
             abs(float(output[-1]["reg"]) - 137.7006059) < EPS)
+
+def test_file_and_pipe_agree():
+    cmd = ["./venv/bin/python", "-m", "csvprogs.regress", "-f", "bid,ask"]
+    mapped = subprocess.run(cmd + [NVDA], check=True, stdout=subprocess.PIPE)
+    with open(NVDA, "rb") as nvda:
+        piped = subprocess.run(cmd, check=True, stdout=subprocess.PIPE,
+                               input=nvda.read())
+    assert mapped.stdout == piped.stdout
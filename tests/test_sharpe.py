@@ -17,3 +17,13 @@ def test_atr():
         stdout=subprocess.PIPE, stderr=None, input=result.stdout)
     assert result.returncode == 0
     assert abs(float(result.stdout.decode("utf-8")) - 33.42458471637126) < EPS
+
+def test_float_format():
+    result = subprocess.run(["./venv/bin/python", "-m", "csvprogs.mean",
+        "-f", "Close-SPY", SPY_DAILY],
+        stdout=subprocess.PIPE, stderr=None)
+    result = subprocess.run(["./venv/bin/python", "-m", "csvprogs.sharpe",
+                             "--float-format", "%.3f"],
+        stdout=subprocess.PIPE, stderr=None, input=result.stdout)
+    assert result.returncode == 0
+    assert result.stdout == b"33.425\n"
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+
+"""heavy import tests
+
+Import times are too noisy to test here; python -m benchmarks.startup
+checks them against their budgets.
+"""
+
+import os
+import subprocess
+import sys
+
+from benchmarks import startup
+from benchmarks.run import TOP, entry_points
+
+
+def heavy_imports(module):
+    "heavy packages in sys.modules after importing module in a fresh python"
+    proc = subprocess.run([sys.executable, "-c",
+                           f"import sys, {module}; print(*sys.modules)"],
+                          stdout=subprocess.PIPE, text=True, check=True,
+                          cwd=TOP, env=dict(os.environ, PYTHONPATH=TOP))
+    loaded = {name.split(".")[0] for name in proc.stdout.split()}
+    return loaded & set(startup.HEAVY)
+
+def test_heavy_imports():
+    problems = {}
+    for (name, module) in entry_points(TOP).items():
+        heavy = heavy_imports(module) - startup.ALLOWED.get(name, set())
+        if heavy:
+            problems[name] = heavy
+    assert not problems
+
+def test_heavy_import_detected():
+    assert heavy_imports("csvprogs.kernels") == {"numpy"}
@@ -163,3 +163,143 @@ def test_missing_xform():
                             ],
         stdout=subprocess.PIPE, stderr=None)
     assert result.stdout != 0
+
+LAMBDASTRING = """
+xform = lambda row: row.__setitem__("close", row["close"] * 2)
+"""
+
+def write_closes(outf, nrows):
+    "write nrows of made up times and closes"
+    writer = csv.writer(outf)
+    writer.writerow(["time", "close"])
+    for i in range(nrows):
+        writer.writerow([f"2015-04-{i // 24 % 28 + 1:02d}T{i % 24:02d}:00",
+                         f"{26 + i % 100 / 10:.2f}"])
+
+@pytest.mark.parametrize(("xstring",),
+                         [(MODSTRING,), (CALLSTRING,), (LAMBDASTRING,),])
+def test_jobs(xstring):
+    with (tempfile.NamedTemporaryFile(mode="w+", dir="/tmp",
+                                      suffix=".py") as xfile,
+          tempfile.NamedTemporaryFile(mode="w+", newline="") as data):
+        xfile.file.write(xstring)
+        xfile.file.flush()
+        write_closes(data.file, 1000)
+        data.file.flush()
+        assert os.path.getsize(data.name) > 4 * 4096
+        modname = os.path.splitext(os.path.split(xfile.name)[1])[0]
+        env = dict(os.environ)
+        env["PYTHONPATH"] = "/tmp"
+        outputs = []
+        for jobs in ("1", "2"):
+            # a regular file on stdin is split into byte ranges
+            with open(data.name, "rb") as inf:
+                result = subprocess.run(
+                    ["./venv/bin/python", "-m", "csvprogs.xform",
+                     "-F", f"{modname}.xform", "-j", jobs,
+                     "--chunk-size", "4k"],
+                    env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                    stdin=inf)
+            assert result.returncode == 0
+            outputs.append(result.stdout)
+        assert outputs[0] == outputs[1]
+        assert outputs[0].count(b"\n") > 100
+        # lambdas can't be pickled, so are run serially
+        assert (b"running serially" in result.stderr) == (
+            xstring is LAMBDASTRING)
+
+def test_jobs_f():
+    with open(VRTX_CSV, "rb") as f:
+        data = f.read()
+    assert len(data) > 4 * 4096
+    outputs = []
+    for jobs in ("1", "2"):
+        result = subprocess.run(
+            ["./venv/bin/python", "-m", "csvprogs.xform",
+             "-f", XFORMSTRING, "-j", jobs, "--chunk-size", "4k"],
+            stdout=subprocess.PIPE, stderr=None, input=data)
+        assert result.returncode == 0
+        outputs.append(result.stdout)
+    assert outputs[0] == outputs[1]
+
+GBM_CSV = b"""\
+time,GBM,ZF,note\r
+11/22/2013 14:00,125.680811,120.80775,a\r
+11/22/2013 15:00,125.677778,120.812342,b\r
+11/22/2013 16:00,,120.841542,c\r
+11/22/2013 17:00,125.655,120.835938,d\r
+"""
+
+def test_batch():
+    result = subprocess.run(
+        ["./venv/bin/python", "-m", "csvprogs.xform", "--batch",
+         "-c", "GBM.ZF", "-f",
+         'def func(batch):\n'
+         '    batch["GBM.ZF"] = batch["GBM"] - batch["ZF"]\n'
+         '    del batch["note"]\n'],
+        stdout=subprocess.PIPE, stderr=None, input=GBM_CSV)
+    assert result.returncode == 0
+    # NaN is written empty, and the untouched column as it was read
+    assert result.stdout == b"""\
+time,GBM,ZF,note,GBM.ZF\r
+11/22/2013 14:00,125.680811,120.80775,,4.873061000000007\r
+11/22/2013 15:00,125.677778,120.812342,,4.8654360000000025\r
+11/22/2013 16:00,,120.841542,,\r
+11/22/2013 17:00,125.655,120.835938,,4.819062000000002\r
+"""
+
+BARS_CSV = b"""\
+Date,High,Low,Vol\r
+2025-01-02,454.50,452.25,379\r
+2025-01-03,455.00,451.10,\r
+2025-01-06,456.75,453.80,412\r
+2025-01-07,458.20,455.05,398\r
+"""
+
+@pytest.mark.parametrize(("batch_size",), [("1",), ("2",), ("3",)])
+def test_batch_read_only(batch_size):
+    # columns which are only read are written as they were read, and
+    # a blank cell doesn't make a batch's integers floats
+    row_func = ('def func(row):\n'
+                '    row["Mid"] = (row["High"] + row["Low"]) / 2\n'
+                '    row["Vol2"] = row["Vol"] * 2\n')
+    batch_func = ('def func(batch):\n'
+                  '    batch["Mid"] = (batch["High"] + batch["Low"]) / 2\n'
+                  '    batch["Vol2"] = batch["Vol"] * 2\n')
+    outputs = []
+    for args in (["-f", row_func],
+                 ["--batch", "--batch-size", batch_size, "-f", batch_func]):
+        result = subprocess.run(
+            ["./venv/bin/python", "-m", "csvprogs.xform", "-c", "Mid,Vol2"]
+            + args, stdout=subprocess.PIPE, stderr=None, input=BARS_CSV)
+        assert result.returncode == 0
+        outputs.append(result.stdout)
+    assert outputs[0] == outputs[1] == b"""\
+Date,High,Low,Vol,Mid,Vol2\r
+2025-01-02,454.50,452.25,379,453.375,758\r
+2025-01-03,455.00,451.10,,453.05,\r
+2025-01-06,456.75,453.80,412,455.275,824\r
+2025-01-07,458.20,455.05,398,456.625,796\r
+"""
+
+def test_batch_frame():
+    func = ('def func(batch):\n'
+            '    import pandas\n'
+            '    assert isinstance(batch["note"], list)\n'
+            '    frame = pandas.DataFrame(dict(batch))\n'
+            '    frame = frame[frame["GBM"] > 125.66]\n'
+            '    frame["n"] = len(frame)\n'
+            '    return frame\n')
+    outputs = []
+    for jobs in ("1", "2"):
+        result = subprocess.run(
+            ["./venv/bin/python", "-m", "csvprogs.xform", "--batch",
+             "--batch-size", "2", "-c", "n", "-j", jobs, "-f", func],
+            stdout=subprocess.PIPE, stderr=None, input=GBM_CSV)
+        assert result.returncode == 0
+        outputs.append(result.stdout)
+    assert outputs[0] == outputs[1] == b"""\
+time,GBM,ZF,note,n\r
+11/22/2013 14:00,125.680811,120.80775,a,2\r
+11/22/2013 15:00,125.677778,120.812342,b,2\r
+"""